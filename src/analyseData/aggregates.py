@@ -0,0 +1,410 @@
+"""Flettbare delaggregater for statistikk over data i biter."""
+
+import numpy as np
+import pandas as pd
+
+from collections.abc import Hashable, Iterable
+from typing import NamedTuple
+
+# Antall verdier per nivå i kvantilskissen. Grupper med færre verdier
+# gir eksakte kvantiler.
+DEFAULT_SKETCH_SIZE = 512
+
+
+class QuantileSketch:
+    """
+    Kompakt, flettbar skisse for omtrentlige kvantiler (KLL-lignende).
+
+    Verdier samles i nivåer. Når et nivå blir fullt, sorteres det og
+    annenhver verdi flyttes opp ett nivå med dobbel vekt. Minnebruken
+    er O(k log(n/k)), og kvantilene er eksakte så lenge n <= k.
+    """
+
+    def __init__(self, k: int = DEFAULT_SKETCH_SIZE, seed: int = 0) -> None:
+        """
+        Initialiserer en tom skisse.
+
+        Parametre:
+            k (int): Maks antall verdier per nivå.
+            seed (int): Frø for valg av verdier ved komprimering.
+        """
+        self.k = k
+        self.count = 0
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray) -> None:
+        """Legg til verdier, NaN ignoreres."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += values.size
+        self._compress()
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Flett inn en annen skisse og returner denne."""
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], level])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def to_state(self) -> dict:
+        """Tilstand som JSON-vennlig ordbok."""
+        return {
+            "k": self.k,
+            "count": self.count,
+            "levels": [level.tolist() for level in self.levels],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "QuantileSketch":
+        """Gjenopprett en skisse fra to_state."""
+        sketch = cls(state["k"])
+        sketch.count = state["count"]
+        sketch.levels = [
+            np.asarray(level, dtype=np.float64) for level in state["levels"]
+        ]
+        return sketch
+
+    def quantile(self, q: float) -> float:
+        """
+        Beregn kvantil med lineær interpolasjon.
+
+        Parametre:
+            q (float): Kvantil mellom 0 og 1.
+
+        Returnerer:
+            float: Kvantilen, NaN for tom skisse.
+        """
+        if self.count == 0:
+            return float("nan")
+        if len(self.levels) == 1:
+            if q == 0.5:
+                # Samme avrunding som pandas' median
+                return float(np.median(self.levels[0]))
+            return float(np.quantile(self.levels[0], q))
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([
+            np.full(level.size, 2.0 ** h)
+            for h, level in enumerate(self.levels)
+        ])
+        order = np.argsort(values, kind="stable")
+        values, weights = values[order], weights[order]
+        # Midtpunkt av hver verdis vekt som plassering i fordelingen
+        positions = (np.cumsum(weights) - weights / 2) / weights.sum()
+        return float(np.interp(q, positions, values))
+
+    def _compress(self) -> None:
+        """Komprimer fulle nivåer oppover."""
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if level.size > self.k:
+                level = np.sort(level)
+                rest = level[-1:] if level.size % 2 else level[:0]
+                level = level[:level.size - rest.size]
+                promoted = level[int(self._rng.integers(2))::2]
+                self.levels[h] = rest
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[h + 1] = np.concatenate(
+                    [self.levels[h + 1], promoted]
+                )
+            h += 1
+
+
+class PartialAggregate:
+    """
+    Flettbart delaggregat: antall, sum, snitt, M2, min, maks og kvantiler.
+
+    Snitt og varians holdes med Chans parallelle algoritme, som er
+    numerisk stabil også når mange biter flettes.
+    """
+
+    def __init__(self, sketch_size: int = DEFAULT_SKETCH_SIZE) -> None:
+        """
+        Initialiserer et tomt aggregat.
+
+        Parametre:
+            sketch_size (int): Størrelse på kvantilskissen.
+        """
+        self.rows = 0
+        self.count = 0
+        self.sum = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.sketch = QuantileSketch(sketch_size)
+
+    def update(self, values: np.ndarray) -> None:
+        """
+        Legg til en bit med verdier.
+
+        Parametre:
+            values (np.ndarray): Verdier. NaN telles i rows, men ikke i
+            statistikken.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.rows += values.size
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        mean = float(values.mean())
+        self._combine(
+            values.size, float(values.sum()), mean,
+            float(((values - mean) ** 2).sum()),
+            float(values.min()), float(values.max()),
+        )
+        self.sketch.update(values)
+
+    def merge(self, other: "PartialAggregate") -> "PartialAggregate":
+        """Flett inn et annet aggregat og returner dette."""
+        self.rows += other.rows
+        if other.count:
+            self._combine(other.count, other.sum, other.mean, other.m2,
+                          other.min, other.max)
+            self.sketch.merge(other.sketch)
+        return self
+
+    def to_state(self) -> dict:
+        """Tilstand som JSON-vennlig ordbok."""
+        return {
+            "rows": self.rows, "count": self.count, "sum": self.sum,
+            "mean": self.mean, "m2": self.m2,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "sketch": self.sketch.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "PartialAggregate":
+        """Gjenopprett et aggregat fra to_state."""
+        part = cls(state["sketch"]["k"])
+        part.rows = state["rows"]
+        part.count = state["count"]
+        part.sum = state["sum"]
+        part.mean = state["mean"]
+        part.m2 = state["m2"]
+        if part.count:
+            part.min, part.max = state["min"], state["max"]
+        part.sketch = QuantileSketch.from_state(state["sketch"])
+        return part
+
+    @property
+    def sumsq(self) -> float:
+        """Kvadratsum av verdiene, utledet fra snitt og M2."""
+        return self.m2 + self.count * self.mean ** 2
+
+    def var(self, ddof: int = 1) -> float:
+        """Varians med gitt ddof, NaN ved for få verdier."""
+        if self.count - ddof <= 0:
+            return float("nan")
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof: int = 1) -> float:
+        """Standardavvik med gitt ddof."""
+        return float(np.sqrt(self.var(ddof)))
+
+    def statistic(self, name: str, ddof: int = 1) -> float:
+        """
+        Hent en statistikk ved navn.
+
+        Parametre:
+            name (str): 'mean', 'sum', 'median', 'std', 'min', 'max'
+            eller 'count'.
+            ddof (int): Frihetsgrader for 'std'.
+
+        Returnerer:
+            float: Verdien, NaN hvis aggregatet ikke har verdier (0 for
+            'sum' og 'count', som i pandas).
+
+        Hever:
+            ValueError: Ved ukjent statistikk.
+        """
+        if name == "count":
+            return self.count
+        if name == "sum":
+            return self.sum
+        if name == "std":
+            return self.std(ddof)
+        if name == "median":
+            return self.median()
+        if name not in {"mean", "min", "max"}:
+            raise ValueError(f"Ukjent statistikk: {name!r}")
+        return getattr(self, name) if self.count else float("nan")
+
+    def iqr_bounds(self, whisker: float) -> tuple[float, float]:
+        """Nedre og øvre IQR-grense med gitt whisker-faktor."""
+        q1, q3 = self.quantile(0.25), self.quantile(0.75)
+        iqr = q3 - q1
+        return q1 - whisker * iqr, q3 + whisker * iqr
+
+    def median(self) -> float:
+        """Median fra kvantilskissen."""
+        return self.sketch.quantile(0.5)
+
+    def quantile(self, q: float) -> float:
+        """Kvantil fra kvantilskissen."""
+        return self.sketch.quantile(q)
+
+    def _combine(
+        self,
+        count: int,
+        total: float,
+        mean: float,
+        m2: float,
+        low: float,
+        high: float,
+    ) -> None:
+        """Chans fletting av antall, snitt og M2."""
+        n = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / n
+        self.m2 += m2 + delta ** 2 * self.count * count / n
+        self.count = n
+        self.sum += total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+
+class GroupedAggregate:
+    """Delaggregater per gruppenøkkel, f.eks. år eller måned."""
+
+    def __init__(self, sketch_size: int = DEFAULT_SKETCH_SIZE) -> None:
+        """
+        Initialiserer uten grupper.
+
+        Parametre:
+            sketch_size (int): Størrelse på kvantilskissen per gruppe.
+        """
+        self.sketch_size = sketch_size
+        self.groups: dict[Hashable, PartialAggregate] = {}
+
+    def update(self, keys: Iterable[Hashable], values: np.ndarray) -> None:
+        """
+        Legg til en bit med verdier og tilhørende gruppenøkler.
+
+        Parametre:
+            keys (Iterable[Hashable]): Gruppenøkkel per verdi.
+            values (np.ndarray): Verdiene.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        codes, uniques = pd.factorize(np.asarray(keys), sort=False)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        for idx in np.split(order, bounds):
+            if idx.size == 0 or codes[idx[0]] < 0:
+                continue
+            key = uniques[codes[idx[0]]]
+            key = key.item() if hasattr(key, "item") else key
+            group = self.groups.get(key)
+            if group is None:
+                group = self.groups[key] = PartialAggregate(self.sketch_size)
+            group.update(values[idx])
+
+    def merge(self, other: "GroupedAggregate") -> "GroupedAggregate":
+        """Flett inn et annet gruppert aggregat og returner dette."""
+        for key, part in other.groups.items():
+            if key in self.groups:
+                self.groups[key].merge(part)
+            else:
+                self.groups[key] = part
+        return self
+
+    def items(self) -> list[tuple[Hashable, PartialAggregate]]:
+        """Gruppene sortert på nøkkel."""
+        return sorted(self.groups.items(), key=lambda item: item[0])
+
+    def to_state(self) -> dict:
+        """Tilstand som JSON-vennlig ordbok. Nøklene må være int/str."""
+        return {
+            "sketch_size": self.sketch_size,
+            "groups": [[key, part.to_state()] for key, part in self.items()],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "GroupedAggregate":
+        """Gjenopprett et gruppert aggregat fra to_state."""
+        grouped = cls(state["sketch_size"])
+        grouped.groups = {
+            key: PartialAggregate.from_state(part)
+            for key, part in state["groups"]
+        }
+        return grouped
+
+
+# Verdi i alle kalendernøkler for rader uten tidspunkt (NaT)
+NAT_KEY = np.iinfo(np.int64).min
+
+
+class CalendarKeys(NamedTuple):
+    """Heltallsnøkler for kalenderen, én verdi per tidspunkt."""
+
+    year: np.ndarray
+    month: np.ndarray
+    period: np.ndarray
+    day_of_year: np.ndarray
+
+    def take(self, positions: np.ndarray) -> "CalendarKeys":
+        """Nøklene for et utvalg posisjoner."""
+        return CalendarKeys(*(keys[positions] for keys in self))
+
+
+def calendar_keys(times: pd.DatetimeIndex) -> CalendarKeys:
+    """
+    Regn ut år, måned, måned-ordinal og dag i året for tidspunkter.
+
+    Nøklene regnes ut direkte fra nanosekundene i UTC, uten å tolke
+    tidspunktene eller bygge strenger.
+
+    Parametre:
+        times (pd.DatetimeIndex): Tidspunkter i UTC.
+
+    Returnerer:
+        CalendarKeys: int64-nøkler. period er måneder siden januar 1970
+        (som month_period), og NaT gir NAT_KEY.
+    """
+    if times.tz is not None:
+        times = times.tz_convert("UTC").tz_localize(None)
+    stamps = times.to_numpy(dtype="M8[ns]")
+    period = stamps.astype("M8[M]").astype(np.int64)
+    year, month = np.divmod(period, 12)
+    day_of_year = (
+        stamps.astype("M8[D]") - stamps.astype("M8[Y]")
+    ).astype(np.int64)
+    keys = CalendarKeys(year + 1970, month + 1, period, day_of_year + 1)
+    missing = np.isnat(stamps)
+    if missing.any():
+        for column in keys:
+            column[missing] = NAT_KEY
+    return keys
+
+
+def period_keys(times: pd.DatetimeIndex) -> np.ndarray:
+    """Måned som heltall (måneder siden januar 1970) per tidspunkt."""
+    return calendar_keys(times).period
+
+
+def month_period(year: int, month: int) -> int:
+    """Måned som heltall: antall måneder siden januar 1970."""
+    return (year - 1970) * 12 + month - 1
+
+
+def period_label(period: int) -> str:
+    """Gjør et månedstall om til 'YYYY-MM'."""
+    year, month = divmod(int(period), 12)
+    return f"{1970 + year:04d}-{month + 1:02d}"
+
+
+__all__ = [
+    "NAT_KEY", "CalendarKeys", "GroupedAggregate", "PartialAggregate",
+    "QuantileSketch", "calendar_keys", "month_period", "period_keys",
+    "period_label",
+]
@@ -1,50 +1,565 @@
 """Laster inn data fra CSV-filer."""
 
+import io
+import numpy as np
 import os
 import pandas as pd
 import re
+import threading
 
-from functools import lru_cache
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .aggregates import GroupedAggregate
+    from .columncache import ColumnarCache, as_categories
+    from .datasetcache import DatasetCache, file_fingerprint, shared_cache
+    from .runningstats import (
+        RUNNING_SUFFIX, RunningAggregates, running_for, running_for_sources,
+    )
+    from .seriesindex import (
+        SeriesIndex, index_for, min_offset_of, offset_hours,
+    )
+except ImportError:
+    from aggregates import GroupedAggregate
+    from columncache import ColumnarCache, as_categories
+    from datasetcache import DatasetCache, file_fingerprint, shared_cache
+    from runningstats import (
+        RUNNING_SUFFIX, RunningAggregates, running_for, running_for_sources,
+    )
+    from seriesindex import (
+        SeriesIndex, index_for, min_offset_of, offset_hours,
+    )
+
+# Antall rader per bit ved filtrert lesing av CSV uten kolonnebuffer
+CSV_CHUNK_ROWS = 200_000
+
+# Årspartisjoner: '<år>.<format>' i en mappe per kilde
+_PARTITION = re.compile(r"(\d{4})\.(csv|csv\.gz|parquet|feather)")
+
+# Nøkkelen for én rad i den avledede partisjonen
+_DERIVED_KEY = ["sourceId", "referenceTime", "timeOffset", "elementId"]
+
+# Elementene i hver kildefil, nøklet på sti med fingeravtrykk
+_elements_by_path: dict[str, tuple[tuple, frozenset[str]]] = {}
+_elements_lock = threading.Lock()
+
+
+def _year_partitions(folder: str) -> list[tuple[int, str]]:
+    """List (år, filsti) for årspartisjonene i en mappe, sortert på år."""
+    if not os.path.isdir(folder):
+        return []
+    found = []
+    for name in os.listdir(folder):
+        match = _PARTITION.fullmatch(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(folder, name)))
+    return sorted(found)
+
+
+def _as_utc(value: str | pd.Timestamp) -> pd.Timestamp:
+    """Tolk et tidspunkt som UTC."""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+
+
+def _in_years(
+    path: str,
+    lower: pd.Timestamp | None,
+    upper: pd.Timestamp | None,
+) -> bool:
+    """Om en kildefil kan inneholde data i tidsrommet."""
+    match = _PARTITION.fullmatch(os.path.basename(path))
+    if match is None:
+        return True
+    year = int(match.group(1))
+    return (lower is None or year >= lower.year) \
+        and (upper is None or year <= upper.year)
+
+
+def _filter_frame(
+    df: pd.DataFrame,
+    elements: list[str] | None,
+    lower: pd.Timestamp | None,
+    upper: pd.Timestamp | None,
+) -> pd.DataFrame:
+    """Filtrer en innlest df på element og tidsrom."""
+    mask = pd.Series(True, index=df.index)
+    if elements is not None:
+        mask &= df["elementId"].isin(elements)
+    if lower is not None:
+        mask &= df["referenceTime"] >= lower
+    if upper is not None:
+        mask &= df["referenceTime"] <= upper
+    return df[mask].reset_index(drop=True)
+
+
+def _read_csv_filtered(
+    path: str,
+    elements: list[str] | None,
+    lower: pd.Timestamp | None,
+    upper: pd.Timestamp | None,
+    columns: list[str] | None,
+) -> pd.DataFrame:
+    """Les en CSV i biter og behold kun treffene."""
+    usecols = None
+    if columns is not None:
+        needed = set(columns) | {"referenceTime", "elementId"}
+        usecols = lambda col: col in needed  # noqa: E731
+    chunks = []
+    for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_ROWS,
+                             usecols=usecols, low_memory=False):
+        if elements is not None and "elementId" in chunk.columns:
+            chunk = chunk[chunk["elementId"].isin(elements)]
+        # Tid tolkes kun for radene som er igjen etter elementfilteret
+        chunk = chunk.assign(referenceTime=pd.to_datetime(
+            chunk["referenceTime"], utc=True, errors="coerce"
+        ))
+        chunks.append(_filter_frame(chunk, None, lower, upper))
+    df = pd.concat(chunks, ignore_index=True)
+    return df if columns is None else df.reindex(columns=columns)
+
+
+def _latest_derived(derived: pd.DataFrame) -> pd.DataFrame:
+    """Siste rad per nøkkel i den avledede partisjonen, uten fjernede."""
+    derived = derived.drop_duplicates(_DERIVED_KEY, keep="last")
+    return derived[derived["value"].notna()].reset_index(drop=True)
+
+
+def _drop_main_elements(
+    derived: pd.DataFrame,
+    main_elements: Iterable[str],
+) -> pd.DataFrame:
+    """Hovedfilen vinner for elementer den allerede har."""
+    return derived[~derived["elementId"].isin(list(main_elements))]
 
 
 class DataLoader:
     """Laster værdata per by fra CSV-filer med standard filnavnmønster."""
 
-    try:
-        # Første forsøk: imputert data
-        filename_template: str = "vaerdata_{city}_imputert.csv"
-    except FileNotFoundError:
-        # Andre forsøk: rådata
-        filename_template: str = "vaerdata_{city}.csv"
+    # Kilder i prioritert rekkefølge: imputert data før rådata. Hver
+    # kilde kan være én fil eller en mappe med én fil per år, f.eks.
+    # 'vaerdata_oslo_imputert/2020.csv'.
+    filename_templates: tuple[str, ...] = (
+        "vaerdata_{city}_imputert.csv",
+        "vaerdata_{city}.csv",
+    )
+    filename_template: str = filename_templates[0]
 
-    def __init__(self, data_dir: str) -> None:
+    # Avledede elementer (range o.l.) fra TemperatureRangeConverter
+    derived_template: str = "vaerdata_{city}_derived.csv"
+
+    # Undermappe for typede kolonnebuffere ved siden av CSV-filene
+    cache_dirname: str = ".cache"
+
+    # Rader per bit i minnebegrenset modus, None = les alt i minnet
+    chunk_rows: int | None = None
+
+    # Kolonnebuffer på disk, None = ingen
+    disk_cache: ColumnarCache | None = None
+
+    # Statistikk fra løpende aggregater som kun oppdateres med nye
+    # rader. Kvantilene kommer da fra skisser og er tilnærmede, så det
+    # må slås på eksplisitt.
+    use_running_aggregates: bool = False
+
+    def __init__(
+        self,
+        data_dir: str,
+        cache: DatasetCache | None = None,
+        disk_cache: bool = True,
+        chunk_rows: int | None = None,
+    ) -> None:
         """
         Initialiserer DataLoader med katalog for datafilene.
 
         Parametre:
             data_dir (str): Mappe der CSV-filene ligger.
+            cache (DatasetCache | None): Buffer for innlastede filer.
+            Prosessens felles buffer hvis None.
+            disk_cache (bool): Lagre tolkede data som kolonnebuffer på
+            disk, så CSV-en kun leses på nytt når den endres.
+            chunk_rows (int | None): Aktiverer minnebegrenset modus, der
+            filene leses i biter på høyst så mange rader og statistikk
+            bygges av flettbare delaggregater.
         """
         self.data_dir = data_dir
+        self.chunk_rows = chunk_rows
+        self.cache = cache if cache is not None else shared_cache()
+        self.disk_cache = (
+            ColumnarCache(os.path.join(data_dir, self.cache_dirname))
+            if disk_cache else None
+        )
 
-    @lru_cache(maxsize=None)
-    def _load_city(self, city: str) -> pd.DataFrame:
+    def __getstate__(self) -> dict:
+        """Tilstand for overføring til en annen prosess, uten buffer."""
+        state = self.__dict__.copy()
+        state.pop("cache", None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        """Gjenopprett i en ny prosess med prosessens felles buffer."""
+        self.__dict__.update(state)
+        self.cache = shared_cache()
+
+    def _resolve_sources(
+        self,
+        city: str,
+        years: Iterable[int] | None = None,
+    ) -> list[str]:
         """
-        Leser inn én by sin CSV og validerer innhold.
+        Finn filene som skal leses for en by.
+
+        Første kilde i filename_templates som finnes brukes. For en
+        årspartisjonert kilde velges kun filene for de gitte årene.
 
         Parametre:
-            city (str): Bykode, f.eks. "oslo" eller "tromso".
+            city (str): Bykode.
+            years (Iterable[int] | None): År som skal dekkes. Alle hvis
+            None. Ignoreres for kilder som er én fil.
 
         Returnerer:
-            pd.DataFrame: Rådata med konvertert "referenceTime".
+            list[str]: Filstier sortert på år.
+
+        Hever:
+            FileNotFoundError: Hvis ingen kilde finnes.
         """
+        wanted = None if years is None else {int(y) for y in years}
+        for template in self.filename_templates:
+            path = os.path.join(self.data_dir, template.format(city=city))
+            partitions = _year_partitions(os.path.splitext(path)[0])
+            if partitions:
+                return [
+                    part for year, part in partitions
+                    if wanted is None or year in wanted
+                ]
+            if os.path.isfile(path):
+                return [path]
+
         path = os.path.join(
-            self.data_dir,
-            self.filename_template.format(city=city),
+            self.data_dir, self.filename_templates[0].format(city=city)
         )
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"Fant ikke datafil: {path}")
+        raise FileNotFoundError(f"Fant ikke datafil: {path}")
+
+    def _load_city(
+        self,
+        city: str,
+        years: Iterable[int] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Leser inn én by sine data og validerer innhold.
+
+        Kilder prøves i rekkefølgen imputert, rådata og til slutt en
+        eksisterende kolonnebuffer hvis kildefilene er borte. Resultatet
+        bufres i en felles buffer som deles med alle DataLoader-er i
+        prosessen, og lastes på nytt når filene endres.
+
+        Parametre:
+            city (str): Bykode, f.eks. "oslo" eller "tromso".
+            years (Iterable[int] | None): Les kun disse årene fra en
+            årspartisjonert kilde. Alle hvis None.
+
+        Returnerer:
+            pd.DataFrame: Rådata med konvertert "referenceTime", og
+            avledede elementer som ikke finnes i hovedfilen.
+        """
+        if years is not None:
+            years = sorted({int(y) for y in years})
+        derived_path = self._derived_path(city)
+        try:
+            sources = self._resolve_sources(city, years)
+        except FileNotFoundError:
+            df = self._load_stale(city, years)
+            if df is None:
+                raise
+            return df
+
+        def load() -> pd.DataFrame:
+            frames = [self._read_cached(path) for path in sources]
+            if len(frames) > 1:
+                df = as_categories(pd.concat(frames, ignore_index=True))
+            elif frames:
+                df = frames[0]
+            else:
+                df = pd.DataFrame(
+                    columns=["referenceTime", "elementId", "timeOffset",
+                             "value"]
+                )
+            df = self._merge_derived(df, city, years)
+            # Indeks og offset-metadata bygges én gang ved innlasting
+            index_for(df)
+            return df
 
-        df = pd.read_csv(path, low_memory=False)
+        return self.cache.get((*sources, derived_path), load)
+
+    def load(
+        self,
+        city: str,
+        elements: Iterable[str] | str | None = None,
+        start: str | pd.Timestamp | None = None,
+        end: str | pd.Timestamp | None = None,
+        columns: Iterable[str] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Last kun radene og kolonnene som trengs for en spørring.
+
+        Filtrene skyves ned i leseren: årspartisjoner utenfor tidsrommet
+        åpnes ikke, radgrupper hoppes over med min/maks for tid, og kun
+        treff hentes fra kolonnebufferen. Uten kolonnebuffer leses CSV
+        i biter som filtreres før de samles. Minne og tid følger
+        dermed størrelsen på svaret, ikke datasettet.
+
+        Parametre:
+            city (str): Bykode, f.eks. "oslo".
+            elements (Iterable[str] | str | None): ElementId-er. Alle
+            hvis None.
+            start (str | pd.Timestamp | None): Fra og med tidspunkt.
+            Tidspunkter uten tidssone tolkes som UTC.
+            end (str | pd.Timestamp | None): Til og med tidspunkt.
+            columns (Iterable[str] | None): Kolonner i resultatet. Alle
+            hvis None.
+
+        Returnerer:
+            pd.DataFrame: Treffene, med referenceTime som UTC-tid.
+
+        Hever:
+            FileNotFoundError: Hvis byen ikke har noen datakilde.
+        """
+        if isinstance(elements, str):
+            elements = [elements]
+        elements = None if elements is None else list(elements)
+        columns = None if columns is None else list(columns)
+        lower = None if start is None else _as_utc(start)
+        upper = None if end is None else _as_utc(end)
+
+        years = None
+        if lower is not None and upper is not None:
+            years = range(lower.year, upper.year + 1)
+        sources = [
+            path for path in self._resolve_sources(city, years)
+            if _in_years(path, lower, upper)
+        ]
+
+        frames = [
+            self._scan(path, elements, lower, upper, columns)
+            for path in sources
+        ]
+        scan_columns = columns
+        if columns is not None and "elementId" not in columns:
+            scan_columns = [*columns, "elementId"]
+        derived = self._scan_derived(
+            city, elements, lower, upper, scan_columns
+        )
+        if derived is not None:
+            if not derived.empty:
+                derived = _drop_main_elements(derived, self._main_elements(
+                    sources, derived["elementId"].unique()
+                ))
+            frames.append(
+                derived if columns is None
+                else derived.reindex(columns=columns)
+            )
+
+        non_empty = [frame for frame in frames if not frame.empty]
+        if len(non_empty) > 1:
+            return as_categories(pd.concat(non_empty, ignore_index=True))
+        if non_empty:
+            return as_categories(non_empty[0])
+        return frames[0] if frames else pd.DataFrame(columns=columns or [])
+
+    def batch(
+        self,
+        method: str,
+        cities: Iterable[str],
+        element_ids: Iterable[str],
+        *,
+        max_workers: int | None = None,
+        skip_missing: bool = True,
+        **kwargs,
+    ) -> pd.DataFrame:
+        """
+        Kjør en analysemetode for mange byer og elementer samtidig.
+
+        Arbeidet fordeles på en prosesspool med én oppgave per by. Hver
+        oppgave laster byens fil én gang og kjører metoden for alle
+        elementene mot den samme innlastede df-en.
+
+        Parametre:
+            method (str): Navn på en offentlig metode som tar city og
+            element_id, f.eks. "compute_all_months".
+            cities (Iterable[str]): Bykoder.
+            element_ids (Iterable[str]): ElementId-er.
+            max_workers (int | None): Antall prosesser. Med 1, eller
+            bare én by, kjøres alt i denne prosessen.
+            skip_missing (bool): Hopp over kombinasjoner uten data
+            (ValueError) i stedet for å stoppe.
+            **kwargs: Videre argumenter til metoden.
+
+        Returnerer:
+            pd.DataFrame: Resultatene etter hverandre i langt format, med
+            kolonnene 'city' og 'element_id' først.
+
+        Hever:
+            ValueError: Hvis metoden ikke finnes eller ikke er offentlig.
+        """
+        if method.startswith("_") or not callable(
+            getattr(self, method, None)
+        ):
+            raise ValueError(f"Ukjent analysemetode: {method!r}")
+        cities = list(cities)
+        element_ids = list(element_ids)
+        args = [
+            (self, method, city, element_ids, skip_missing, kwargs)
+            for city in cities
+        ]
+
+        if max_workers == 1 or len(cities) <= 1:
+            frames = [_batch_city(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                frames = list(pool.map(_batch_city, *zip(*args)))
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=["city", "element_id"])
+        return pd.concat(frames, ignore_index=True)
+
+    def _scan(
+        self,
+        path: str,
+        elements: list[str] | None,
+        lower: pd.Timestamp | None,
+        upper: pd.Timestamp | None,
+        columns: list[str] | None,
+    ) -> pd.DataFrame:
+        """Les treffene i én kildefil, helst fra kolonnebufferen."""
+        if self.disk_cache is not None:
+            scan = dict(
+                elements=elements, start=lower, end=upper, columns=columns
+            )
+            df = self.disk_cache.scan([path], **scan)
+            if df is None:
+                # Første spørring mot filen bygger kolonnebufferen
+                full = self._read_cached(path)
+                df = self.disk_cache.scan([path], **scan)
+                if df is None:
+                    df = _filter_frame(full, elements, lower, upper)
+                    if columns is not None:
+                        df = df.reindex(columns=columns)
+            return df
+
+        if path.endswith((".parquet", ".feather")):
+            df = _filter_frame(self._read_city(path), elements, lower, upper)
+            return df if columns is None else df.reindex(columns=columns)
+        return _read_csv_filtered(path, elements, lower, upper, columns)
+
+    def _main_elements(
+        self,
+        sources: list[str],
+        candidates: Iterable[str],
+    ) -> set[str]:
+        """
+        Finn hvilke av elementene som finnes i hovedkildene.
+
+        Ser på hele kildefilene uavhengig av tidsrom, så load og
+        _load_city velger samme kilde for et element. Elementene per
+        kildefil huskes til filen endres.
+
+        Parametre:
+            sources (list[str]): Kildefilene.
+            candidates (Iterable[str]): Elementer fra den avledede
+            partisjonen.
+
+        Returnerer:
+            set[str]: Elementene som hovedkildene har rader for.
+        """
+        found: set[str] = set()
+        for path in sources:
+            found.update(self._elements_in(
+                path,
+                lambda path=path: self._scan(
+                    path, None, None, None, ["elementId"]
+                ),
+            ))
+        return found & set(candidates)
+
+    def _elements_in(
+        self,
+        path: str,
+        scan: Callable[[], pd.DataFrame | None],
+    ) -> frozenset[str]:
+        """
+        Hent elementene i en fil, helst fra kategorilisten i bufferen.
+
+        Parametre:
+            path (str): Filsti.
+            scan (Callable[[], pd.DataFrame | None]): Leser kolonnen
+            elementId fra filen ved bom.
+
+        Returnerer:
+            frozenset[str]: ElementId-ene i filen.
+        """
+        fingerprint = file_fingerprint(path)
+        with _elements_lock:
+            entry = _elements_by_path.get(path)
+        if entry is not None and entry[0] == fingerprint:
+            return entry[1]
+
+        found = None
+        if self.disk_cache is not None:
+            found = self.disk_cache.categories([path], "elementId")
+        if found is None:
+            df = scan()
+            found = [] if df is None else df["elementId"].dropna().unique()
+        elements = frozenset(str(element) for element in found)
+        with _elements_lock:
+            _elements_by_path[path] = (fingerprint, elements)
+        return elements
+
+    def _load_stale(
+        self,
+        city: str,
+        years: list[int] | None,
+    ) -> pd.DataFrame | None:
+        """Siste utvei: bruk kolonnebufferen selv om kilden er borte."""
+        if self.disk_cache is None:
+            return None
+        for template in self.filename_templates:
+            path = os.path.join(self.data_dir, template.format(city=city))
+            df = self.disk_cache.load([path], strict=False)
+            if df is not None:
+                df = self._merge_derived(df, city, years)
+                index_for(df)
+                return df
+        return None
+
+    def _read_cached(self, path: str) -> pd.DataFrame:
+        """Les fra kolonnebufferen, eller tolk filen og oppdater bufferen."""
+        if self.disk_cache is None:
+            return self._read_city(path)
+
+        df = self.disk_cache.load([path])
+        if df is not None:
+            return df
+
+        df = self._read_city(path)
+        try:
+            self.disk_cache.store([path], df)
+        except (OSError, TypeError, ValueError):
+            # Skrivebeskyttet mappe eller kolonne som ikke kan lagres:
+            # bruk CSV hver gang
+            pass
+        return df
+
+    @staticmethod
+    def _read_city(path: str) -> pd.DataFrame:
+        """Les og valider én datafil fra disk, uten buffer."""
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)
+        elif path.endswith(".feather"):
+            df = pd.read_feather(path)
+        else:
+            df = pd.read_csv(path, low_memory=False)
 
         if "referenceTime" not in df.columns:
             filename = os.path.basename(path)
@@ -56,7 +571,290 @@ class DataLoader:
         df["referenceTime"] = pd.to_datetime(
             df["referenceTime"], utc=True, errors="coerce"
         )
-        return df
+        return as_categories(df)
+
+    def _read_derived(self, city: str) -> pd.DataFrame | None:
+        """
+        Les den avledede partisjonen, siste versjon per nøkkel.
+
+        Partisjonen oppdateres ved å legge til rader, så siste rad per
+        nøkkel gjelder. En siste rad uten verdi betyr at nøkkelen er
+        fjernet. Resultatet lagres i kolonnebufferen, så senere kall og
+        filtrerte spørringer ikke tolker CSV-en på nytt.
+        """
+        path = self._derived_path(city)
+        if not os.path.exists(path):
+            return None
+        if self.disk_cache is not None:
+            derived = self.disk_cache.load([path])
+            if derived is not None:
+                return derived
+
+        derived = pd.read_csv(path, low_memory=False)
+        derived = _latest_derived(derived)
+        derived["referenceTime"] = pd.to_datetime(
+            derived["referenceTime"], utc=True, errors="coerce"
+        )
+        if self.disk_cache is not None:
+            try:
+                self.disk_cache.store([path], derived)
+            except (OSError, TypeError, ValueError):
+                pass
+        return derived
+
+    def _scan_derived(
+        self,
+        city: str,
+        elements: list[str] | None,
+        lower: pd.Timestamp | None,
+        upper: pd.Timestamp | None,
+        columns: list[str] | None,
+    ) -> pd.DataFrame | None:
+        """
+        Les treffene i den avledede partisjonen, siste versjon per nøkkel.
+
+        Med kolonnebuffer filtreres det i bufferen som for hovedkildene.
+        Uten leses CSV-en i biter som filtreres før de samles.
+
+        Returnerer:
+            pd.DataFrame | None: Treffene, eller None uten partisjon.
+        """
+        path = self._derived_path(city)
+        if not os.path.exists(path):
+            return None
+        if self.disk_cache is not None:
+            scan = dict(
+                elements=elements, start=lower, end=upper, columns=columns
+            )
+            df = self.disk_cache.scan([path], **scan)
+            if df is None:
+                full = self._read_derived(city)
+                df = self.disk_cache.scan([path], **scan)
+                if df is None:
+                    df = _filter_frame(full, elements, lower, upper)
+                    if columns is not None:
+                        df = df.reindex(columns=columns)
+            return df
+
+        df = _latest_derived(
+            _read_csv_filtered(path, elements, lower, upper, None)
+        )
+        return df if columns is None else df.reindex(columns=columns)
+
+    def _derived_path(self, city: str) -> str:
+        """Sti til den avledede partisjonen for en by."""
+        return os.path.join(
+            self.data_dir, self.derived_template.format(city=city)
+        )
+
+    def _merge_derived(
+        self,
+        df: pd.DataFrame,
+        city: str,
+        years: Iterable[int] | None = None,
+    ) -> pd.DataFrame:
+        """Legg til rader fra den avledede partisjonen, om den finnes."""
+        derived = self._read_derived(city)
+        if derived is None:
+            return df
+
+        if "elementId" in df.columns:
+            derived = _drop_main_elements(derived, df["elementId"].unique())
+        if years is not None:
+            derived = derived[
+                derived["referenceTime"].dt.year.isin(list(years))
+            ]
+        if derived.empty:
+            return df
+        return as_categories(pd.concat([df, derived], ignore_index=True))
+
+    def _series_index(self, city: str) -> SeriesIndex:
+        """
+        Hent (elementId, timeOffset)-indeksen for en by.
+
+        Parametre:
+            city (str): Bykode.
+
+        Returnerer:
+            SeriesIndex: Indeks over byens innlastede data.
+        """
+        return index_for(self._load_city(city))
+
+    def _series(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+    ) -> pd.Series:
+        """
+        Hent tidssortert float64-serie for et element i en by.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+
+        Returnerer:
+            pd.Series: Verdier med referenceTime som indeks. Ikke-numeriske
+            verdier er NaN.
+        """
+        return self._series_index(city).series(element_id, time_offset)
+
+    def _running_aggregates(self, city: str) -> RunningAggregates:
+        """
+        Hent løpende måneds- og årsaggregater for en by.
+
+        Med kolonnebuffer lagres aggregatene og vannmerkene på disk. Når
+        kildefilene kun har fått nye rader på slutten, leses bare de
+        nye bytene og bøttene de treffer oppdateres. Ellers bygges
+        aggregatene på nytt fra alle radene.
+
+        Parametre:
+            city (str): Bykode.
+
+        Returnerer:
+            RunningAggregates: Aggregater for byens nåværende data.
+        """
+        if self.disk_cache is None:
+            return running_for(self._load_city(city))
+        try:
+            sources = self._resolve_sources(city)
+        except FileNotFoundError:
+            return running_for(self._load_city(city))
+        derived = self._derived_path(city)
+        state_path = ColumnarCache(
+            self.disk_cache.root, suffix=RUNNING_SUFFIX
+        ).path_for(sources[0])
+
+        def build() -> tuple[RunningAggregates, dict[str, frozenset]]:
+            running = RunningAggregates()
+            running.append_index(self._series_index(city))
+            elements = {
+                path: self._elements_in(
+                    path,
+                    lambda path=path: self._scan(
+                        path, None, None, None, ["elementId"]
+                    ),
+                )
+                for path in sources
+            }
+            elements[derived] = self._elements_in(
+                derived,
+                lambda: self._scan_derived(
+                    city, None, None, None, ["elementId"]
+                ),
+            )
+            return running, elements
+
+        def read_tails(ranges, elements):
+            return self._read_tails(sources, derived, ranges, elements)
+
+        return running_for_sources(
+            [*sources, derived], state_path, build, read_tails
+        )
+
+    def _read_tails(
+        self,
+        sources: list[str],
+        derived: str,
+        ranges: dict[str, tuple[int, int]],
+        elements: dict[str, list[str]],
+    ) -> tuple[pd.DataFrame, dict[str, set[str]]] | None:
+        """
+        Les radene som er lagt til i kildefilene siden sist.
+
+        Radene må kunne flettes inn uten å endre eldre rader: et
+        element kan ikke bytte fra den avledede partisjonen til
+        hovedkildene, og den avledede partisjonen kan ikke ha tomme
+        verdier (fjernede nøkler). Hvilke elementer filene hadde fra
+        før tas fra elements, så ingen fil leses i sin helhet.
+
+        Parametre:
+            sources (list[str]): Hovedkildene.
+            derived (str): Den avledede partisjonen.
+            ranges (dict[str, tuple[int, int]]): Nye byte (fra, til) per
+            fil som har vokst.
+            elements (dict[str, list[str]]): Elementene i hver fil sist.
+
+        Returnerer:
+            tuple | None: De nye radene og elementene i hver fil nå,
+            eller None hvis radene ikke kan flettes inn alene.
+        """
+        found = {path: set(names) for path, names in elements.items()}
+        main_before = set().union(*(found.get(p, ()) for p in sources))
+        frames = []
+        for path in sources:
+            if path not in ranges:
+                continue
+            tail = self._read_tail(path, *ranges[path])
+            if tail is None:
+                return None
+            found[path] = found.get(path, set()) | set(
+                tail["elementId"].dropna().astype(str)
+            )
+            frames.append(tail)
+        main_after = set().union(*(found.get(p, ()) for p in sources))
+
+        if derived in ranges:
+            tail = self._read_tail(derived, *ranges[derived])
+            if tail is None or tail["value"].isna().any():
+                return None
+            tail = tail.drop_duplicates(_DERIVED_KEY, keep="last")
+            found[derived] = found.get(derived, set()) | set(
+                tail["elementId"].dropna().astype(str)
+            )
+            frames.append(_drop_main_elements(tail, main_after))
+        if (main_after - main_before) & found.get(derived, set()):
+            # Hovedkildene tar over et avledet element
+            return None
+
+        frames = [frame for frame in frames if not frame.empty]
+        tail = (
+            pd.concat(frames, ignore_index=True) if frames
+            else pd.DataFrame(columns=["referenceTime", "elementId",
+                                       "timeOffset", "value"])
+        )
+        return as_categories(tail), found
+
+    @staticmethod
+    def _read_tail(path: str, start: int, end: int) -> pd.DataFrame | None:
+        """
+        Les radene mellom to byteposisjoner i en CSV-fil.
+
+        Parametre:
+            path (str): Filsti.
+            start (int): Første byte, på starten av en linje.
+            end (int): Byte etter siste linje.
+
+        Returnerer:
+            pd.DataFrame | None: Radene med referenceTime som UTC-tid,
+            eller None hvis filen ikke er CSV eller posisjonene ikke
+            ligger på linjeskift.
+        """
+        if not path.endswith(".csv"):
+            return None
+        with open(path, "rb") as f:
+            header = f.readline()
+            if 0 < start < len(header):
+                return None
+            f.seek(max(start - 1, 0))
+            data = f.read(end - max(start - 1, 0))
+        if start > 0:
+            if data[:1] != b"\n":
+                return None
+            data = header + data[1:]
+        if not data.endswith(b"\n"):
+            return None
+        try:
+            tail = pd.read_csv(io.BytesIO(data), low_memory=False)
+        except (pd.errors.ParserError, UnicodeDecodeError):
+            return None
+        if "referenceTime" not in tail.columns:
+            return None
+        tail["referenceTime"] = pd.to_datetime(
+            tail["referenceTime"], utc=True, errors="coerce"
+        )
+        return tail
 
     def _get_min_offset(self, city: str, element_id: str) -> str:
         """
@@ -73,37 +871,173 @@ class DataLoader:
         Hever:
             ValueError: Hvis ingen gyldige offsets finnes.
         """
-        df = self._load_city(city)
-        offsets = (
-            df.loc[df["elementId"] == element_id, "timeOffset"]
-            .dropna()
-            .unique()
-        )
-        if offsets.size == 0:
+        if self.chunk_rows:
+            offsets = self._scan_offsets(city, element_id)
+        else:
+            offsets = self._series_index(city).offsets.get(element_id)
+        if not offsets:
             raise ValueError(
                 f"Ingen timeOffset funnet for city={city!r}, "
                 f"element_id={element_id!r}"
             )
 
-        pattern = re.compile(r"PT(\d+)H")
-        parsed: list[tuple[int, str]] = []
-
-        for off in offsets:
-            match = pattern.fullmatch(off)
-            if match:
-                hours = int(match.group(1))
-                parsed.append((hours, off))
-
-        if not parsed:
+        min_offset = min_offset_of(offsets)
+        if min_offset is None:
             raise ValueError(
                 "Fant ingen gyldige PT<n>H-offsets i data for "
                 f"city={city!r}, element_id={element_id!r}. "
-                f"Råverdier: {offsets!r}"
+                f"Råverdier: {list(offsets)!r}"
             )
-
-        # Velg offset med minste antall timer
-        _, min_offset = min(parsed, key=lambda x: x[0])
         return min_offset
 
+    def _read_chunks(
+        self,
+        path: str,
+        columns: list[str],
+    ) -> Iterator[pd.DataFrame]:
+        """Les valgte kolonner i én kildefil i biter på chunk_rows rader."""
+        if path.endswith(".parquet"):
+            yield pd.read_parquet(path, columns=columns)
+        elif path.endswith(".feather"):
+            yield pd.read_feather(path, columns=columns)
+        else:
+            yield from pd.read_csv(
+                path, usecols=columns, chunksize=self.chunk_rows,
+                low_memory=False,
+            )
+
+    def _scan_offsets(
+        self,
+        city: str,
+        element_id: str,
+    ) -> dict[str, int | None]:
+        """Finn offsets for et element ved å lese to kolonner i biter."""
+        offsets: dict[str, int | None] = {}
+        for path in self._resolve_sources(city):
+            for chunk in self._read_chunks(path, ["elementId", "timeOffset"]):
+                found = chunk.loc[chunk["elementId"] == element_id,
+                                  "timeOffset"].dropna().unique()
+                for offset in found:
+                    offsets.setdefault(offset, offset_hours(offset))
+        return offsets
+
+    def _iter_series_chunks(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+    ) -> Iterator[tuple[pd.DatetimeIndex, np.ndarray]]:
+        """
+        Gi ut en serie bit for bit uten å laste hele filen.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+
+        Returnerer:
+            Iterator[tuple[pd.DatetimeIndex, np.ndarray]]: Tidspunkter i
+            UTC og float64-verdier per bit. Ikke-numeriske verdier er NaN.
+        """
+        columns = ["referenceTime", "elementId", "timeOffset", "value"]
+        seen = False
+        for path in self._resolve_sources(city):
+            for chunk in self._read_chunks(path, columns):
+                chunk = chunk[
+                    (chunk["elementId"] == element_id)
+                    & (chunk["timeOffset"] == time_offset)
+                ]
+                if chunk.empty:
+                    continue
+                seen = True
+                yield _series_chunk(chunk)
+
+        # Avledede elementer brukes kun hvis hovedfilen ikke har dem
+        derived = None if seen else self._scan_derived(
+            city, [element_id], None, None, columns
+        )
+        if derived is not None:
+            derived = derived[derived["timeOffset"] == time_offset]
+            if not derived.empty:
+                yield _series_chunk(derived)
+
+    def _aggregate_chunks(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+        key: Callable[[pd.DatetimeIndex], np.ndarray],
+        select: Callable[[pd.DatetimeIndex, np.ndarray, np.ndarray],
+                         np.ndarray] | None = None,
+    ) -> GroupedAggregate:
+        """
+        Bygg grupperte delaggregater for en serie, én bit om gangen.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+            key (Callable): Gir gruppenøkkel per tidspunkt, f.eks. år.
+            select (Callable | None): Gir boolsk maske (tider, verdier,
+            nøkler) for verdiene som skal tas med. Alle hvis None.
+
+        Returnerer:
+            GroupedAggregate: Delaggregater per gruppe.
+        """
+        grouped = GroupedAggregate()
+        for times, values in self._iter_series_chunks(
+            city, element_id, time_offset
+        ):
+            keys = np.asarray(key(times))
+            if select is not None:
+                mask = np.asarray(select(times, values, keys), dtype=bool)
+                keys, values = keys[mask], values[mask]
+            if values.size:
+                grouped.update(keys, values)
+        return grouped
+
+
+def _batch_city(
+    loader: DataLoader,
+    method: str,
+    city: str,
+    element_ids: list[str],
+    skip_missing: bool,
+    kwargs: dict,
+) -> pd.DataFrame:
+    """Kjør én analysemetode for alle elementene i én by."""
+    frames = []
+    for element_id in element_ids:
+        try:
+            result = getattr(loader, method)(
+                city=city, element_id=element_id, **kwargs
+            )
+        except ValueError:
+            if not skip_missing:
+                raise
+            continue
+        if not isinstance(result, pd.DataFrame):
+            result = pd.DataFrame([result])
+        result = result.copy()
+        if "element_id" not in result.columns:
+            result.insert(0, "element_id", element_id)
+        result.insert(0, "city", city)
+        frames.append(result)
+    if not frames:
+        return pd.DataFrame(columns=["city", "element_id"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _series_chunk(chunk: pd.DataFrame) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """Tolk tid og verdi i en filtrert bit, uten rader uten gyldig tid."""
+    times = pd.DatetimeIndex(pd.to_datetime(
+        chunk["referenceTime"], utc=True, errors="coerce"
+    ))
+    values = pd.to_numeric(chunk["value"], errors="coerce").to_numpy(
+        dtype=np.float64
+    )
+    valid = ~times.isna()
+    return times[valid], values[valid]
+
 
 __all__ = ["DataLoader"]
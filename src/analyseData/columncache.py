@@ -0,0 +1,357 @@
+"""Typet, kolonnevis diskbuffer ved siden av CSV-filene."""
+
+import json
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import tempfile
+
+from collections.abc import Iterable
+
+try:
+    from .datasetcache import file_fingerprint
+except ImportError:
+    from datasetcache import file_fingerprint
+
+# Tekstkolonner som holdes som kategorier i df-en
+CATEGORY_COLUMNS: tuple[str, ...] = (
+    "sourceId", "elementId", "timeOffset", "unit"
+)
+
+# Øk ved endring av filformatet, så gamle buffere bygges på nytt
+FORMAT_VERSION = 1
+
+# Antall rader per radgruppe med min/maks-statistikk for tid
+ROW_GROUP_SIZE = 65536
+
+
+def as_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Gjør tekstkolonnene i CATEGORY_COLUMNS om til kategorier."""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype("category")
+    return df
+
+
+class ColumnarCache:
+    """
+    Lagrer df-er som én .npy-fil per kolonne, med tolkede typer.
+
+    Tidspunkter lagres som int64 i UTC, tekst som heltallskoder med en
+    liste over kategorier, og tall i sin egen dtype. Filene leses med
+    minnekartlegging, så en innlasting koster nesten bare å åpne filene.
+    Bufferen er gyldig så lenge fingeravtrykket til kildefilene er likt.
+    """
+
+    def __init__(self, root: str, suffix: str = ".npcache") -> None:
+        """
+        Initialiserer bufferen.
+
+        Parametre:
+            root (str): Mappe for bufferfilene.
+            suffix (str): Endelse på buffermappene, så flere buffere
+            for samme kildefil kan ligge i samme mappe.
+        """
+        self.root = root
+        self.suffix = suffix
+
+    def path_for(self, source: str) -> str:
+        """Returner buffermappen for en kildefil."""
+        # Relativ sti fra datamappen, så årspartisjoner får egne navn
+        base = os.path.dirname(os.path.abspath(self.root))
+        relative = os.path.relpath(os.path.abspath(source), base)
+        name = relative.replace(os.sep, "__").replace("/", "__")
+        return os.path.join(self.root, f"{name}{self.suffix}")
+
+    def load(
+        self,
+        paths: Iterable[str],
+        strict: bool = True,
+    ) -> pd.DataFrame | None:
+        """
+        Les df fra bufferen hvis den er oppdatert.
+
+        Parametre:
+            paths (Iterable[str]): Kildefilene, første fil gir navnet.
+            strict (bool): Krev at fingeravtrykket stemmer. Med False
+            brukes bufferen selv om kildefilene er endret eller borte.
+
+        Returnerer:
+            pd.DataFrame | None: Bufret df, eller None ved bom.
+        """
+        paths = list(paths)
+        folder = self.path_for(paths[0])
+        meta = self._read_meta(folder, paths, strict)
+        if meta is None:
+            return None
+
+        try:
+            columns = {
+                name: self._decode(self._raw(folder, i), spec)
+                for i, (name, spec) in enumerate(meta["columns"])
+            }
+        except (OSError, ValueError):
+            return None
+        return pd.DataFrame(columns, index=pd.RangeIndex(meta["rows"]))
+
+    def scan(
+        self,
+        paths: Iterable[str],
+        *,
+        elements: Iterable[str] | None = None,
+        start: pd.Timestamp | None = None,
+        end: pd.Timestamp | None = None,
+        columns: Iterable[str] | None = None,
+    ) -> pd.DataFrame | None:
+        """
+        Les kun radene og kolonnene som matcher et filter.
+
+        Radgrupper der min/maks for referenceTime ligger utenfor
+        tidsrommet hoppes over. I resten sammenlignes elementkoder og
+        tidsstempler direkte i de minnekartlagte filene, og kun treff
+        hentes ut for kolonnene som er bedt om.
+
+        Parametre:
+            paths (Iterable[str]): Kildefilene, første fil gir navnet.
+            elements (Iterable[str] | None): ElementId-er å ta med.
+            start (pd.Timestamp | None): Fra og med tidspunkt (UTC).
+            end (pd.Timestamp | None): Til og med tidspunkt (UTC).
+            columns (Iterable[str] | None): Kolonner i resultatet.
+
+        Returnerer:
+            pd.DataFrame | None: Treffene, eller None ved bom.
+        """
+        paths = list(paths)
+        folder = self.path_for(paths[0])
+        meta = self._read_meta(folder, paths, strict=True)
+        if meta is None:
+            return None
+
+        specs = {
+            name: (i, spec) for i, (name, spec) in enumerate(meta["columns"])
+        }
+        columns = list(specs) if columns is None else [
+            col for col in columns if col in specs
+        ]
+        rows = meta["rows"]
+        try:
+            times = None
+            lower = upper = None
+            if (start is not None or end is not None) \
+                    and "referenceTime" in specs:
+                i, spec = specs["referenceTime"]
+                times = self._raw(folder, i)
+                lower = _bound(start, spec, np.iinfo(np.int64).min + 1)
+                upper = _bound(end, spec, np.iinfo(np.int64).max)
+
+            codes = wanted = None
+            if elements is not None and "elementId" in specs:
+                i, spec = specs["elementId"]
+                codes = self._raw(folder, i)
+                elements = set(elements)
+                wanted = [
+                    code for code, cat in enumerate(spec["categories"])
+                    if cat in elements
+                ]
+
+            pieces = []
+            for lo, hi, t_min, t_max in self._row_groups(meta, rows):
+                if times is not None and (
+                    t_min is None or t_max < lower or t_min > upper
+                ):
+                    continue
+                mask = np.ones(hi - lo, dtype=bool)
+                if times is not None:
+                    block = times[lo:hi]
+                    mask &= (block >= lower) & (block <= upper)
+                if codes is not None:
+                    mask &= np.isin(codes[lo:hi], wanted)
+                pieces.append(np.flatnonzero(mask) + lo)
+            take = (
+                np.concatenate(pieces) if pieces
+                else np.empty(0, dtype=np.intp)
+            )
+
+            out = {}
+            for name in columns:
+                i, spec = specs[name]
+                out[name] = self._decode(self._raw(folder, i)[take], spec)
+        except (OSError, ValueError):
+            return None
+        return pd.DataFrame(out, index=pd.RangeIndex(len(take)))
+
+    def categories(
+        self,
+        paths: Iterable[str],
+        column: str,
+    ) -> list[str] | None:
+        """
+        Hent kategorilisten for en tekstkolonne uten å lese radene.
+
+        Parametre:
+            paths (Iterable[str]): Kildefilene, første fil gir navnet.
+            column (str): Kolonnenavn, f.eks. "elementId".
+
+        Returnerer:
+            list[str] | None: Verdiene i kolonnen, eller None ved bom
+            eller hvis kolonnen ikke er lagret som tekst.
+        """
+        paths = list(paths)
+        meta = self._read_meta(self.path_for(paths[0]), paths, strict=True)
+        if meta is None:
+            return None
+        for name, spec in meta["columns"]:
+            if name == column and spec["kind"] == "category":
+                return spec["categories"]
+        return None
+
+    def store(self, paths: Iterable[str], df: pd.DataFrame) -> None:
+        """
+        Skriv df til bufferen for gitte kildefiler.
+
+        Mappen skrives ferdig under et midlertidig navn og flyttes på
+        plass til slutt, så lesere aldri ser en halvskrevet buffer.
+
+        Parametre:
+            paths (Iterable[str]): Kildefilene, første fil gir navnet.
+            df (pd.DataFrame): Df som skal lagres.
+        """
+        paths = list(paths)
+        folder = self.path_for(paths[0])
+        os.makedirs(self.root, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            specs = [
+                [str(name), self._write_column(tmp, i, df[name])]
+                for i, name in enumerate(df.columns)
+            ]
+            meta = {
+                "version": FORMAT_VERSION,
+                "fingerprint": self._fingerprint(paths),
+                "rows": len(df),
+                "columns": specs,
+                "row_groups": self._time_stats(df),
+            }
+            with open(os.path.join(tmp, "meta.json"), "w",
+                      encoding="utf-8") as f:
+                json.dump(meta, f)
+            shutil.rmtree(folder, ignore_errors=True)
+            os.replace(tmp, folder)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @staticmethod
+    def _fingerprint(paths: list[str]) -> list[list]:
+        """Fingeravtrykk for kildefilene som JSON-vennlig liste."""
+        return [list(file_fingerprint(path)) for path in paths]
+
+    @staticmethod
+    def _write_column(folder: str, i: int, series: pd.Series) -> dict:
+        """Skriv én kolonne og returner beskrivelsen av typen."""
+        target = os.path.join(folder, f"{i}.npy")
+        dtype = series.dtype
+
+        if isinstance(dtype, pd.DatetimeTZDtype):
+            values = series.dt.tz_convert("UTC").dt.tz_localize(None)
+            np.save(target, values.to_numpy().view("i8"))
+            return {"kind": "datetime", "unit": dtype.unit,
+                    "tz": str(dtype.tz)}
+
+        if isinstance(dtype, pd.CategoricalDtype) or dtype == object:
+            # Kun brukte kategorier, så listen sier hvilke verdier som finnes
+            cat = pd.Categorical(series).remove_unused_categories()
+            np.save(target, cat.codes)
+            return {"kind": "category",
+                    "decode": not isinstance(dtype, pd.CategoricalDtype),
+                    "categories": cat.categories.tolist()}
+
+        np.save(target, series.to_numpy())
+        return {"kind": "array"}
+
+    @staticmethod
+    def _raw(folder: str, i: int) -> np.ndarray:
+        """Minnekartlegg én kolonnefil uten å tolke typen."""
+        # Kopi ved skriving: df-en kan endres uten å røre bufferfilen
+        return np.load(os.path.join(folder, f"{i}.npy"), mmap_mode="c")
+
+    @staticmethod
+    def _decode(values: np.ndarray, spec: dict):
+        """Gjør rå kolonneverdier om til riktig type."""
+        if spec["kind"] == "datetime":
+            times = pd.DatetimeIndex(values.view(f"M8[{spec['unit']}]"))
+            return times.tz_localize("UTC").tz_convert(spec["tz"])
+
+        if spec["kind"] == "category":
+            cat = pd.Categorical.from_codes(
+                values, categories=spec["categories"]
+            )
+            if spec["decode"]:
+                return np.asarray(cat, dtype=object)
+            return cat
+
+        return values
+
+    def _read_meta(
+        self,
+        folder: str,
+        paths: list[str],
+        strict: bool,
+    ) -> dict | None:
+        """Les meta.json, None hvis bufferen mangler eller er utdatert."""
+        try:
+            with open(os.path.join(folder, "meta.json"), "r",
+                      encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if meta.get("version") != FORMAT_VERSION:
+            return None
+        if strict and meta.get("fingerprint") != self._fingerprint(paths):
+            return None
+        return meta
+
+    @staticmethod
+    def _time_stats(df: pd.DataFrame) -> list[list]:
+        """Min og maks av referenceTime per radgruppe."""
+        if "referenceTime" not in df.columns or not isinstance(
+            df["referenceTime"].dtype, pd.DatetimeTZDtype
+        ):
+            return []
+        stamps = (
+            df["referenceTime"].dt.tz_convert("UTC").dt.tz_localize(None)
+            .to_numpy().view("i8")
+        )
+        nat = np.iinfo(np.int64).min
+        stats = []
+        for lo in range(0, len(stamps), ROW_GROUP_SIZE):
+            hi = min(lo + ROW_GROUP_SIZE, len(stamps))
+            block = stamps[lo:hi]
+            block = block[block != nat]
+            if block.size:
+                stats.append([lo, hi, int(block.min()), int(block.max())])
+            else:
+                stats.append([lo, hi, None, None])
+        return stats
+
+    @staticmethod
+    def _row_groups(meta: dict, rows: int) -> list[list]:
+        """Radgrupper med tidsstatistikk, eller én gruppe uten."""
+        groups = meta.get("row_groups")
+        if groups:
+            return groups
+        return [[0, rows, np.iinfo(np.int64).min + 1,
+                 np.iinfo(np.int64).max]]
+
+
+def _bound(ts: pd.Timestamp | None, spec: dict, default: int) -> int:
+    """Gjør et tidspunkt om til int64 i kolonnens tidsenhet."""
+    if ts is None:
+        return default
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize("UTC") if ts.tz is None else ts.tz_convert("UTC")
+    naive = ts.tz_localize(None).to_datetime64()
+    return int(np.datetime64(naive, spec["unit"]).astype(np.int64))
+
+
+__all__ = ["ColumnarCache", "CATEGORY_COLUMNS", "as_categories"]
@@ -0,0 +1,156 @@
+"""Delt, begrenset hurtigbuffer for innlastede datafiler."""
+
+import os
+import pandas as pd
+import threading
+
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+
+# Standard minnebudsjett for alle bufrede df-er i prosessen
+DEFAULT_MAX_BYTES: int = 512 * 1024 ** 2
+
+
+def file_fingerprint(path: str) -> tuple[str, int | None, int | None]:
+    """
+    Lag et fingeravtrykk for en fil: (oppløst sti, mtime_ns, størrelse).
+
+    Parametre:
+        path (str): Filsti.
+
+    Returnerer:
+        tuple: Oppløst sti, endringstid og størrelse. Tid og størrelse
+        er None hvis filen ikke finnes.
+    """
+    real = os.path.realpath(path)
+    try:
+        stat = os.stat(real)
+    except FileNotFoundError:
+        return real, None, None
+    return real, stat.st_mtime_ns, stat.st_size
+
+
+class DatasetCache:
+    """
+    LRU-buffer for df-er, felles for alle lastere i prosessen.
+
+    Oppføringer nøkles på oppløste filstier sammen med endringstid og
+    størrelse, slik at en fil som endres på disk lastes på nytt. Når
+    samlet minnebruk overstiger budsjettet, kastes minst brukte
+    oppføring først.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        """
+        Initialiserer bufferen.
+
+        Parametre:
+            max_bytes (int): Minnebudsjett i byte for alle df-er.
+        """
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[pd.DataFrame, int]] = (
+            OrderedDict()
+        )
+        self._current: dict[tuple[str, ...], tuple] = {}
+        self._lock = threading.RLock()
+        self.nbytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(
+        self,
+        paths: Iterable[str],
+        loader: Callable[[], pd.DataFrame],
+    ) -> pd.DataFrame:
+        """
+        Hent df for gitte filer, og last med loader ved bom.
+
+        Parametre:
+            paths (Iterable[str]): Filene df-en bygges fra. Alle inngår
+            i nøkkelen, også filer som ikke finnes ennå.
+            loader (Callable[[], pd.DataFrame]): Laster df-en fra disk.
+
+        Returnerer:
+            pd.DataFrame: Bufret eller nylig innlastet df.
+        """
+        key = tuple(file_fingerprint(path) for path in paths)
+        ident = tuple(real for real, _, _ in key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+
+        # Lastes utenfor låsen, så andre filer kan leses samtidig
+        df = loader()
+
+        with self._lock:
+            # Eldre versjon av samme filer er utdatert
+            stale = self._current.get(ident)
+            if stale is not None:
+                self._discard(stale)
+            size = int(df.memory_usage(deep=True).sum())
+            self._entries[key] = (df, size)
+            self._current[ident] = key
+            self.nbytes += size
+            self._evict()
+            return df
+
+    def invalidate(self, paths: Iterable[str] | None = None) -> None:
+        """
+        Fjern oppføringer fra bufferen.
+
+        Parametre:
+            paths (Iterable[str] | None): Fjern oppføringer som bygger på
+            disse filene. Tøm hele bufferen hvis None.
+        """
+        with self._lock:
+            if paths is None:
+                self._entries.clear()
+                self._current.clear()
+                self.nbytes = 0
+                return
+            reals = {os.path.realpath(path) for path in paths}
+            for key in list(self._entries):
+                if any(real in reals for real, _, _ in key):
+                    self._discard(key)
+
+    def __len__(self) -> int:
+        """Antall bufrede df-er."""
+        return len(self._entries)
+
+    def _discard(self, key: tuple) -> None:
+        """Fjern én oppføring og oppdater minnebruk."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.nbytes -= entry[1]
+        ident = tuple(real for real, _, _ in key)
+        if self._current.get(ident) == key:
+            del self._current[ident]
+
+    def _evict(self) -> None:
+        """Kast minst brukte oppføringer til budsjettet holdes."""
+        # Nyeste oppføring beholdes selv om den alene er over budsjett
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._discard(key)
+            self.stats["evictions"] += 1
+
+
+_shared_cache: DatasetCache | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> DatasetCache:
+    """Returner prosessens felles DatasetCache."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = DatasetCache()
+        return _shared_cache
+
+
+__all__ = ["DatasetCache", "file_fingerprint", "shared_cache"]
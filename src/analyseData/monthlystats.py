@@ -1,30 +1,44 @@
 """Genererer månedlige statistikker fra værdata."""
 
 import numpy as np
+import os
 import pandas as pd
+import re
 
+from aggregates import NAT_KEY, period_keys, period_label
 from basedata import DataLoader
+from columncache import ColumnarCache
+from statscube import (
+    CUBE_SUFFIX, RUNNING_CUBE_SUFFIX, StatsCube, cube_for, cube_for_sources,
+    month_period,
+)
+
+_YEAR_MONTH = re.compile(r"(\d{4})-(\d{2})")
 
 
 class MonthlyStats(DataLoader):
     """Utvider DataLoader med metoder for månedlig statistikk."""
 
+    # Svar fra den forhåndsberegnede månedskuben. Med False beregnes
+    # statistikken fra rådataene ved hvert kall.
+    use_stats_cube: bool = True
+
     @staticmethod
     def _select_values(
-        df: pd.DataFrame,
+        series: pd.Series,
         year_month: str | None,
         element_id: str,
         time_offset: str,
     ) -> pd.Series:
         """
-        Filtrerer rader etter element, tidsoffset og måned.
+        Velger gyldige verdier i en serie, eventuelt for én måned.
 
         Parametre:
-            df (pd.DataFrame): DataFrame med rådata.
+            series (pd.Series): Tidssortert serie fra DataLoader._series.
             year_month (str | None): År-måned streng (YYYY-MM)
             eller None for alle.
-            element_id (str): ElementId å filtrere på.
-            time_offset (str): PT<n>H offset.
+            element_id (str): ElementId, brukt i feilmeldingen.
+            time_offset (str): PT<n>H offset, brukt i feilmeldingen.
 
         Returnerer:
             pd.Series: Numeriske verdier for valgte rader.
@@ -32,32 +46,100 @@ class MonthlyStats(DataLoader):
         Hever:
             ValueError: Hvis ingen datapunkter finnes.
         """
-        mask = (
-            df["elementId"].eq(element_id)
-            & df["timeOffset"].eq(time_offset)
-        )
         if year_month is not None:
-            mask &= (
-                df["referenceTime"]
-                .dt.strftime("%Y-%m")
-                .eq(year_month)
-            )
+            bounds = MonthlyStats._month_bounds(year_month)
+            if bounds is None:
+                raise MonthlyStats._no_data(
+                    element_id, time_offset, year_month
+                )
+            # Binærsøk i den tidssorterte indeksen, O(log n) per måned
+            lo, hi = series.index.searchsorted(list(bounds), side="left")
+            series = series.iloc[lo:hi]
 
-        vals = (
-            pd.to_numeric(
-                df.loc[mask, "value"], errors="coerce"
-            )
-            .dropna()
-        )
+        vals = series.dropna()
         if vals.empty:
-            raise ValueError(
-                "Ingen datapunkter for "
-                f"element_id={element_id!r}, time_offset={time_offset!r}, "
-                f"month={year_month!r}"
-            )
+            raise MonthlyStats._no_data(element_id, time_offset, year_month)
 
         return vals
 
+    @staticmethod
+    def _month_bounds(
+        year_month: str,
+    ) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """
+        Start på måneden og neste måned i UTC.
+
+        Parametre:
+            year_month (str): År-måned streng (YYYY-MM).
+
+        Returnerer:
+            tuple[pd.Timestamp, pd.Timestamp] | None: Halvåpent
+            intervall [start, slutt), eller None ved ugyldig format.
+        """
+        match = _YEAR_MONTH.fullmatch(year_month)
+        if match is None or not 1 <= int(match.group(2)) <= 12:
+            return None
+        start = pd.Timestamp(
+            year=int(match.group(1)), month=int(match.group(2)), day=1,
+            tz="UTC",
+        )
+        return start, start + pd.offsets.MonthBegin()
+
+    def build_stats_cube(self, city: str) -> StatsCube:
+        """
+        Bygg månedskuben for en by, eller hent den hvis den finnes.
+
+        Kuben lagres i kolonnebuffermappen og gjenbrukes til kildefilene
+        endres, så den kan bygges én gang etter innhenting. Senere
+        spørringer med kjent offset slår kun opp i kuben. Med
+        use_running_aggregates bygges kuben fra de løpende
+        månedsaggregatene i stedet for fra alle radene, og kvantilene
+        er da tilnærmede.
+
+        Parametre:
+            city (str): Bykode.
+
+        Returnerer:
+            StatsCube: Månedsstatistikk for alle elementer og offsets.
+        """
+        if self.disk_cache is None:
+            return cube_for(self._load_city(city))
+        try:
+            sources = self._resolve_sources(city)
+        except FileNotFoundError:
+            return cube_for(self._load_city(city))
+        derived = os.path.join(
+            self.data_dir, self.derived_template.format(city=city)
+        )
+        if self.use_running_aggregates:
+            store = ColumnarCache(
+                self.disk_cache.root, suffix=RUNNING_CUBE_SUFFIX
+            )
+            return cube_for_sources(
+                [*sources, derived], store,
+                lambda: StatsCube.from_aggregates(
+                    self._running_aggregates(city)
+                ),
+            )
+        store = ColumnarCache(self.disk_cache.root, suffix=CUBE_SUFFIX)
+        return cube_for_sources(
+            [*sources, derived], store,
+            lambda: StatsCube.from_index(self._series_index(city)),
+        )
+
+    @staticmethod
+    def _no_data(
+        element_id: str,
+        time_offset: str,
+        year_month: str | None,
+    ) -> ValueError:
+        """Lag feilen for manglende datapunkter."""
+        return ValueError(
+            "Ingen datapunkter for "
+            f"element_id={element_id!r}, time_offset={time_offset!r}, "
+            f"month={year_month!r}"
+        )
+
     def compute_single_month(
         self,
         year_month: str,
@@ -80,9 +162,43 @@ class MonthlyStats(DataLoader):
         if time_offset is None:
             time_offset = self._get_min_offset(city, element_id)
 
-        df = self._load_city(city)
+        if self.chunk_rows:
+            bounds = self._month_bounds(year_month)
+            if bounds is None:
+                raise self._no_data(element_id, time_offset, year_month)
+            start, end = bounds
+            part = self._aggregate_chunks(
+                city, element_id, time_offset,
+                lambda times: np.full(len(times), year_month, dtype=object),
+                lambda times, values, keys: (times >= start) & (times < end),
+            ).groups.get(year_month)
+            if part is None or part.count == 0:
+                raise self._no_data(element_id, time_offset, year_month)
+            return {
+                "mean": float(part.mean),
+                "median": part.median(),
+                "std": part.std(ddof=0),
+            }
+
+        if self.use_stats_cube:
+            bounds = self._month_bounds(year_month)
+            stats = None if bounds is None else (
+                self.build_stats_cube(city).lookup(
+                    element_id, time_offset,
+                    month_period(bounds[0].year, bounds[0].month),
+                )
+            )
+            if stats is None:
+                raise self._no_data(element_id, time_offset, year_month)
+            return {
+                "mean": StatsCube.mean(stats),
+                "median": stats["median"],
+                "std": StatsCube.std(stats, ddof=0),
+            }
+
         vals = self._select_values(
-            df, year_month, element_id, time_offset
+            self._series(city, element_id, time_offset),
+            year_month, element_id, time_offset,
         )
         return {
             "mean": float(vals.mean()),
@@ -110,24 +226,47 @@ class MonthlyStats(DataLoader):
         if time_offset is None:
             time_offset = self._get_min_offset(city, element_id)
 
-        df = self._load_city(city)
+        if self.chunk_rows:
+            grouped = self._aggregate_chunks(
+                city, element_id, time_offset, period_keys
+            )
+            rows = [
+                (period_label(p), part.mean, part.median(), part.std(ddof=1))
+                for p, part in grouped.items() if part.count
+            ]
+            if not rows:
+                raise self._no_data(element_id, time_offset, None)
+            return pd.DataFrame(
+                rows, columns=["year_month", "mean", "median", "std"]
+            )
+
+        if self.use_stats_cube:
+            months = self.build_stats_cube(city).months(
+                element_id, time_offset
+            )
+            if months.empty:
+                raise self._no_data(element_id, time_offset, None)
+            return pd.DataFrame({
+                "year_month": months["year_month"],
+                "mean": StatsCube.mean(months),
+                "median": months["median"],
+                "std": StatsCube.std(months, ddof=1),
+            })
+
+        index = self._series_index(city)
+        series = index.series(element_id, time_offset)
+        periods = index.calendar_for(element_id, time_offset).period
+        keep = (series.notna() & (periods != NAT_KEY)).to_numpy()
         vals = self._select_values(
-            df, None, element_id, time_offset
-        )
-        df_filtered = df.loc[vals.index].copy()
-        df_filtered["year_month"] = (
-            df_filtered["referenceTime"]
-            .dt.tz_localize(None)
-            .dt.to_period("M")
+            series[keep], None, element_id, time_offset
         )
-        df_filtered["value"] = vals.to_numpy(dtype=np.float64)
 
         out = (
-            df_filtered.groupby("year_month")["value"]
+            vals.groupby(pd.Index(periods[keep], name="year_month"))
             .agg(["mean", "median", "std"])
             .reset_index()
         )
-        out["year_month"] = out["year_month"].astype(str)
+        out["year_month"] = [period_label(p) for p in out["year_month"]]
 
         return out
 
@@ -1,7 +1,11 @@
 """Finner outliers i dataene ved hjelp av IQR-metoden."""
 
+import numpy as np
 import pandas as pd
 
+from collections.abc import Iterator
+
+from aggregates import NAT_KEY, GroupedAggregate, period_keys, period_label
 from basedata import DataLoader
 from outlierdetector import OutlierDetector
 
@@ -14,6 +18,7 @@ class OutlierAnalysis(DataLoader):
         data_dir: str,
         *,
         whisker: float | None = None,
+        chunk_rows: int | None = None,
     ) -> None:
         """
         Initialisér OutlierAnalysis med data-katalog og whisker-verdi.
@@ -22,8 +27,10 @@ class OutlierAnalysis(DataLoader):
             data_dir (str): Katalog med CSV-filer.
             whisker (float | None): Faktor for IQR-whisker.
             Hvis None, bruker default.
+            chunk_rows (int | None): Les filene i biter på høyst så
+            mange rader (minnebegrenset modus).
         """
-        super().__init__(data_dir)
+        super().__init__(data_dir, chunk_rows=chunk_rows)
         self.detector = OutlierDetector(whisker)
 
     def find_outliers_per_month(
@@ -50,28 +57,25 @@ class OutlierAnalysis(DataLoader):
         if time_offset is None:
             time_offset = self._get_min_offset(city, element_id)
 
-        df = self._load_city(city)
-        df = df[
-            (df["elementId"] == element_id)
-            & (df["timeOffset"] == time_offset)
-        ].copy()
-
-        df["value"] = pd.to_numeric(df["value"], errors="coerce")
-        df["referenceTime"] = pd.to_datetime(
-            df["referenceTime"], utc=True
-        )
-        df["year_month"] = (
-            df["referenceTime"]
-            .dt.tz_localize(None)
-            .dt.to_period("M")
-            .astype(str)
-        )
+        if self.chunk_rows:
+            full, _, outliers = self._outlier_passes(
+                city, element_id, time_offset
+            )
+            counts = [
+                (period_label(p), outliers.get(p, 0), part.rows)
+                for p, part in full.items()
+            ]
+        else:
+            counts = [
+                (ym, self.detector.count_outliers_iqr(grp, extreme=True),
+                 len(grp))
+                for ym, grp in self._monthly_groups(
+                    city, element_id, time_offset
+                )
+            ]
 
         rows: list[dict[str, object]] = []
-        for ym, grp in df.groupby("year_month"):
-            mask = self.detector.detect_iqr(grp["value"], extreme=True)
-            count = int(mask.sum())
-            total = len(grp)
+        for ym, count, total in counts:
             if include_empty_months or count > 0:
                 percentage = round(100 * count / total, 1) if total else 0.0
                 rows.append(
@@ -123,41 +127,78 @@ class OutlierAnalysis(DataLoader):
         if time_offset is None:
             time_offset = self._get_min_offset(city, element_id)
 
-        df = self._load_city(city)
-        df = df[
-            (df["elementId"] == element_id)
-            & (df["timeOffset"] == time_offset)
-        ].copy()
+        if self.chunk_rows:
+            rows = self._stats_chunked(
+                city, element_id, time_offset, statistic
+            )
+        else:
+            rows = self._stats_in_memory(
+                city, element_id, time_offset, statistic
+            )
 
-        df["value"] = pd.to_numeric(df["value"], errors="coerce")
-        df["referenceTime"] = pd.to_datetime(
-            df["referenceTime"], utc=True
-        )
-        df["year_month"] = (
-            df["referenceTime"]
-            .dt.tz_localize(None)
-            .dt.to_period("M")
-            .astype(str)
+        cols = [
+            "year_month",
+            f"{statistic}_with_outliers",
+            f"{statistic}_without_outliers",
+            "outliers_removed",
+            "element_id",
+        ]
+        return (
+            pd.DataFrame(rows, columns=cols)
+            .sort_values("year_month")
+            .reset_index(drop=True)
         )
 
+    def _monthly_groups(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+    ) -> Iterator[tuple[str, pd.Series]]:
+        """
+        Del serien i måneder etter kalendernøklene fra indeksen.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+
+        Returnerer:
+            Iterator[tuple[str, pd.Series]]: ('YYYY-MM', verdier) per
+            måned, i stigende rekkefølge.
+        """
+        index = self._series_index(city)
+        series = index.series(element_id, time_offset)
+        periods = index.calendar_for(element_id, time_offset).period
+        dated = periods != NAT_KEY
+        for period, grp in series[dated].groupby(periods[dated]):
+            yield period_label(period), grp
+
+    def _stats_in_memory(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+        statistic: str,
+    ) -> list[dict[str, object]]:
+        """Rader for stats_with_without_outliers fra serien i minnet."""
         rows: list[dict[str, object]] = []
-        for ym, grp in df.groupby("year_month"):
-            series = grp["value"]
-            mask = self.detector.detect_iqr(series, extreme=True)
+        for ym, grp in self._monthly_groups(city, element_id, time_offset):
+            mask = self.detector.detect_iqr(grp, extreme=True)
 
-            non_na = series.dropna()
+            non_na = grp.dropna()
             if non_na.empty:
                 continue
 
-            cleaned = series[~mask].dropna()
+            cleaned = grp[~mask].dropna()
             if statistic == "mean":
-                full_val = series.mean()
+                full_val = grp.mean()
                 clean_val = cleaned.mean() if not cleaned.empty else None
             elif statistic == "median":
-                full_val = series.median()
+                full_val = grp.median()
                 clean_val = cleaned.median() if not cleaned.empty else None
             else:
-                full_val = series.std(ddof=0)
+                full_val = grp.std(ddof=0)
                 clean_val = (
                     cleaned.std(ddof=0)
                     if not cleaned.empty
@@ -175,19 +216,93 @@ class OutlierAnalysis(DataLoader):
                     "element_id": element_id,
                 }
             )
+        return rows
 
-        cols = [
-            "year_month",
-            f"{statistic}_with_outliers",
-            f"{statistic}_without_outliers",
-            "outliers_removed",
-            "element_id",
-        ]
-        return (
-            pd.DataFrame(rows, columns=cols)
-            .sort_values("year_month")
-            .reset_index(drop=True)
+    def _stats_chunked(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+        statistic: str,
+    ) -> list[dict[str, object]]:
+        """Rader for stats_with_without_outliers fra delaggregater."""
+        full, cleaned, outliers = self._outlier_passes(
+            city, element_id, time_offset
+        )
+        rows: list[dict[str, object]] = []
+        for period, part in full.items():
+            if not part.count:
+                continue
+            # np.float64 gir samme avrunding som i minnet
+            full_val = np.float64(part.statistic(statistic, ddof=0))
+            clean = cleaned.groups.get(period)
+            clean_val = (
+                np.float64(clean.statistic(statistic, ddof=0))
+                if clean is not None and clean.count else None
+            )
+            rows.append(
+                {
+                    "year_month": period_label(period),
+                    f"{statistic}_with_outliers": round(full_val, 3),
+                    f"{statistic}_without_outliers": (
+                        round(clean_val, 3) if clean_val is not None else None
+                    ),
+                    "outliers_removed": outliers.get(period, 0),
+                    "element_id": element_id,
+                }
+            )
+        return rows
+
+    def _outlier_passes(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+    ) -> tuple[GroupedAggregate, GroupedAggregate, dict[int, int]]:
+        """
+        Finn outliers per måned i to pass over filen, én bit om gangen.
+
+        Første pass gir kvartilene per måned fra kvantilskissene. Andre
+        pass teller outliers med disse grensene og bygger aggregater for
+        verdiene som er igjen.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+
+        Returnerer:
+            tuple: (aggregater per måned, aggregater uten outliers per
+            måned, antall outliers per måned), med måneder fra
+            period_keys som nøkler.
+        """
+        full = self._aggregate_chunks(
+            city, element_id, time_offset, period_keys
         )
+        whisker = self.detector.whisker or 3.0
+        periods = np.array(sorted(full.groups), dtype=np.int64)
+        bounds = np.array(
+            [full.groups[p].iqr_bounds(whisker) for p in periods],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+
+        cleaned = GroupedAggregate()
+        outliers: dict[int, int] = {}
+        for times, values in self._iter_series_chunks(
+            city, element_id, time_offset
+        ):
+            # Grensene for radens måned, funnet med binærsøk
+            keys = period_keys(times)
+            at = np.searchsorted(periods, keys).clip(0, periods.size - 1)
+            limits = np.where(
+                (periods[at] == keys)[:, None], bounds[at], np.nan
+            )
+            mask = (values < limits[:, 0]) | (values > limits[:, 1])
+            for p, n in zip(*np.unique(keys[mask], return_counts=True)):
+                outliers[int(p)] = outliers.get(int(p), 0) + int(n)
+            if (~mask).any():
+                cleaned.update(keys[~mask], values[~mask])
+        return full, cleaned, outliers
 
 
 __all__ = ["OutlierAnalysis"]
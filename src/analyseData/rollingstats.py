@@ -0,0 +1,554 @@
+"""Glidende statistikk over daglige serier, i bulk og strømmende."""
+
+import bisect
+import numpy as np
+import pandas as pd
+import warnings
+
+from collections import deque
+from collections.abc import Iterable
+
+try:
+    from .basedata import DataLoader
+except ImportError:
+    from basedata import DataLoader
+
+# Statistikk som beregnes når ingen er angitt
+DEFAULT_STATISTICS: tuple[str, ...] = ("mean", "std", "min", "max")
+
+# Antall vinduer per blokk ved kvantiler, begrenser minnebruken
+QUANTILE_BLOCK_ROWS = 4096
+
+
+def quantile_name(q: float) -> str:
+    """Kolonnenavn for en kvantil, f.eks. 0.05 -> 'q05'."""
+    return f"q{int(round(q * 100)):02d}"
+
+
+def _window_starts(n: int, window: int) -> np.ndarray:
+    """Første posisjon i vinduet som slutter i hver posisjon."""
+    return np.maximum(np.arange(n) - window + 1, 0)
+
+
+def rolling_moments(
+    values: np.ndarray,
+    window: int,
+    ddof: int = 1,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Antall, snitt og standardavvik i glidende vinduer med kumulative summer.
+
+    Verdiene forskyves med snittet før summeringen, så kvadratsummene
+    ikke mister presisjon for serier langt fra null.
+
+    Parametre:
+        values (np.ndarray): Verdier på et regulært rutenett, NaN mangler.
+        window (int): Vinduslengde i antall punkter.
+        ddof (int): Frihetsgrader for standardavviket.
+
+    Returnerer:
+        tuple: (antall gyldige, snitt, standardavvik) per posisjon. Snitt
+        og standardavvik er NaN der vinduet har for få verdier.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    shift = float(values[valid].mean()) if valid.any() else 0.0
+    x = np.where(valid, values - shift, 0.0)
+
+    starts = _window_starts(values.size, window)
+    ends = np.arange(1, values.size + 1)
+    count = np.r_[0, np.cumsum(valid)]
+    s1 = np.r_[0.0, np.cumsum(x)]
+    s2 = np.r_[0.0, np.cumsum(x * x)]
+    n = count[ends] - count[starts]
+    total = s1[ends] - s1[starts]
+    squares = s2[ends] - s2[starts]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(n > 0, total / n + shift, np.nan)
+        m2 = np.maximum(squares - total * total / n, 0.0)
+        std = np.sqrt(np.where(n > ddof, m2 / (n - ddof), np.nan))
+    return n, mean, std
+
+
+def rolling_extrema(
+    values: np.ndarray,
+    window: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Minimum og maksimum i glidende vinduer (van Herk/Gil-Werman).
+
+    Serien deles i blokker på vinduslengden. Med kumulativt maksimum
+    forover og bakover i hver blokk er maksimum i et vindu det største
+    av to oppslag, uavhengig av vinduslengden. Dette er den vektoriserte
+    motparten til en monoton kø.
+
+    Parametre:
+        values (np.ndarray): Verdier på et regulært rutenett, NaN mangler.
+        window (int): Vinduslengde i antall punkter.
+
+    Returnerer:
+        tuple[np.ndarray, np.ndarray]: (minimum, maksimum) per
+        posisjon, NaN der vinduet ikke har gyldige verdier.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    return (
+        -_rolling_max(np.where(missing, -np.inf, -values), window),
+        _rolling_max(np.where(missing, -np.inf, values), window),
+    )
+
+
+def _rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """Glidende maksimum der -inf markerer manglende verdier."""
+    n = values.size
+    out = np.maximum.accumulate(values) if n else values.copy()
+    if n > window:
+        pad = (-n) % window
+        blocks = np.r_[values, np.full(pad, -np.inf)].reshape(-1, window)
+        forward = np.maximum.accumulate(blocks, axis=1).ravel()
+        backward = np.maximum.accumulate(
+            blocks[:, ::-1], axis=1
+        )[:, ::-1].ravel()
+        ends = np.arange(window - 1, n)
+        out[window - 1:] = np.maximum(
+            backward[ends - window + 1], forward[ends]
+        )
+    return np.where(np.isneginf(out), np.nan, out)
+
+
+def rolling_quantiles(
+    values: np.ndarray,
+    window: int,
+    quantiles: Iterable[float],
+) -> np.ndarray:
+    """
+    Kvantiler i glidende vinduer, med lineær interpolasjon.
+
+    Vinduene er visninger inn i samme minne (sliding_window_view) og
+    behandles i blokker, så minnebruken er begrenset.
+
+    Parametre:
+        values (np.ndarray): Verdier på et regulært rutenett, NaN mangler.
+        window (int): Vinduslengde i antall punkter.
+        quantiles (Iterable[float]): Kvantiler mellom 0 og 1.
+
+    Returnerer:
+        np.ndarray: Form (antall kvantiler, antall posisjoner).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    quantiles = list(quantiles)
+    out = np.full((len(quantiles), values.size), np.nan)
+    if not quantiles or values.size == 0:
+        return out
+    padded = np.r_[np.full(window - 1, np.nan), values]
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    with warnings.catch_warnings():
+        # Vinduer uten verdier gir NaN, som er ønsket
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for lo in range(0, values.size, QUANTILE_BLOCK_ROWS):
+            hi = min(lo + QUANTILE_BLOCK_ROWS, values.size)
+            out[:, lo:hi] = np.nanquantile(
+                windows[lo:hi], quantiles, axis=1
+            )
+    return out
+
+
+def rolling_frame(
+    daily: pd.Series,
+    window: int,
+    *,
+    statistics: Iterable[str] = DEFAULT_STATISTICS,
+    quantiles: Iterable[float] = (),
+    min_periods: int | None = None,
+) -> pd.DataFrame:
+    """
+    Glidende statistikk for én serie på et regulært rutenett.
+
+    Parametre:
+        daily (pd.Series): Verdier med regulær tidsindeks.
+        window (int): Vinduslengde i antall punkter.
+        statistics (Iterable[str]): Blant 'mean', 'std', 'min', 'max'.
+        quantiles (Iterable[float]): Kvantiler i tillegg.
+        min_periods (int | None): Minste antall verdier i vinduet.
+        Lik vinduslengden hvis None, som i pandas.
+
+    Returnerer:
+        pd.DataFrame: Kolonnene 'count' og valgt statistikk, med samme
+        indeks som serien.
+
+    Hever:
+        ValueError: Ved ukjent statistikk eller ugyldig vindu.
+    """
+    statistics = list(statistics)
+    unknown = set(statistics) - set(DEFAULT_STATISTICS)
+    if unknown:
+        raise ValueError(f"Ukjent statistikk: {sorted(unknown)}")
+    if window < 1:
+        raise ValueError("window må være minst 1")
+    min_periods = window if min_periods is None else min_periods
+
+    values = daily.to_numpy(dtype=np.float64)
+    count, mean, std = rolling_moments(values, window)
+    columns = {"count": count, "mean": mean, "std": std}
+    if "min" in statistics or "max" in statistics:
+        columns["min"], columns["max"] = rolling_extrema(values, window)
+
+    out = pd.DataFrame(
+        {"count": count, **{name: columns[name] for name in statistics}},
+        index=daily.index,
+    )
+    quantiles = list(quantiles)
+    for q, row in zip(quantiles, rolling_quantiles(values, window,
+                                                   quantiles)):
+        out[quantile_name(q)] = row
+    out.loc[count < min_periods, out.columns[1:]] = np.nan
+    return out
+
+
+class RollingWindow:
+    """
+    Strømmende glidende vindu over daglige verdier.
+
+    Holder summer for snitt og varians, monotone køer for minimum og
+    maksimum og en sortert liste for kvantiler. Hver ny dag koster
+    O(1) for snitt, varians, minimum og maksimum, og O(vindu) i verste
+    fall for kvantilene.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        *,
+        quantiles: Iterable[float] = (),
+        min_periods: int | None = None,
+        freq: str = "D",
+    ) -> None:
+        """
+        Initialiserer et tomt vindu.
+
+        Parametre:
+            window (int): Vinduslengde i antall punkter.
+            quantiles (Iterable[float]): Kvantiler som skal beregnes.
+            min_periods (int | None): Minste antall verdier i vinduet.
+            Lik vinduslengden hvis None.
+            freq (str): Avstand mellom punktene. Hull fylles med NaN.
+
+        Hever:
+            ValueError: Hvis window er mindre enn 1.
+        """
+        if window < 1:
+            raise ValueError("window må være minst 1")
+        self.window = window
+        self.quantiles = list(quantiles)
+        self.min_periods = window if min_periods is None else min_periods
+        self.freq = pd.tseries.frequencies.to_offset(freq)
+        self.last_time: pd.Timestamp | None = None
+
+        self._values: deque[float] = deque()
+        self._pushed = 0
+        self._shift: float | None = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._sorted: list[float] = []
+        self._min: deque[tuple[int, float]] = deque()
+        self._max: deque[tuple[int, float]] = deque()
+
+    def push(self, value: float) -> dict[str, float]:
+        """
+        Legg til neste punkt og returner statistikken for vinduet.
+
+        Parametre:
+            value (float): Verdien, NaN for manglende.
+
+        Returnerer:
+            dict[str, float]: count, mean, std, min, max og kvantiler.
+        """
+        value = float(value)
+        if len(self._values) == self.window:
+            self._evict(self._values.popleft())
+
+        i = self._pushed
+        self._values.append(value)
+        self._pushed += 1
+        if not np.isnan(value):
+            if self._shift is None:
+                self._shift = value
+            x = value - self._shift
+            self._sum += x
+            self._sumsq += x * x
+            bisect.insort(self._sorted, value)
+            while self._max and self._max[-1][1] <= value:
+                self._max.pop()
+            self._max.append((i, value))
+            while self._min and self._min[-1][1] >= value:
+                self._min.pop()
+            self._min.append((i, value))
+        for queue in (self._min, self._max):
+            if queue and queue[0][0] <= i - self.window:
+                queue.popleft()
+
+        if self._pushed % self.window == 0:
+            self._resum()
+        return self._current()
+
+    def extend(self, times: Iterable, values: Iterable[float]) -> pd.DataFrame:
+        """
+        Legg til nye dager og returner statistikken for hver av dem.
+
+        Tidspunkter som ikke er nyere enn forrige dag hoppes over, og
+        hull i rekken fylles med manglende verdier.
+
+        Parametre:
+            times (Iterable): Tidspunkter i stigende rekkefølge.
+            values (Iterable[float]): Verdiene.
+
+        Returnerer:
+            pd.DataFrame: Én rad per nye dag, med referenceTime som
+            indeks og kolonnene fra push.
+        """
+        rows, index = [], []
+        for time, value in zip(pd.DatetimeIndex(times).floor(self.freq),
+                               values):
+            if self.last_time is not None:
+                if time <= self.last_time:
+                    continue
+                gap = self.last_time + self.freq
+                while gap < time:
+                    rows.append(self.push(np.nan))
+                    index.append(gap)
+                    gap += self.freq
+            rows.append(self.push(value))
+            index.append(time)
+            self.last_time = time
+        return pd.DataFrame(
+            rows, index=pd.DatetimeIndex(index, name="referenceTime"),
+            columns=self._columns(),
+        )
+
+    def _columns(self) -> list[str]:
+        """Kolonnene i resultatet fra push."""
+        return [
+            "count", *DEFAULT_STATISTICS,
+            *(quantile_name(q) for q in self.quantiles),
+        ]
+
+    def _evict(self, value: float) -> None:
+        """Fjern den eldste verdien fra summene og den sorterte listen."""
+        if np.isnan(value):
+            return
+        x = value - self._shift
+        self._sum -= x
+        self._sumsq -= x * x
+        del self._sorted[bisect.bisect_left(self._sorted, value)]
+
+    def _resum(self) -> None:
+        """Regn summene på nytt fra vinduet, så avrundingsfeil ikke vokser."""
+        if self._shift is None:
+            return
+        x = np.asarray(self._sorted) - self._shift
+        self._sum = float(x.sum())
+        self._sumsq = float((x * x).sum())
+
+    def _current(self) -> dict[str, float]:
+        """Statistikken for vinduet slik det er nå."""
+        n = len(self._sorted)
+        out = dict.fromkeys(self._columns(), np.nan)
+        out["count"] = n
+        if n < max(self.min_periods, 1):
+            return out
+
+        mean = self._sum / n
+        out["mean"] = mean + self._shift
+        if n > 1:
+            m2 = max(self._sumsq - n * mean * mean, 0.0)
+            out["std"] = float(np.sqrt(m2 / (n - 1)))
+        out["min"] = self._min[0][1]
+        out["max"] = self._max[0][1]
+        for q in self.quantiles:
+            pos = q * (n - 1)
+            lo = int(np.floor(pos))
+            hi = min(lo + 1, n - 1)
+            out[quantile_name(q)] = (
+                self._sorted[lo]
+                + (self._sorted[hi] - self._sorted[lo]) * (pos - lo)
+            )
+        return out
+
+
+class RollingStats(DataLoader):
+    """Utvider DataLoader med glidende statistikk og anomalier."""
+
+    def _daily(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str | None,
+        freq: str = "D",
+    ) -> pd.Series:
+        """Serien på et regulært rutenett, snitt per punkt og NaN i hull."""
+        if time_offset is None:
+            time_offset = self._get_min_offset(city, element_id)
+        series = self._series(city, element_id, time_offset)
+        series = series[series.index.notna()]
+        if series.empty:
+            raise ValueError(
+                f"Ingen data for city={city!r}, element_id={element_id!r}"
+            )
+        grid = series.groupby(series.index.floor(freq)).mean()
+        return grid.reindex(
+            pd.date_range(grid.index[0], grid.index[-1], freq=freq,
+                          name="referenceTime")
+        )
+
+    def rolling(
+        self,
+        city: str,
+        element_id: str,
+        *,
+        windows: Iterable[int] = (30, 365),
+        statistics: Iterable[str] = DEFAULT_STATISTICS,
+        quantiles: Iterable[float] = (),
+        min_periods: int | None = None,
+        time_offset: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Glidende statistikk for ett element i én by, for flere vinduer.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            windows (Iterable[int]): Vinduslengder i dager.
+            statistics (Iterable[str]): Blant 'mean', 'std', 'min', 'max'.
+            quantiles (Iterable[float]): Kvantiler i tillegg, f.eks. 0.5.
+            min_periods (int | None): Minste antall dager med data i
+            vinduet. Lik vinduslengden hvis None.
+            time_offset (str | None): PT<n>H-offset. Finner minste hvis
+            None.
+
+        Returnerer:
+            pd.DataFrame: Kolonnene 'referenceTime', 'window', 'value',
+            'count' og valgt statistikk, én rad per dag og vindu.
+
+        Hever:
+            ValueError: Ved ukjent statistikk eller manglende data.
+        """
+        daily = self._daily(city, element_id, time_offset)
+        frames = []
+        for window in windows:
+            out = rolling_frame(
+                daily, int(window), statistics=statistics,
+                quantiles=quantiles, min_periods=min_periods,
+            )
+            out.insert(0, "value", daily)
+            out.insert(0, "window", int(window))
+            frames.append(out.reset_index())
+        return pd.concat(frames, ignore_index=True)
+
+    def compute_rolling(
+        self,
+        cities: Iterable[str],
+        element_ids: Iterable[str],
+        *,
+        max_workers: int | None = None,
+        **kwargs,
+    ) -> pd.DataFrame:
+        """
+        Glidende statistikk for mange byer og elementer samtidig.
+
+        Parametre:
+            cities (Iterable[str]): Bykoder.
+            element_ids (Iterable[str]): ElementId-er.
+            max_workers (int | None): Antall prosesser, som i batch.
+            **kwargs: Videre argumenter til rolling.
+
+        Returnerer:
+            pd.DataFrame: Resultatet fra rolling med kolonnene 'city' og
+            'element_id' først.
+        """
+        return self.batch(
+            "rolling", cities, element_ids, max_workers=max_workers,
+            **kwargs,
+        )
+
+    def anomaly(
+        self,
+        city: str,
+        element_id: str,
+        *,
+        window: int = 30,
+        min_periods: int | None = None,
+        time_offset: str | None = None,
+    ) -> pd.DataFrame:
+        """
+        Avvik fra klimatologien, glattet med et glidende snitt.
+
+        Klimatologien er snittet for hver kalenderdag over alle år.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            window (int): Vinduslengde i dager for glattingen.
+            min_periods (int | None): Minste antall dager med data i
+            vinduet. Lik vinduslengden hvis None.
+            time_offset (str | None): PT<n>H-offset. Finner minste hvis
+            None.
+
+        Returnerer:
+            pd.DataFrame: Kolonnene 'referenceTime', 'value',
+            'climatology', 'anomaly' og 'rolling_anomaly'.
+        """
+        daily = self._daily(city, element_id, time_offset)
+        day = daily.index.month * 100 + daily.index.day
+        climatology = daily.groupby(day).transform("mean")
+        anomaly = daily - climatology
+        count, mean, _ = rolling_moments(anomaly.to_numpy(), window)
+        min_periods = window if min_periods is None else min_periods
+        return pd.DataFrame({
+            "value": daily,
+            "climatology": climatology,
+            "anomaly": anomaly,
+            "rolling_anomaly": np.where(count >= min_periods, mean, np.nan),
+        }).reset_index()
+
+    def rolling_stream(
+        self,
+        city: str,
+        element_id: str,
+        window: int,
+        *,
+        quantiles: Iterable[float] = (),
+        min_periods: int | None = None,
+        time_offset: str | None = None,
+    ) -> RollingWindow:
+        """
+        Lag et strømmende vindu som er fylt med siste dager i historikken.
+
+        Nye dager legges til med RollingWindow.extend, som returnerer
+        vindusverdiene for dagene som kom inn.
+
+        Parametre:
+            city (str): Bykode.
+            element_id (str): ElementId.
+            window (int): Vinduslengde i dager.
+            quantiles (Iterable[float]): Kvantiler som skal beregnes.
+            min_periods (int | None): Minste antall dager med data.
+            time_offset (str | None): PT<n>H-offset. Finner minste hvis
+            None.
+
+        Returnerer:
+            RollingWindow: Vindu klart for nye dager.
+        """
+        daily = self._daily(city, element_id, time_offset)
+        stream = RollingWindow(
+            window, quantiles=quantiles, min_periods=min_periods
+        )
+        tail = daily.iloc[-window:]
+        stream.extend(tail.index, tail.to_numpy())
+        return stream
+
+
+__all__ = [
+    "RollingStats", "RollingWindow", "quantile_name", "rolling_extrema",
+    "rolling_frame", "rolling_moments", "rolling_quantiles",
+]
@@ -0,0 +1,541 @@
+"""Løpende, flettbare aggregater per måned og år, oppdatert inkrementelt."""
+
+import hashlib
+import json
+import numpy as np
+import os
+import pandas as pd
+import threading
+import weakref
+
+from collections.abc import Callable, Iterable
+from typing import NamedTuple
+
+try:
+    from .aggregates import (
+        DEFAULT_SKETCH_SIZE, GroupedAggregate, PartialAggregate,
+    )
+    from .datasetcache import file_fingerprint
+    from .seriesindex import SeriesIndex, index_for
+except ImportError:
+    from aggregates import (
+        DEFAULT_SKETCH_SIZE, GroupedAggregate, PartialAggregate,
+    )
+    from datasetcache import file_fingerprint
+    from seriesindex import SeriesIndex, index_for
+
+# Endelse på tilstandsfilene ved siden av kolonnebufferne
+RUNNING_SUFFIX = ".running.json"
+
+# Øk ved endring av tilstandsformatet, så gamle filer bygges på nytt
+STATE_VERSION = 3
+
+# Byte fra starten og slutten av en kildefil som sjekkes før en utvidelse
+_CHECK_BLOCK = 1 << 16
+
+_NAT = np.iinfo(np.int64).min
+
+
+class RunningAggregates:
+    """
+    Delaggregater per måned og per år for alle serier i en by.
+
+    Hver (elementId, timeOffset) har et vannmerke: siste tidspunkt som
+    er tatt med. Nye rader etter vannmerket flettes inn i bøttene for
+    sine måneder og år, så kostnaden følger antall nye rader og ikke
+    lengden på historikken. En serie uten vannmerke tar med alle sine
+    rader. Aggregatene gjelder kun så lenge data bare legges til på
+    slutten; running_for_sources sjekker dette og bygger på nytt
+    ellers. Bøttene endres aldri på stedet, en oppdatering bytter ut
+    bøttene den treffer, så en kopi fra copy kan oppdateres mens
+    originalen leses.
+    """
+
+    def __init__(self, sketch_size: int = DEFAULT_SKETCH_SIZE) -> None:
+        """
+        Initialiserer uten data.
+
+        Parametre:
+            sketch_size (int): Størrelse på kvantilskissen per bøtte.
+        """
+        self.sketch_size = sketch_size
+        self.monthly: dict[tuple[str, str], GroupedAggregate] = {}
+        self.yearly: dict[tuple[str, str], GroupedAggregate] = {}
+        self.watermarks: dict[tuple[str, str], int] = {}
+
+    def follows(self, index: SeriesIndex) -> bool:
+        """
+        Sjekk om radene i en indeks kun ligger etter vannmerkene.
+
+        Parametre:
+            index (SeriesIndex): Indeks over nye rader.
+
+        Returnerer:
+            bool: True hvis hver serie starter etter sitt vannmerke,
+            eller er ny.
+        """
+        stamps = index.times.asi8
+        for element_id, offset in index.keys():
+            watermark = self.watermarks.get((str(element_id), str(offset)))
+            pos = index.positions(element_id, offset)
+            dated = stamps[pos][stamps[pos] != _NAT]
+            if watermark is not None and dated.size and dated[0] <= watermark:
+                return False
+        return True
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Flett inn rader som er nyere enn vannmerket for sin serie.
+
+        Parametre:
+            df (pd.DataFrame): Langt format med referenceTime, elementId,
+            timeOffset og value. Kan gjerne være kun de nye radene.
+
+        Returnerer:
+            int: Antall rader som ble tatt med.
+        """
+        if df.empty:
+            return 0
+        return self.append_index(SeriesIndex(df))
+
+    def append_index(
+        self,
+        index: SeriesIndex,
+        changes: dict[tuple[str, str], tuple[set, set]] | None = None,
+    ) -> int:
+        """
+        Flett inn rader fra en serieindeks etter vannmerkene.
+
+        Parametre:
+            index (SeriesIndex): Indeks over nye eller alle rader.
+            changes (dict | None): Fylles med (måneder, år) som ble
+            endret per serie, om gitt.
+
+        Returnerer:
+            int: Antall rader som ble tatt med.
+        """
+        stamps = index.times.asi8
+        added = 0
+        for element_id, offset in index.keys():
+            key = (str(element_id), str(offset))
+            pos = index.positions(element_id, offset)
+            # Serien er sortert på tid, NaT først
+            start = np.searchsorted(
+                stamps[pos], self.watermarks.get(key, _NAT), side="right"
+            )
+            pos = pos[start:]
+            if pos.size == 0:
+                continue
+
+            values = index.values[pos]
+            touched = []
+            for buckets, keys in (
+                (self.monthly, index.calendar.period[pos]),
+                (self.yearly, index.calendar.year[pos]),
+            ):
+                delta = GroupedAggregate(self.sketch_size)
+                delta.update(keys, values)
+                buckets[key] = self._merged(buckets.get(key), delta)
+                touched.append(set(delta.groups))
+            self.watermarks[key] = int(stamps[pos[-1]])
+            if changes is not None:
+                months, years = changes.setdefault(key, (set(), set()))
+                months |= touched[0]
+                years |= touched[1]
+            added += pos.size
+        return added
+
+    def _merged(
+        self,
+        grouped: GroupedAggregate | None,
+        delta: GroupedAggregate,
+    ) -> GroupedAggregate:
+        """Nytt gruppert aggregat med delta flettet inn i kopier."""
+        merged = GroupedAggregate(self.sketch_size)
+        if grouped is not None:
+            merged.groups = dict(grouped.groups)
+        for period, part in delta.groups.items():
+            old = merged.groups.get(period)
+            # part er ny, så den kan ta imot den gamle bøtta
+            merged.groups[period] = part if old is None else part.merge(old)
+        return merged
+
+    def copy(self) -> "RunningAggregates":
+        """Kopi som kan oppdateres uten å endre denne."""
+        running = RunningAggregates(self.sketch_size)
+        running.monthly = dict(self.monthly)
+        running.yearly = dict(self.yearly)
+        running.watermarks = dict(self.watermarks)
+        return running
+
+    def months(self, element_id: str, time_offset: str) -> GroupedAggregate:
+        """Bøttene per måned (nøkkel fra period_keys) for en serie."""
+        return self.monthly.get(
+            (element_id, time_offset), GroupedAggregate(self.sketch_size)
+        )
+
+    def years(self, element_id: str, time_offset: str) -> GroupedAggregate:
+        """Bøttene per år for en serie."""
+        return self.yearly.get(
+            (element_id, time_offset), GroupedAggregate(self.sketch_size)
+        )
+
+    def to_state(self) -> dict:
+        """Tilstand som JSON-vennlig ordbok."""
+        return {
+            "sketch_size": self.sketch_size,
+            "series": [
+                [list(key), watermark, self.monthly[key].to_state(),
+                 self.yearly[key].to_state()]
+                for key, watermark in self.watermarks.items()
+            ],
+        }
+
+    def delta_state(
+        self,
+        changes: dict[tuple[str, str], tuple[set, set]],
+    ) -> list:
+        """Tilstand for kun bøttene i changes, se append_index."""
+        return [
+            [list(key), self.watermarks[key],
+             [[period, self.monthly[key].groups[period].to_state()]
+              for period in sorted(months)],
+             [[year, self.yearly[key].groups[year].to_state()]
+              for year in sorted(years)]]
+            for key, (months, years) in changes.items()
+        ]
+
+    def apply_delta(self, series: list) -> None:
+        """Bytt inn bøttene fra delta_state."""
+        for key, watermark, monthly, yearly in series:
+            key = tuple(key)
+            self.watermarks[key] = watermark
+            for buckets, parts in (
+                (self.monthly, monthly), (self.yearly, yearly),
+            ):
+                grouped = self._merged(
+                    buckets.get(key), GroupedAggregate(self.sketch_size)
+                )
+                for period, part in parts:
+                    grouped.groups[period] = PartialAggregate.from_state(part)
+                buckets[key] = grouped
+
+    @classmethod
+    def from_state(cls, state: dict) -> "RunningAggregates":
+        """Gjenopprett aggregater fra to_state."""
+        running = cls(state["sketch_size"])
+        for key, watermark, monthly, yearly in state["series"]:
+            key = tuple(key)
+            running.watermarks[key] = watermark
+            running.monthly[key] = GroupedAggregate.from_state(monthly)
+            running.yearly[key] = GroupedAggregate.from_state(yearly)
+        return running
+
+
+class _State(NamedTuple):
+    """Aggregater for kildefilene slik de var ved et fingeravtrykk."""
+
+    fingerprint: list
+    running: RunningAggregates
+    # [sti, størrelse, sjekksum, elementer] per kildefil
+    files: list
+    # Størrelse på tilstandsfilen og snapshotet først i den, None hvis
+    # filen må skrives på nytt
+    size: int | None
+    snapshot: int | None
+
+
+_by_sources: dict[tuple[str, ...], _State] = {}
+_by_frame: dict[int, tuple[weakref.ref, RunningAggregates]] = {}
+_lock = threading.Lock()
+
+
+def running_for_sources(
+    paths: Iterable[str],
+    state_path: str | None,
+    build: Callable[[], tuple[RunningAggregates, dict[str, Iterable]]],
+    read_tails: Callable[
+        [dict[str, tuple[int, int]], dict[str, list[str]]],
+        tuple[pd.DataFrame, dict[str, Iterable]] | None,
+    ],
+) -> RunningAggregates:
+    """
+    Hent løpende aggregater for kildefiler, oppdatert med nye rader.
+
+    Aggregatene hentes fra minnet eller fra tilstandsfilen. Hvis
+    kildefilene er endret siden sist, sjekkes det at endringen kun er
+    rader lagt til på slutten: ingen fil kan ha krympet, første og
+    siste blokk av det som ble lest sist må være uendret, og de nye
+    radene må ligge etter vannmerket for sin serie. Da leses og flettes
+    kun de nye bytene, og kun bøttene de treffer skrives til slutten av
+    tilstandsfilen. Ved andre endringer bygges aggregatene på nytt.
+
+    Sjekken ser kun på blokkene i hver ende, så en endring midt i en
+    fil som samtidig vokser, uten å flytte bytene etter seg, oppdages
+    ikke. Skriv om filene med use_running_aggregates=False hvis
+    historikken kan endres på den måten.
+
+    Parametre:
+        paths (Iterable[str]): Kildefilene.
+        state_path (str | None): Tilstandsfil, eller None.
+        build (Callable): Bygger nye aggregater fra alle radene, og gir
+        elementene i hver kildefil.
+        read_tails (Callable): Leser de nye radene gitt (fra, til) i
+        byte og kjente elementer per fil. Gir radene og oppdaterte
+        elementer, eller None hvis de ikke kan flettes inn alene.
+
+    Returnerer:
+        RunningAggregates: Aggregater for kildefilenes nåværende innhold.
+    """
+    paths = tuple(paths)
+    fingerprint = [list(file_fingerprint(path)) for path in paths]
+    with _lock:
+        state = _by_sources.get(paths)
+    if state is None and state_path is not None:
+        state = _read_state(state_path)
+    if state is not None and state.fingerprint == fingerprint:
+        with _lock:
+            _by_sources[paths] = state
+        return state.running
+
+    extended = None
+    if state is not None:
+        extended = _extend(state, paths, read_tails)
+    if extended is None:
+        running, elements = build()
+        files = [_file_entry(path, elements.get(path, ())) for path in paths]
+        state = _write_snapshot(state_path, fingerprint, running, files)
+    else:
+        running, files, changes = extended
+        state = _append_delta(
+            state_path, state, fingerprint, running, files, changes
+        )
+    with _lock:
+        _by_sources[paths] = state
+    return running
+
+
+def _extend(
+    state: _State,
+    paths: tuple[str, ...],
+    read_tails: Callable,
+) -> tuple[RunningAggregates, list, dict] | None:
+    """
+    Flett inn rader lagt til på slutten av kildefilene.
+
+    Parametre:
+        state (_State): Aggregater for forrige innhold.
+        paths (tuple[str, ...]): Kildefilene nå.
+        read_tails (Callable): Se running_for_sources.
+
+    Returnerer:
+        tuple | None: Nye aggregater, filinformasjon og endrede bøtter,
+        eller None hvis endringen ikke kun er nye rader på slutten.
+    """
+    known = {path: entry for path, *entry in state.files}
+    if not set(known) <= set(paths):
+        return None
+
+    ranges = {}
+    elements = {}
+    for path in paths:
+        size, check, found = known.get(path, (0, _check(path, 0), []))
+        new_size = _size(path)
+        if new_size < size or _check(path, size) != check:
+            return None
+        if new_size > size:
+            ranges[path] = (size, new_size)
+        elements[path] = list(found)
+
+    running = state.running
+    changes: dict[tuple[str, str], tuple[set, set]] = {}
+    if ranges:
+        tails = read_tails(ranges, elements)
+        if tails is None:
+            return None
+        tail, elements = tails
+        if not tail.empty:
+            index = SeriesIndex(tail)
+            if not running.follows(index):
+                return None
+            running = running.copy()
+            running.append_index(index, changes)
+
+    files = [
+        _file_entry(
+            path, elements.get(path, ()),
+            ranges[path][1] if path in ranges else known[path][0],
+        )
+        for path in paths
+    ]
+    return running, files, changes
+
+
+def _size(path: str) -> int:
+    """Filstørrelse, 0 hvis filen mangler."""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _check(path: str, size: int) -> str | None:
+    """
+    SHA-1 av første og siste blokk blant de første size bytene.
+
+    Parametre:
+        path (str): Filsti. En fil som mangler regnes som tom.
+        size (int): Antall byte som sjekkes.
+
+    Returnerer:
+        str | None: Sjekksum, eller None hvis filen er kortere.
+    """
+    sha = hashlib.sha1()
+    block = min(size, _CHECK_BLOCK)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(block)
+            f.seek(size - block)
+            tail = f.read(block)
+    except FileNotFoundError:
+        head = tail = b""
+    if len(head) != block or len(tail) != block:
+        return None
+    sha.update(head)
+    sha.update(tail)
+    return sha.hexdigest()
+
+
+def _file_entry(
+    path: str,
+    elements: Iterable,
+    size: int | None = None,
+) -> list:
+    """[sti, størrelse, sjekksum, elementer] for en kildefil."""
+    size = _size(path) if size is None else size
+    return [path, size, _check(path, size), sorted(map(str, elements))]
+
+
+def running_for(df: pd.DataFrame) -> RunningAggregates:
+    """
+    Hent løpende aggregater for en innlastet df, og bygg dem første gang.
+
+    Parametre:
+        df (pd.DataFrame): Innlastet df.
+
+    Returnerer:
+        RunningAggregates: Aggregater over alle radene i df-en.
+    """
+    key = id(df)
+    with _lock:
+        entry = _by_frame.get(key)
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+
+    running = RunningAggregates()
+    running.append_index(index_for(df))
+    with _lock:
+        for old in [k for k, (ref, _) in _by_frame.items() if ref() is None]:
+            del _by_frame[old]
+        _by_frame[key] = (weakref.ref(df), running)
+    return running
+
+
+def _read_state(path: str) -> _State | None:
+    """
+    Les tilstandsfilen: et snapshot fulgt av endringer, én per linje.
+
+    Returnerer:
+        _State | None: Tilstanden etter siste hele endring, eller None
+        hvis filen mangler eller er utdatert.
+    """
+    try:
+        with open(path, "rb") as f:
+            first = f.readline()
+            header = json.loads(first)
+            if header.get("version") != STATE_VERSION:
+                return None
+            running = RunningAggregates.from_state(header["aggregates"])
+            fingerprint, files = header["fingerprint"], header["files"]
+            size = len(first)
+            for line in f:
+                delta = json.loads(line) if line.endswith(b"\n") else None
+                if delta is None or delta["base"] != fingerprint:
+                    # Avbrutt skriving eller annen skriver: skriv på nytt
+                    size = None
+                    break
+                running.apply_delta(delta["series"])
+                fingerprint, files = delta["fingerprint"], delta["files"]
+                size += len(line)
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+    return _State(fingerprint, running, files, size, len(first))
+
+
+def _write_snapshot(
+    path: str | None,
+    fingerprint: list,
+    running: RunningAggregates,
+    files: list,
+) -> _State:
+    """Skriv hele tilstanden atomisk. Feil ignoreres, det er en buffer."""
+    line = json.dumps({
+        "version": STATE_VERSION,
+        "fingerprint": fingerprint,
+        "files": files,
+        "aggregates": running.to_state(),
+    }).encode("utf-8") + b"\n"
+    if path is None:
+        return _State(fingerprint, running, files, None, None)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(line)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return _State(fingerprint, running, files, None, None)
+    return _State(fingerprint, running, files, len(line), len(line))
+
+
+def _append_delta(
+    path: str | None,
+    state: _State,
+    fingerprint: list,
+    running: RunningAggregates,
+    files: list,
+    changes: dict[tuple[str, str], tuple[set, set]],
+) -> _State:
+    """
+    Legg de endrede bøttene til på slutten av tilstandsfilen.
+
+    Filen skrives på nytt hvis den er endret av andre siden den ble
+    lest, eller hvis endringene har blitt større enn snapshotet.
+    """
+    line = json.dumps({
+        "base": state.fingerprint,
+        "fingerprint": fingerprint,
+        "files": files,
+        "series": running.delta_state(changes),
+    }).encode("utf-8") + b"\n"
+    if path is None or state.size is None or state.snapshot is None \
+            or state.size + len(line) > 2 * state.snapshot \
+            or _size(path) != state.size:
+        return _write_snapshot(path, fingerprint, running, files)
+    try:
+        with open(path, "ab") as f:
+            f.write(line)
+    except OSError:
+        return _State(fingerprint, running, files, None, None)
+    return _State(
+        fingerprint, running, files, state.size + len(line), state.snapshot
+    )
+
+
+__all__ = [
+    "RUNNING_SUFFIX", "RunningAggregates", "running_for",
+    "running_for_sources",
+]
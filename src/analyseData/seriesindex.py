@@ -0,0 +1,181 @@
+"""Indeks fra (elementId, timeOffset) til tidssorterte verdiserier."""
+
+import numpy as np
+import pandas as pd
+import re
+import threading
+import weakref
+
+try:
+    from .aggregates import CalendarKeys, calendar_keys
+except ImportError:
+    from aggregates import CalendarKeys, calendar_keys
+
+_OFFSET = re.compile(r"PT(\d+)H")
+
+
+def offset_hours(offset) -> int | None:
+    """Antall timer i en PT<n>H-offset, None hvis formatet er ugyldig."""
+    match = _OFFSET.fullmatch(offset) if isinstance(offset, str) else None
+    return int(match.group(1)) if match else None
+
+
+def min_offset_of(offsets: dict[str, int | None]) -> str | None:
+    """Offset med lavest antall timer, None hvis ingen er gyldige."""
+    valid = [(h, off) for off, h in offsets.items() if h is not None]
+    return min(valid, key=lambda x: x[0])[1] if valid else None
+
+
+class SeriesIndex:
+    """
+    Oppslag fra (elementId, timeOffset) til rader i en innlastet df.
+
+    Bygges med én gruppering over hele tabellen. Verdiene tolkes som
+    float64 og tidspunktene som UTC én gang, sammen med kalendernøkler
+    (år, måned, måned-ordinal og dag i året) per rad, og radene i hver
+    serie sorteres på tid. Et oppslag koster deretter kun antall rader i
+    serien, ikke antall rader i filen.
+    """
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        """
+        Bygger indeksen.
+
+        Parametre:
+            df (pd.DataFrame): Langt format med kolonnene elementId,
+            timeOffset, referenceTime og value.
+        """
+        times = df["referenceTime"]
+        if not isinstance(times.dtype, pd.DatetimeTZDtype):
+            times = pd.to_datetime(times, utc=True, errors="coerce")
+        self.times = pd.DatetimeIndex(times, name="referenceTime")
+        self.values = pd.to_numeric(
+            df["value"], errors="coerce"
+        ).to_numpy(dtype=np.float64)
+        self.calendar: CalendarKeys = calendar_keys(self.times)
+
+        groups = df.groupby(
+            ["elementId", "timeOffset"], observed=True, sort=False
+        ).indices
+        stamps = self.times.asi8
+        self._positions: dict[tuple, np.ndarray] = {}
+        self.offsets: dict[str, dict[str, int | None]] = {}
+        for key, pos in groups.items():
+            order = np.argsort(stamps[pos], kind="stable")
+            self._positions[key] = pos[order]
+
+            element_id, offset = key
+            self.offsets.setdefault(element_id, {})[offset] = (
+                offset_hours(offset)
+            )
+
+        # Minste gyldige PT<n>H-offset per element, None hvis ingen
+        self._min_offsets: dict[str, str | None] = {
+            element_id: min_offset_of(hours)
+            for element_id, hours in self.offsets.items()
+        }
+
+    def keys(self) -> list[tuple]:
+        """Returner alle (elementId, timeOffset) i indeksen."""
+        return list(self._positions)
+
+    def min_offset(self, element_id: str) -> str | None:
+        """
+        Finn offset med lavest antall timer for et element.
+
+        Parametre:
+            element_id (str): ElementId.
+
+        Returnerer:
+            str | None: Offset, f.eks. "PT0H", eller None hvis elementet
+            ikke har noen gyldige PT<n>H-offsets.
+        """
+        return self._min_offsets.get(element_id)
+
+    def positions(self, element_id: str, time_offset: str) -> np.ndarray:
+        """Radposisjoner for en serie, sortert på tid."""
+        return self._positions.get(
+            (element_id, time_offset), np.empty(0, dtype=np.intp)
+        )
+
+    def calendar_for(self, element_id: str, time_offset: str) -> CalendarKeys:
+        """Kalendernøklene for en serie, i samme rekkefølge som series."""
+        return self.calendar.take(self.positions(element_id, time_offset))
+
+    def series(self, element_id: str, time_offset: str) -> pd.Series:
+        """
+        Hent verdiserien for et element og en offset.
+
+        Manglende og ikke-numeriske verdier beholdes som NaN.
+
+        Parametre:
+            element_id (str): ElementId, f.eks. "mean(air_temperature P1D)".
+            time_offset (str): PT<n>H-offset.
+
+        Returnerer:
+            pd.Series: float64-verdier med referenceTime som indeks,
+            sortert på tid. Tom serie hvis kombinasjonen ikke finnes.
+        """
+        pos = self.positions(element_id, time_offset)
+        return pd.Series(
+            self.values[pos], index=self.times[pos], name="value"
+        )
+
+    def frame(
+        self,
+        df: pd.DataFrame,
+        element_id: str,
+        time_offset: str,
+    ) -> pd.DataFrame:
+        """
+        Hent hele radene for en serie, med numerisk value og tid.
+
+        Parametre:
+            df (pd.DataFrame): Df-en indeksen ble bygget fra.
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+
+        Returnerer:
+            pd.DataFrame: Radene sortert på tid.
+        """
+        pos = self.positions(element_id, time_offset)
+        out = df.iloc[pos].copy()
+        out["referenceTime"] = self.times[pos]
+        out["value"] = self.values[pos]
+        return out
+
+
+_indexes: dict[int, tuple[weakref.ref, SeriesIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(df: pd.DataFrame) -> SeriesIndex:
+    """
+    Hent indeksen for en df, og bygg den første gang.
+
+    Indeksen gjenbrukes så lenge df-en finnes, så en df fra den delte
+    bufferen indekseres kun én gang per innlastet fil. Df-en må derfor
+    ikke endres etter at den er indeksert.
+
+    Parametre:
+        df (pd.DataFrame): Innlastet df.
+
+    Returnerer:
+        SeriesIndex: Indeksen for df-en.
+    """
+    key = id(df)
+    with _indexes_lock:
+        entry = _indexes.get(key)
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+
+    index = SeriesIndex(df)
+    with _indexes_lock:
+        # Rydd bort indekser for df-er som ikke lenger finnes
+        for old in [k for k, (ref, _) in _indexes.items() if ref() is None]:
+            del _indexes[old]
+        _indexes[key] = (weakref.ref(df), index)
+    return index
+
+
+__all__ = ["SeriesIndex", "index_for", "min_offset_of", "offset_hours"]
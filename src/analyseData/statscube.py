@@ -0,0 +1,305 @@
+"""Forhåndsberegnet månedsstatistikk per (element, offset, måned)."""
+
+import numpy as np
+import pandas as pd
+import threading
+import weakref
+
+from collections.abc import Callable, Iterable
+
+try:
+    from .aggregates import NAT_KEY, month_period, period_label
+    from .columncache import ColumnarCache
+    from .datasetcache import file_fingerprint
+    from .runningstats import RunningAggregates
+    from .seriesindex import SeriesIndex, index_for
+except ImportError:
+    from aggregates import NAT_KEY, month_period, period_label
+    from columncache import ColumnarCache
+    from datasetcache import file_fingerprint
+    from runningstats import RunningAggregates
+    from seriesindex import SeriesIndex, index_for
+
+# Kvantiler som lagres per måned, med kolonnenavn
+QUANTILES: dict[str, float] = {
+    "q05": 0.05, "q25": 0.25, "median": 0.5, "q75": 0.75, "q95": 0.95,
+}
+
+# Kolonnene i kuben: nøkler først, deretter statistikken
+KEY_COLUMNS: tuple[str, ...] = ("element_id", "time_offset", "period")
+STAT_COLUMNS: tuple[str, ...] = (
+    "count", "sum", "m2", "min", "max", *QUANTILES,
+)
+
+# Endelse på kubemappene ved siden av kolonnebufferne
+CUBE_SUFFIX = ".cube"
+
+# Endelse på kuber bygd fra løpende aggregater, med tilnærmede kvantiler
+RUNNING_CUBE_SUFFIX = ".running.cube"
+
+
+class StatsCube:
+    """
+    Månedsstatistikk for alle (elementId, timeOffset) i en by.
+
+    Hver rad er én måned for én serie, med antall, sum, sum av
+    kvadrerte avvik fra snittet (m2), min, maks og kvantiler over
+    gyldige verdier. Snitt og standardavvik utledes fra antall, sum og
+    m2, uten kansellering for store verdier. Et oppslag
+    på én måned er et ordbokoppslag, og alle måneder for en serie er
+    et sammenhengende utsnitt av tabellen.
+    """
+
+    def __init__(self, table: pd.DataFrame) -> None:
+        """
+        Initialiserer kuben fra en ferdig tabell.
+
+        Parametre:
+            table (pd.DataFrame): Kolonnene i KEY_COLUMNS og
+            STAT_COLUMNS, sortert på nøklene.
+
+        Hever:
+            KeyError: Hvis tabellen mangler kolonner.
+        """
+        missing = set(KEY_COLUMNS + STAT_COLUMNS) - set(table.columns)
+        if missing:
+            raise KeyError(f"Kuben mangler kolonner: {sorted(missing)}")
+        self.table = table.reset_index(drop=True)
+
+        self._rows: dict[tuple[str, str, int], int] = {}
+        self._spans: dict[tuple[str, str], tuple[int, int]] = {}
+        keys = zip(
+            self.table["element_id"], self.table["time_offset"],
+            self.table["period"].to_numpy(dtype=np.int64).tolist(),
+        )
+        for row, (element_id, offset, period) in enumerate(keys):
+            self._rows[(element_id, offset, period)] = row
+            lo, _ = self._spans.get((element_id, offset), (row, row))
+            self._spans[(element_id, offset)] = (lo, row + 1)
+
+    @classmethod
+    def from_index(cls, index: SeriesIndex) -> "StatsCube":
+        """
+        Bygg kuben fra en serieindeks i én gjennomgang per serie.
+
+        Parametre:
+            index (SeriesIndex): Indeks for en innlastet df.
+
+        Returnerer:
+            StatsCube: Ferdig kube.
+        """
+        parts = []
+        for element_id, offset in index.keys():
+            pos = index.positions(element_id, offset)
+            values = index.values[pos]
+            periods = index.calendar.period[pos]
+            keep = ~np.isnan(values) & (periods != NAT_KEY)
+            if not keep.any():
+                continue
+            values, periods = values[keep], periods[keep]
+
+            # Serien er sortert på tid, så hver måned er et utsnitt
+            starts = np.flatnonzero(
+                np.r_[True, periods[1:] != periods[:-1]]
+            )
+            count = np.diff(np.r_[starts, values.size])
+            total = np.add.reduceat(values, starts)
+            deviation = values - np.repeat(total / count, count)
+            segments = np.split(values, starts[1:])
+            quantiles = np.array([
+                np.quantile(seg, list(QUANTILES.values()))
+                for seg in segments
+            ])
+            part = pd.DataFrame({
+                "element_id": str(element_id),
+                "time_offset": str(offset),
+                "period": periods[starts],
+                "count": count,
+                "sum": total,
+                "m2": np.add.reduceat(deviation * deviation, starts),
+                "min": np.minimum.reduceat(values, starts),
+                "max": np.maximum.reduceat(values, starts),
+            })
+            for i, name in enumerate(QUANTILES):
+                part[name] = quantiles[:, i]
+            parts.append(part)
+
+        if not parts:
+            return cls(pd.DataFrame(columns=[*KEY_COLUMNS, *STAT_COLUMNS]))
+        table = pd.concat(parts, ignore_index=True)
+        return cls(table.sort_values(list(KEY_COLUMNS), kind="stable"))
+
+    @classmethod
+    def from_aggregates(cls, running: RunningAggregates) -> "StatsCube":
+        """
+        Bygg kuben fra løpende månedsaggregater uten å lese rådata.
+
+        Kvantilene kommer fra kvantilskissene og er eksakte for måneder
+        med opptil sketch_size verdier.
+
+        Parametre:
+            running (RunningAggregates): Aggregater per måned.
+
+        Returnerer:
+            StatsCube: Ferdig kube.
+        """
+        rows = [
+            (element_id, offset, period, part.count, part.sum, part.m2,
+             part.min, part.max,
+             *(part.quantile(q) for q in QUANTILES.values()))
+            for (element_id, offset), grouped in running.monthly.items()
+            for period, part in grouped.items() if part.count
+        ]
+        table = pd.DataFrame(rows, columns=[*KEY_COLUMNS, *STAT_COLUMNS])
+        return cls(table.sort_values(list(KEY_COLUMNS), kind="stable"))
+
+    def lookup(
+        self,
+        element_id: str,
+        time_offset: str,
+        period: int,
+    ) -> dict[str, float] | None:
+        """
+        Hent statistikken for én måned.
+
+        Parametre:
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+            period (int): Måned fra month_period.
+
+        Returnerer:
+            dict[str, float] | None: Kolonnene i STAT_COLUMNS, eller
+            None hvis måneden ikke har gyldige verdier.
+        """
+        row = self._rows.get((element_id, time_offset, int(period)))
+        if row is None:
+            return None
+        return {
+            name: self.table[name].iat[row].item() for name in STAT_COLUMNS
+        }
+
+    def months(self, element_id: str, time_offset: str) -> pd.DataFrame:
+        """
+        Hent alle måneder for en serie, sortert på måned.
+
+        Parametre:
+            element_id (str): ElementId.
+            time_offset (str): PT<n>H-offset.
+
+        Returnerer:
+            pd.DataFrame: Radene i kuben, med kolonnen 'year_month'
+            ('YYYY-MM') i tillegg. Tom hvis serien ikke finnes.
+        """
+        lo, hi = self._spans.get((element_id, time_offset), (0, 0))
+        out = self.table.iloc[lo:hi].reset_index(drop=True)
+        out.insert(0, "year_month", [period_label(p) for p in out["period"]])
+        return out
+
+    @staticmethod
+    def mean(stats) -> float:
+        """Snitt fra antall og sum (rad eller tabell)."""
+        return stats["sum"] / stats["count"]
+
+    @staticmethod
+    def std(stats, ddof: int = 1):
+        """
+        Standardavvik fra antall og m2.
+
+        Parametre:
+            stats: Rad fra lookup eller tabell fra months.
+            ddof (int): Frihetsgrader.
+
+        Returnerer:
+            Standardavvik, NaN der antall <= ddof.
+        """
+        count = np.asarray(stats["count"], dtype=np.float64)
+        m2 = np.asarray(stats["m2"], dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var = np.where(count > ddof, m2 / (count - ddof), np.nan)
+        std = np.sqrt(var)
+        return float(std) if std.ndim == 0 else std
+
+
+_by_sources: dict[tuple, tuple[list, StatsCube]] = {}
+_by_frame: dict[int, tuple[weakref.ref, StatsCube]] = {}
+_lock = threading.Lock()
+
+
+def cube_for_sources(
+    paths: Iterable[str],
+    store: ColumnarCache | None,
+    build: Callable[[], StatsCube],
+) -> StatsCube:
+    """
+    Hent kuben for et sett kildefiler, og bygg den kun ved behov.
+
+    Kuben gjenbrukes fra minnet, deretter fra disk, så lenge
+    fingeravtrykket til kildefilene er uendret. Et oppslag mot en
+    lagret kube leser derfor aldri rådataene. Kuber med ulik endelse
+    på lagringen holdes adskilt, også i minnet.
+
+    Parametre:
+        paths (Iterable[str]): Kildefilene kuben bygges fra.
+        store (ColumnarCache | None): Lagring på disk, eller None.
+        build (Callable[[], StatsCube]): Bygger kuben fra rådataene.
+
+    Returnerer:
+        StatsCube: Kuben for kildefilenes nåværende innhold.
+    """
+    paths = tuple(paths)
+    key = (None if store is None else store.suffix, paths)
+    fingerprint = [file_fingerprint(path) for path in paths]
+    with _lock:
+        entry = _by_sources.get(key)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+
+    cube = None
+    if store is not None:
+        table = store.load(paths)
+        if table is not None:
+            try:
+                cube = StatsCube(table)
+            except KeyError:
+                cube = None
+    if cube is None:
+        cube = build()
+        if store is not None:
+            try:
+                store.store(paths, cube.table)
+            except OSError:
+                pass
+
+    with _lock:
+        _by_sources[key] = (fingerprint, cube)
+    return cube
+
+
+def cube_for(df: pd.DataFrame) -> StatsCube:
+    """
+    Hent kuben for en innlastet df, og bygg den første gang.
+
+    Parametre:
+        df (pd.DataFrame): Innlastet df.
+
+    Returnerer:
+        StatsCube: Kuben for df-en.
+    """
+    key = id(df)
+    with _lock:
+        entry = _by_frame.get(key)
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+
+    cube = StatsCube.from_index(index_for(df))
+    with _lock:
+        for old in [k for k, (ref, _) in _by_frame.items() if ref() is None]:
+            del _by_frame[old]
+        _by_frame[key] = (weakref.ref(df), cube)
+    return cube
+
+
+__all__ = [
+    "CUBE_SUFFIX", "QUANTILES", "RUNNING_CUBE_SUFFIX", "StatsCube",
+    "cube_for", "cube_for_sources", "month_period", "period_label",
+]
@@ -1,10 +1,21 @@
 """Genererer årlige og periodiske statistikker fra værdata."""
 
 import calendar
+import numpy as np
 import pandas as pd
+import re
+import threading
+import weakref
 
+from aggregates import NAT_KEY, GroupedAggregate, calendar_keys
 from basedata import DataLoader
 from outlierdetector import OutlierDetector
+from seriesindex import SeriesIndex, index_for
+
+# Statistikker compute_yearly kan gi, i tillegg til kvantiler 'q05'-'q95'
+YEARLY_STATISTICS = ("count", "sum", "mean", "median", "std", "min", "max")
+
+_QUANTILE = re.compile(r"q(\d{2})")
 
 
 class YearlyStats(DataLoader):
@@ -15,6 +26,7 @@ class YearlyStats(DataLoader):
         data_dir: str,
         *,
         whisker: float | None = None,
+        chunk_rows: int | None = None,
     ) -> None:
         """
         Initialiserer YearlyStats med data-katalog og whisker.
@@ -23,8 +35,10 @@ class YearlyStats(DataLoader):
             data_dir (str): Katalog med CSV-filer.
             whisker (float | None): Faktor for IQR-whisker
             (1.5, 3.0 eller None).
+            chunk_rows (int | None): Les filene i biter på høyst så
+            mange rader (minnebegrenset modus).
         """
-        super().__init__(data_dir)
+        super().__init__(data_dir, chunk_rows=chunk_rows)
         self.detector = OutlierDetector(whisker)
 
     def compute_yearly(
@@ -34,21 +48,28 @@ class YearlyStats(DataLoader):
         year: int | None = None,
         *,
         time_offset: str | None = None,
-        aggregate: str | None = "mean",
+        aggregate: str | list[str] | None = "mean",
     ) -> pd.DataFrame:
         """
         Beregn eller hent årlig statistikk.
 
+        Med en liste i aggregate beregnes alle statistikkene i samme
+        gjennomgang. Uten løpende aggregater brukes den filtrerte serien
+        delt i år og sortert per år, bufret mellom kallene.
+
         Parametre:
             city (str): Bykode, f.eks. 'oslo'.
             element_id (str): ElementId å analysere.
             year (int | None): År for rådata (krever aggregate=None).
             time_offset (str | None): PT<n>H-offset. Finner minste hvis None.
-            aggregate (str | None): 'mean', 'sum', 'median', 'std' eller None.
+            aggregate (str | list[str] | None): Navn fra
+            YEARLY_STATISTICS eller kvantil som 'q25', en liste av slike
+            eller None.
 
         Returnerer:
-            pd.DataFrame: Kolonner ['year', 'value']
-            eller rådata hvis aggregate=None.
+            pd.DataFrame: Kolonner ['year', 'value'] for ett navn,
+            ['year', *aggregate] for en liste, eller rådata hvis
+            aggregate=None.
 
         Hever:
             ValueError: Ved manglende data eller ugyldige parametre.
@@ -56,24 +77,19 @@ class YearlyStats(DataLoader):
         if time_offset is None:
             time_offset = self._get_min_offset(city, element_id)
 
-        df = (
-            self._load_city(city)
-            .query(
-                "elementId == @element_id and timeOffset == @time_offset"
-            )
-            .assign(
-                value=lambda d: pd.to_numeric(d["value"], errors="coerce")
-            )
-            .dropna(subset=["value"])
-        )
-
         if aggregate is None:
             if year is None:
                 raise ValueError(
                     "year må angis når aggregate=None (rådata)"
                 )
 
-            daily = df[df["referenceTime"].dt.year == year]
+            df = self._load_city(city)
+            index = index_for(df)
+            daily = index.frame(df, element_id, time_offset)
+            daily = daily[
+                daily["value"].notna().to_numpy()
+                & (index.calendar_for(element_id, time_offset).year == year)
+            ]
             if daily.empty:
                 msg = (
                     f"Ingen data for city={city!r}, "
@@ -83,27 +99,79 @@ class YearlyStats(DataLoader):
                 raise ValueError(msg)
             return daily.reset_index(drop=True)
 
-        # Filtrer på år hvis spesifisert
-        df["year"] = df["referenceTime"].dt.year
-        if year is not None:
-            df = df[df["year"] == year]
-
-        if df.empty:
-            raise ValueError("Ingen data etter filtrering – sjekk parametrene")
-
-        agg_funcs = {
-            "mean": df.groupby("year")["value"].mean,
-            "sum": df.groupby("year")["value"].sum,
-            "median": df.groupby("year")["value"].median,
-            "std": df.groupby("year")["value"].std,
-        }
-        if aggregate not in agg_funcs:
-            raise ValueError(
-                "aggregate må være 'mean', 'sum', 'median', 'std' eller None"
+        names = [aggregate] if isinstance(aggregate, str) else list(aggregate)
+        if self.chunk_rows:
+            select = None
+            if year is not None:
+                select = lambda times, values, keys: keys == year  # noqa: E731
+            table = self._yearly_from_buckets(
+                self._aggregate_chunks(
+                    city, element_id, time_offset,
+                    lambda times: calendar_keys(times).year, select,
+                ),
+                year, names,
             )
+        elif self.use_running_aggregates:
+            table = self._yearly_from_buckets(
+                self._running_aggregates(city).years(element_id, time_offset),
+                year, names,
+            )
+        else:
+            table = self._yearly_from_segments(
+                year_segments(
+                    self._series_index(city), element_id, time_offset
+                ),
+                year, names,
+            )
+
+        if isinstance(aggregate, str):
+            return table.rename(columns={aggregate: "value"})
+        return table
 
-        result = agg_funcs[aggregate]().reset_index(name="value")
-        return result
+    @staticmethod
+    def _yearly_from_buckets(
+        grouped: GroupedAggregate,
+        year: int | None,
+        names: list[str],
+    ) -> pd.DataFrame:
+        """compute_yearly fra flettbare delaggregater per år."""
+        parts = [
+            (y, part) for y, part in grouped.items()
+            if part.count and (year is None or y == year)
+        ]
+        if not parts:
+            raise ValueError("Ingen data etter filtrering – sjekk parametrene")
+        quantiles = _check_statistics(names)
+        table = pd.DataFrame({"year": [y for y, _ in parts]})
+        for name in names:
+            table[name] = [
+                part.quantile(quantiles[name]) if name in quantiles
+                else part.statistic(name)
+                for _, part in parts
+            ]
+        return table
+
+    @staticmethod
+    def _yearly_from_segments(
+        segments: tuple[np.ndarray, np.ndarray, np.ndarray],
+        year: int | None,
+        names: list[str],
+    ) -> pd.DataFrame:
+        """compute_yearly fra årssegmentene i year_segments."""
+        years, starts, values = segments
+        ends = np.r_[starts[1:], values.size]
+        if year is not None:
+            # Ett segment per år, så et enkelt år er ett utsnitt
+            hit = np.flatnonzero(years == year)[:1]
+            values = values[starts[hit].sum():ends[hit].sum()]
+            years, starts = years[hit], np.zeros(hit.size, dtype=np.intp)
+        if years.size == 0:
+            raise ValueError("Ingen data etter filtrering – sjekk parametrene")
+        _check_statistics(names)
+        table = pd.DataFrame({"year": years})
+        for name, column in segment_statistics(starts, values, names).items():
+            table[name] = column
+        return table
 
     def percent_change(
         self,
@@ -146,31 +214,15 @@ class YearlyStats(DataLoader):
         if time_offset is None:
             time_offset = self._get_min_offset(city, element_id)
 
-        df = (
-            self._load_city(city)
-            .query(
-                "elementId == @element_id and timeOffset == @time_offset"
-            )
-            .assign(
-                value=lambda d: pd.to_numeric(d["value"], errors="coerce"),
-                referenceTime=lambda d: pd.to_datetime(
-                    d["referenceTime"], utc=True
-                ),
-            )
-            .set_index("referenceTime")
-            .sort_index()
-        )
+        series = self._series(city, element_id, time_offset)
 
-        # Filtrer periode
+        # Filtrer periode (serien er sortert på tid)
         if start or end:
-            mask = pd.Series(True, index=df.index)
-            if start:
-                mask &= df.index >= pd.to_datetime(start).tz_localize("UTC")
-            if end:
-                mask &= df.index <= pd.to_datetime(end).tz_localize("UTC")
-            df = df[mask]
-
-        resampled = df["value"].resample(frequency)
+            lower = pd.to_datetime(start).tz_localize("UTC") if start else None
+            upper = pd.to_datetime(end).tz_localize("UTC") if end else None
+            series = series.loc[lower:upper]
+
+        resampled = series.resample(frequency)
         agg_funcs = {
             "mean": resampled.mean,
             "median": resampled.median,
@@ -218,35 +270,231 @@ class YearlyStats(DataLoader):
         if time_offset is None:
             time_offset = self._get_min_offset(city, element_id)
 
-        df = (
-            self._load_city(city)
-            .query(
-                "elementId == @element_id and timeOffset == @time_offset"
+        if self.chunk_rows:
+            result = self._climatology_chunked(
+                city, element_id, time_offset, remove_outliers, statistic
             )
-            .copy()
-        )
-        df["value"] = pd.to_numeric(df["value"], errors="coerce")
-        df["referenceTime"] = pd.to_datetime(
-            df["referenceTime"], utc=True
+        else:
+            result = self._climatology(
+                city, element_id, time_offset, remove_outliers, statistic
+            )
+        result["month_name"] = result["month"].apply(
+            lambda m: calendar.month_abbr[m].capitalize()
         )
+        return result[["month", "month_name", "value"]]
+
+    def _climatology(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+        remove_outliers: bool,
+        statistic: str,
+    ) -> pd.DataFrame:
+        """Klimatologi per måned fra serien i minnet."""
+        index = self._series_index(city)
+        series = index.series(element_id, time_offset)
+        months = index.calendar_for(element_id, time_offset).month
 
         if remove_outliers:
-            mask = self.detector.detect_iqr(
-                df["value"], extreme=True
-            )
-            df.loc[mask, "value"] = pd.NA
+            mask = self.detector.detect_iqr(series, extreme=True)
+            series = series.where(~mask)
 
-        df["month"] = df["referenceTime"].dt.month
+        dated = months != NAT_KEY
+        grouped = series[dated].groupby(pd.Index(months[dated], name="month"))
         agg_funcs = {
-            "mean": df.groupby("month")["value"].mean,
-            "median": df.groupby("month")["value"].median,
-            "std": lambda: df.groupby("month")["value"].std(ddof=0),
+            "mean": grouped.mean,
+            "median": grouped.median,
+            "std": lambda: grouped.std(ddof=0),
         }
-        result = agg_funcs[statistic]().reset_index(name="value")
-        result["month_name"] = result["month"].apply(
-            lambda m: calendar.month_abbr[m].capitalize()
+        return agg_funcs[statistic]().reset_index(name="value")
+
+    @staticmethod
+    def _within(lower: float, upper: float):
+        """Utvalg for _aggregate_chunks: verdier innenfor grensene."""
+        def select(times, values, keys):
+            return ~((values < lower) | (values > upper))
+        return select
+
+    def _climatology_chunked(
+        self,
+        city: str,
+        element_id: str,
+        time_offset: str,
+        remove_outliers: bool,
+        statistic: str,
+    ) -> pd.DataFrame:
+        """Klimatologi per måned fra delaggregater, i to pass ved behov."""
+        select = None
+        if remove_outliers:
+            # Første pass: kvartiler for hele serien fra kvantilskissen
+            whole = self._aggregate_chunks(
+                city, element_id, time_offset,
+                lambda times: np.zeros(len(times), dtype=np.int64),
+            ).groups.get(0)
+            if whole is not None and whole.count:
+                lower, upper = whole.iqr_bounds(
+                    self.detector.whisker or 3.0
+                )
+                select = self._within(lower, upper)
+
+        grouped = self._aggregate_chunks(
+            city, element_id, time_offset,
+            lambda times: calendar_keys(times).month, select,
         )
-        return result[["month", "month_name", "value"]]
+        return pd.DataFrame({
+            "month": [m for m, _ in grouped.items()],
+            "value": [
+                part.statistic(statistic, ddof=0)
+                for _, part in grouped.items()
+            ],
+        })
+
+
+def _check_statistics(names: list[str]) -> dict[str, float]:
+    """
+    Valider statistikknavn for compute_yearly.
+
+    Parametre:
+        names (list[str]): Navn fra YEARLY_STATISTICS eller 'qNN'.
+
+    Returnerer:
+        dict[str, float]: Kvantilene blant navnene, f.eks. {'q25': 0.25}.
+
+    Hever:
+        ValueError: Ved tom liste eller ukjent navn.
+    """
+    if not names:
+        raise ValueError("aggregate må inneholde minst én statistikk")
+    quantiles = {}
+    for name in names:
+        match = _QUANTILE.fullmatch(str(name))
+        if match:
+            quantiles[name] = int(match.group(1)) / 100
+        elif name not in YEARLY_STATISTICS:
+            raise ValueError(
+                f"Ukjent aggregate {name!r}: bruk "
+                f"{', '.join(YEARLY_STATISTICS)}, 'qNN' eller None"
+            )
+    return quantiles
+
+
+_segments: dict[tuple, tuple[weakref.ref, tuple]] = {}
+_lock = threading.Lock()
+
+
+def year_segments(
+    index: SeriesIndex,
+    element_id: str,
+    time_offset: str,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Hent serien uten manglende verdier, delt i år og sortert per år.
+
+    Resultatet bufres per serieindeks, så gjentatte kall for samme
+    innlastede df slipper å filtrere og sortere på nytt.
+
+    Parametre:
+        index (SeriesIndex): Indeks for en innlastet df.
+        element_id (str): ElementId.
+        time_offset (str): PT<n>H-offset.
+
+    Returnerer:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: År per segment,
+        startposisjon per segment og verdiene, stigende innen hvert år.
+    """
+    key = (id(index), element_id, time_offset)
+    with _lock:
+        entry = _segments.get(key)
+        if entry is not None and entry[0]() is index:
+            return entry[1]
+
+    pos = index.positions(element_id, time_offset)
+    values = index.values[pos]
+    years = index.calendar.year[pos]
+    keep = ~np.isnan(values) & (years != NAT_KEY)
+    values, years = values[keep], years[keep]
+
+    # Serien er sortert på tid, så hvert år er et sammenhengende utsnitt
+    order = np.lexsort((values, years))
+    starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    starts = starts[starts < years.size]
+    segments = (years[starts], starts, values[order])
+
+    with _lock:
+        for old in [k for k, (ref, _) in _segments.items() if ref() is None]:
+            del _segments[old]
+        _segments[key] = (weakref.ref(index), segments)
+    return segments
+
+
+def segment_statistics(
+    starts: np.ndarray,
+    values: np.ndarray,
+    names: list[str],
+    ddof: int = 1,
+) -> dict[str, np.ndarray]:
+    """
+    Beregn statistikker per segment av sorterte verdier.
+
+    Parametre:
+        starts (np.ndarray): Startposisjon per segment, stigende.
+        values (np.ndarray): Verdiene, stigende innen hvert segment.
+        names (list[str]): Navn fra YEARLY_STATISTICS eller 'qNN'.
+        ddof (int): Frihetsgrader for 'std'.
+
+    Returnerer:
+        dict[str, np.ndarray]: Én verdi per segment for hvert navn.
+    """
+    quantiles = _check_statistics(names)
+    count = np.diff(np.r_[starts, values.size])
+    total = np.add.reduceat(values, starts)
+    mean = total / count
+
+    result = {}
+    for name in names:
+        if name in quantiles:
+            result[name] = _segment_quantile(
+                starts, values, count, quantiles[name]
+            )
+        elif name == "count":
+            result[name] = count
+        elif name == "sum":
+            result[name] = total
+        elif name == "mean":
+            result[name] = mean
+        elif name == "min":
+            result[name] = values[starts]
+        elif name == "max":
+            result[name] = values[starts + count - 1]
+        elif name == "median":
+            # Snitt av de to midterste, som pandas' median
+            low = values[starts + (count - 1) // 2]
+            high = values[starts + count // 2]
+            result[name] = (low + high) / 2
+        else:
+            deviation = values - np.repeat(mean, count)
+            m2 = np.add.reduceat(deviation * deviation, starts)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result[name] = np.where(
+                    count > ddof, np.sqrt(m2 / (count - ddof)), np.nan
+                )
+    return result
+
+
+def _segment_quantile(
+    starts: np.ndarray,
+    values: np.ndarray,
+    count: np.ndarray,
+    q: float,
+) -> np.ndarray:
+    """Kvantil per segment med lineær interpolasjon, som np.quantile."""
+    pos = (count - 1) * q
+    low = np.floor(pos).astype(np.intp)
+    high = np.minimum(low + 1, count - 1)
+    a = values[starts + low]
+    b = values[starts + high]
+    return a + (b - a) * (pos - low)
 
 
-__all__ = ["YearlyStats"]
+__all__ = ["YearlyStats", "YEARLY_STATISTICS", "year_segments"]
@@ -1,48 +1,716 @@
 """Henter værdata fra met.no og lagrer det i en JSON-fil."""
 
+import glob
+import hashlib
 import json
 import os
 import requests
+import threading
+import time
+
+from collections import OrderedDict
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlencode, urljoin, urlparse
+
+try:
+    from .rawstore import RawObservationStore
+    from .stations import StationRegistry
+except ImportError:
+    from rawstore import RawObservationStore
+    from stations import StationRegistry
+
+FROST_ENDPOINT = "https://frost.met.no/observations/v0.jsonld"
+
+# Statuskoder som tyder på midlertidig feil og skal prøves på nytt
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Budsjett i byte for svar som holdes i minnet når cache_dir er None
+DEFAULT_CACHE_BYTES = 32 * 1024 ** 2
 
 
 class WeatherFetcher:
     """Henter værdata fra Meteorologisk institutt (Frost API)."""
 
-    def __init__(self, client_id: str):
+    checkpoint_name: str = "checkpoint.json"
+    page_template: str = "page_{number:05d}.json"
+
+    def __init__(
+        self,
+        client_id: str,
+        endpoint: str = FROST_ENDPOINT,
+        *,
+        max_per_host: int = 4,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        cache_dir: str | None = None,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+        registry: StationRegistry | None = None,
+    ):
         """
         Initialiserer instansen med klient-ID for autentisering.
 
         Parametre:
             client_id (str): Klient-ID for Frost API.
+            endpoint (str): URL til observasjonsendepunktet.
+            max_per_host (int): Maks samtidige forespørsler per vert.
+            max_retries (int): Antall nye forsøk ved 429/5xx.
+            backoff (float): Startventetid i sekunder, dobles per forsøk.
+            cache_dir (str | None): Mappe for ETag/Last-Modified og
+            mellomlagrede svar. Holdes kun i minnet hvis None.
+            cache_bytes (int): Maks byte med svar i minnet når
+            cache_dir er None. Minst brukte vindu kastes først.
+            registry (StationRegistry | None): Stasjoner og elementer
+            som skal hentes. Standardregister hvis None.
         """
         self.client_id = client_id
+        self.registry = registry or StationRegistry()
+        self.endpoint = endpoint
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
 
-    def fetch_weather_data(self) -> dict:
-        """Henter værdata fra Frost API innenfor angitt tidsperiode."""
-        endpoint = "https://frost.met.no/observations/v0.jsonld"
-        parameters = {
+        # Felles sesjon gjenbruker tilkoblinger (keep-alive) mellom kall
+        self.session = requests.Session()
+        self.session.auth = (client_id, "")
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = HTTPAdapter(pool_maxsize=max(max_per_host, 1))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Validatorer og svar for betingede forespørsler per spørring
+        self.cache_dir = cache_dir
+        self.cache_bytes = cache_bytes
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        self._cache_nbytes = 0
+        self._cache_lock = threading.Lock()
+        if cache_dir is not None:
+            self._cache.update(self._read_validators(cache_dir))
+
+        self.stats = {"requests": 0, "bytes": 0, "cache_hits": 0}
+
+    def _default_parameters(self) -> dict[str, str]:
+        """Returnerer standard spørreparametre fra stasjonsregisteret."""
+        return {
             # Stasjoner som skal forespørres
-            "sources": "SN18700,SN90450",
-            # Måleparametere: daglige snitt, min, maks, sum og vind
-            "elements": (
-                "mean(air_temperature P1D),"
-                "min(air_temperature P1D),"
-                "max(air_temperature P1D),"
-                "sum(precipitation_amount P1D),"
-                "mean(wind_speed P1D)"
-            ),
+            "sources": ",".join(self.registry.source_ids()),
+            # Måleparametere fra registeret
+            "elements": self.registry.elements_param(),
             # Tidsperiode for data (YYYY-MM-DD/YYY-MM-DD)
             "referencetime": "2000-01-01/2024-12-31",
         }
 
-        response = requests.get(
-            endpoint,
-            params=parameters,
-            auth=(self.client_id, ""),
+    def fetch_weather_data(self) -> dict:
+        """
+        Henter værdata fra Frost API innenfor angitt tidsperiode.
+
+        Stasjonene hentes samlet i så få forespørsler som API-ets grenser
+        tillater. Flere forespørsler slås sammen til ett svar.
+        """
+        params = self._default_parameters()
+        batches = self.registry.source_batches()
+        if len(batches) == 1:
+            return self._get_json(self.endpoint, params)
+        return self.merge_pages(
+            self._get_json(self.endpoint, {**params, "sources": batch})
+            for batch in batches
+        )
+
+    def stream_weather_data(
+        self,
+        output_dir: str,
+        parameters: dict[str, str] | None = None,
+        *,
+        resume: bool = True,
+    ) -> Iterator[dict]:
+        """
+        Henter værdata side for side og skriver hver side til disk.
+
+        Følger 'nextLink' i svaret fra Frost. Etter hver fullførte side
+        oppdateres et sjekkpunkt, slik at en avbrutt nedlasting kan
+        fortsette fra siste fullførte side.
+
+        Parametre:
+            output_dir (str): Mappe for sidefiler og sjekkpunkt.
+            parameters (dict[str, str] | None): Spørreparametre.
+            Bruker standardparametre hvis None.
+            resume (bool): Fortsett fra sjekkpunkt hvis det finnes.
+
+        Returnerer:
+            Iterator[dict]: Én JSON-side per nye forespørsel.
+        """
+        params = parameters or self._default_parameters()
+        os.makedirs(output_dir, exist_ok=True)
+
+        checkpoint = self._read_checkpoint(output_dir) if resume else None
+        if checkpoint is not None and checkpoint["parameters"] == params:
+            if checkpoint["next_url"] is None:
+                return
+            url = checkpoint["next_url"]
+            query = None
+            number = checkpoint["pages"]
+        else:
+            # Nytt oppsett – fjern sider fra en tidligere nedlasting
+            for path in glob.glob(os.path.join(output_dir, "page_*.json")):
+                os.remove(path)
+            url = self.endpoint
+            query = params
+            number = 0
+
+        while url is not None:
+            page = self._get_json(url, query)
+
+            next_link = page.get("nextLink")
+            next_url = urljoin(url, next_link) if next_link else None
+
+            # Skriv siden før sjekkpunktet, slik at et avbrudd i mellom
+            # kun fører til at siden hentes på nytt
+            self._write_atomic(
+                os.path.join(
+                    output_dir, self.page_template.format(number=number)
+                ),
+                page,
+            )
+            number += 1
+            self._write_atomic(
+                os.path.join(output_dir, self.checkpoint_name),
+                {
+                    "parameters": params,
+                    "next_url": next_url,
+                    "pages": number,
+                },
+            )
+            yield page
+
+            url = next_url
+            query = None
+
+    @staticmethod
+    def split_period(
+        start: str,
+        end: str,
+        window_years: int = 1,
+    ) -> list[str]:
+        """
+        Del en periode i sammenhengende tidsvinduer.
+
+        Parametre:
+            start (str): Startdato (YYYY-MM-DD).
+            end (str): Sluttdato (YYYY-MM-DD).
+            window_years (int): Antall år per vindu.
+
+        Returnerer:
+            list[str]: Vinduer på formen 'start/slutt' for 'referencetime'.
+
+        Hever:
+            ValueError: Ved ugyldig vindusstørrelse eller periode.
+        """
+        if window_years < 1:
+            raise ValueError("window_years må være minst 1")
+        first = date.fromisoformat(start)
+        last = date.fromisoformat(end)
+        if first >= last:
+            raise ValueError("start må være før end")
+
+        windows: list[str] = []
+        current = first
+        while current < last:
+            upper = date(current.year + window_years, 1, 1)
+            upper = min(upper, last)
+            windows.append(f"{current.isoformat()}/{upper.isoformat()}")
+            current = upper
+        return windows
+
+    def fetch_parallel(
+        self,
+        start: str = "2000-01-01",
+        end: str = "2024-12-31",
+        *,
+        window_years: int = 1,
+        max_workers: int = 4,
+        parameters: dict[str, str] | None = None,
+        sources_per_request: int = 1,
+    ) -> dict:
+        """
+        Hent værdata i parallelle tidsvinduer per stasjon.
+
+        Perioden deles i vinduer per stasjon, som hentes samtidig på en
+        begrenset trådpool. Resultatet slås sammen til samme struktur som
+        fetch_weather_data returnerer.
+
+        Parametre:
+            start (str): Startdato (YYYY-MM-DD).
+            end (str): Sluttdato (YYYY-MM-DD).
+            window_years (int): Antall år per vindu.
+            max_workers (int): Antall tråder i poolen.
+            parameters (dict[str, str] | None): Spørreparametre uten
+            'referencetime'. Bruker standardparametre hvis None.
+            sources_per_request (int): Antall stasjoner som hentes samlet
+            i hver forespørsel.
+
+        Returnerer:
+            dict: Ordbok med nøkkelen 'data' sortert på stasjon og tid.
+        """
+        base = dict(parameters or self._default_parameters())
+        base.pop("referencetime", None)
+        sources = [s for s in base["sources"].split(",") if s]
+
+        tasks = [
+            {**base, "sources": batch, "referencetime": window}
+            for batch in self.registry.source_batches(
+                sources, sources_per_request
+            )
+            for window in self.split_period(start, end, window_years)
+        ]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(self._fetch_window, tasks))
+
+        entries = [entry for result in results for entry in result]
+        entries.sort(
+            key=lambda e: (e.get("sourceId", ""), e.get("referenceTime", ""))
+        )
+        return {"data": entries}
+
+    @staticmethod
+    def latest_reference_times(json_data: dict) -> dict[tuple[str, str], str]:
+        """
+        Finn siste lagrede referenceTime per stasjon og element.
+
+        Parametre:
+            json_data (dict): Rådata på Frost-format med nøkkelen 'data'.
+
+        Returnerer:
+            dict[tuple[str, str], str]: (stasjon, elementId) -> referenceTime.
+            Stasjon er uten sensorsuffiks, f.eks. 'SN18700'.
+        """
+        latest: dict[tuple[str, str], str] = {}
+        for entry in json_data.get("data", []):
+            source = entry["sourceId"].split(":")[0]
+            ref = entry["referenceTime"]
+            for obs in entry.get("observations", []):
+                key = (source, obs["elementId"])
+                if key not in latest or ref > latest[key]:
+                    latest[key] = ref
+        return latest
+
+    def fetch_since(
+        self,
+        raw_path: str,
+        end: str | None = None,
+        *,
+        start: str = "2000-01-01",
+        parameters: dict[str, str] | None = None,
+    ) -> dict:
+        """
+        Hent kun data nyere enn det som allerede er lagret i raw_path.
+
+        For hver stasjon hentes perioden etter den eldste av de siste
+        lagrede datoene for de forespurte elementene. Nye observasjoner
+        flettes inn i filen, og eksisterende verdier for samme stasjon,
+        tid, element og offset erstattes.
+
+        Parametre:
+            raw_path (str): JSON-fil med tidligere hentede rådata.
+            end (str | None): Sluttdato (eksklusiv). Dagens dato hvis None.
+            start (str): Startdato for stasjoner uten lagrede data.
+            parameters (dict[str, str] | None): Spørreparametre uten
+            'referencetime'. Bruker standardparametre hvis None.
+
+        Returnerer:
+            dict: De nye dataene på formen {'data': [...]}.
+        """
+        existing: dict = {"data": []}
+        if os.path.exists(raw_path):
+            with open(raw_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+
+        delta = self._fetch_newer(
+            self.latest_reference_times(existing), end, start, parameters
+        )
+        if delta:
+            merged = self._merge_entries(existing.get("data", []), delta)
+            self.write_json_to_file({**existing, "data": merged}, raw_path)
+        return {"data": delta}
+
+    def update_store(
+        self,
+        store: RawObservationStore,
+        end: str | None = None,
+        *,
+        start: str = "2000-01-01",
+        parameters: dict[str, str] | None = None,
+    ) -> int:
+        """
+        Hent kun nye data og legg dem til i et kompakt rålager.
+
+        Fungerer som fetch_since, men leser siste tidspunkt fra lagerets
+        nyeste partisjoner og legger nye observasjoner til uten å skrive
+        eksisterende filer på nytt. Vinduet starter ved det eldste
+        vannmerket, så observasjoner som allerede er lagret for sitt
+        element, filtreres bort før de skrives.
+
+        Parametre:
+            store (RawObservationStore): Lageret som skal oppdateres.
+            end (str | None): Sluttdato (eksklusiv). Dagens dato hvis None.
+            start (str): Startdato for stasjoner uten lagrede data.
+            parameters (dict[str, str] | None): Spørreparametre uten
+            'referencetime'. Bruker standardparametre hvis None.
+
+        Returnerer:
+            int: Antall nye observasjoner.
+        """
+        base = parameters or self._default_parameters()
+        latest = store.latest_reference_times(
+            [e for e in base["elements"].split(",") if e]
         )
-        response.raise_for_status()
+        delta = self._fetch_newer(latest, end, start, parameters)
+        return store.append_page({"data": self._newer_than(delta, latest)})
+
+    @staticmethod
+    def _newer_than(
+        entries: list[dict],
+        latest: dict[tuple[str, str], str],
+    ) -> list[dict]:
+        """
+        Behold kun observasjoner nyere enn vannmerket for sitt element.
+
+        Parametre:
+            entries (list[dict]): Frost-oppføringer.
+            latest (dict[tuple[str, str], str]): (stasjon, elementId) ->
+            siste lagrede referenceTime.
+
+        Returnerer:
+            list[dict]: Oppføringer med nye observasjoner.
+        """
+        newer: list[dict] = []
+        for entry in entries:
+            source = entry["sourceId"].split(":")[0]
+            ref = entry["referenceTime"]
+            observations = [
+                obs for obs in entry.get("observations", [])
+                if ref > latest.get((source, obs["elementId"]), "")
+            ]
+            if observations:
+                newer.append({**entry, "observations": observations})
+        return newer
+
+    def _fetch_newer(
+        self,
+        latest: dict[tuple[str, str], str],
+        end: str | None,
+        start: str,
+        parameters: dict[str, str] | None,
+    ) -> list[dict]:
+        """Hent oppføringer nyere enn siste lagrede tid per stasjon."""
+        base = dict(parameters or self._default_parameters())
+        base.pop("referencetime", None)
+        elements = [e for e in base["elements"].split(",") if e]
+        end = end or date.today().isoformat()
+
+        # Grupper stasjoner med samme startdato i felles forespørsler
+        by_first: dict[str, list[str]] = {}
+        for source in (s for s in base["sources"].split(",") if s):
+            stored = [latest.get((source, element)) for element in elements]
+            if None in stored:
+                first = start
+            else:
+                # Neste dag etter den eldste av de siste datoene
+                oldest = date.fromisoformat(min(stored)[:10])
+                first = (oldest + timedelta(days=1)).isoformat()
+            if first < end:
+                by_first.setdefault(first, []).append(source)
+
+        delta: list[dict] = []
+        for first, sources in sorted(by_first.items()):
+            for batch in self.registry.source_batches(sources):
+                delta.extend(self._fetch_window({
+                    **base,
+                    "sources": batch,
+                    "referencetime": f"{first}/{end}",
+                }))
+        return delta
+
+    @staticmethod
+    def _merge_entries(
+        entries: list[dict], updates: list[dict]
+    ) -> list[dict]:
+        """Flett nye Frost-oppføringer inn i eksisterende, sortert."""
+        by_key: dict[tuple[str, str], dict] = {
+            (e["sourceId"], e["referenceTime"]): e for e in entries
+        }
+        for update in updates:
+            key = (update["sourceId"], update["referenceTime"])
+            if key not in by_key:
+                by_key[key] = update
+                continue
+            observations = {
+                (o["elementId"], o.get("timeOffset")): o
+                for o in by_key[key].get("observations", [])
+            }
+            for obs in update.get("observations", []):
+                observations[(obs["elementId"], obs.get("timeOffset"))] = obs
+            by_key[key] = {
+                **by_key[key],
+                "observations": list(observations.values()),
+            }
+        return [by_key[key] for key in sorted(by_key)]
+
+    def _fetch_window(self, params: dict[str, str]) -> list[dict]:
+        """Hent alle sider for ett tidsvindu og én stasjon."""
+        entries: list[dict] = []
+        url: str | None = self.endpoint
+        query: dict[str, str] | None = params
+        while url is not None:
+            try:
+                page = self._get_json(url, query)
+            except requests.HTTPError as exc:
+                # Frost svarer 404 når vinduet ikke har data
+                if exc.response is not None \
+                        and exc.response.status_code == 404:
+                    break
+                raise
+            entries.extend(page.get("data", []))
+            next_link = page.get("nextLink")
+            url = urljoin(url, next_link) if next_link else None
+            query = None
+        return entries
+
+    def _host_slot(self, url: str) -> threading.BoundedSemaphore:
+        """Returner semaforen som begrenser samtidighet mot verten."""
+        host = urlparse(url).netloc
+        with self._slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(
+                    self.max_per_host
+                )
+            return self._host_slots[host]
+
+    @staticmethod
+    def _cache_key(url: str, params: dict[str, str] | None) -> str:
+        """Lag stabil nøkkel for ett spørrevindu."""
+        query = urlencode(sorted((params or {}).items()))
+        return f"{url}?{query}" if query else url
+
+    def _get_json(
+        self,
+        url: str,
+        params: dict[str, str] | None = None,
+    ) -> dict:
+        """
+        Hent JSON med betinget forespørsel og mellomlagring.
+
+        Sender If-None-Match/If-Modified-Since når vinduet er hentet før.
+        Ved 304 Not Modified returneres det lagrede svaret.
+
+        Parametre:
+            url (str): Full URL for forespørselen.
+            params (dict[str, str] | None): Spørreparametre.
+
+        Returnerer:
+            dict: JSON-innholdet i svaret.
+        """
+        key = self._cache_key(url, params)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+
+        headers: dict[str, str] = {}
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self._request(url, params, headers)
+        if response.status_code == 304 and cached is not None:
+            self._count(cache_hits=1)
+            return self._cached_body(cached)
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self._store(key, etag, last_modified, response.content)
         return response.json()
 
+    def _request(
+        self,
+        url: str,
+        params: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> requests.Response:
+        """
+        Send GET med begrenset samtidighet og nye forsøk ved 429/5xx.
+
+        Parametre:
+            url (str): Full URL for forespørselen.
+            params (dict[str, str] | None): Spørreparametre.
+            headers (dict[str, str] | None): Ekstra HTTP-headere.
+
+        Returnerer:
+            requests.Response: Vellykket svar (2xx eller 304).
+
+        Hever:
+            requests.HTTPError: Ved feil som ikke løses av nye forsøk.
+        """
+        slot = self._host_slot(url)
+        attempt = 0
+        while True:
+            with slot:
+                response = self.session.get(
+                    url,
+                    params=params,
+                    headers=headers or {},
+                )
+            self._count(
+                requests=1,
+                bytes=int(
+                    response.headers.get("Content-Length")
+                    or len(response.content)
+                ),
+            )
+            if (
+                response.status_code in RETRY_STATUS
+                and attempt < self.max_retries
+            ):
+                # Vent utenfor semaforen, så andre tråder slipper til
+                time.sleep(self._retry_delay(response, attempt))
+                attempt += 1
+                continue
+            response.raise_for_status()
+            return response
+
+    def _count(self, **increments: int) -> None:
+        """Oppdater tellere for forespørsler, bytes og cache-treff."""
+        with self._cache_lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def _store(
+        self,
+        key: str,
+        etag: str | None,
+        last_modified: str | None,
+        body: bytes,
+    ) -> None:
+        """
+        Lagre validatorer og svar for et spørrevindu.
+
+        Uten cache_dir holdes svarene i minnet innenfor cache_bytes.
+        Vinduer som kastes, mister også validatorene sine, så neste
+        forespørsel blir ubetinget.
+        """
+        entry = {"etag": etag, "last_modified": last_modified}
+        if self.cache_dir is None:
+            entry["body"] = body
+        else:
+            name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+            with open(os.path.join(self.cache_dir, name), "wb") as f:
+                f.write(body)
+            entry["file"] = name
+
+        with self._cache_lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._cache_nbytes -= len(old.get("body", b""))
+            if self.cache_dir is None:
+                if len(body) > self.cache_bytes:
+                    return
+                self._cache_nbytes += len(body)
+                while self._cache_nbytes > self.cache_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cache_nbytes -= len(evicted["body"])
+            self._cache[key] = entry
+            if self.cache_dir is not None:
+                self._write_atomic(
+                    os.path.join(self.cache_dir, "validators.json"),
+                    self._cache,
+                )
+
+    def _cached_body(self, entry: dict) -> dict:
+        """Les lagret svar fra minne eller disk."""
+        if "body" in entry:
+            return json.loads(entry["body"])
+        with open(
+            os.path.join(self.cache_dir, entry["file"]), "rb"
+        ) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _read_validators(cache_dir: str) -> dict[str, dict]:
+        """Les lagrede validatorer fra cache-mappen."""
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, "validators.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _retry_delay(
+        self, response: requests.Response, attempt: int
+    ) -> float:
+        """Ventetid før nytt forsøk; bruker Retry-After hvis oppgitt."""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt)
+
+    def _read_checkpoint(self, output_dir: str) -> dict | None:
+        """Les sjekkpunkt fra mappen, eller None hvis det mangler."""
+        path = os.path.join(output_dir, self.checkpoint_name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _write_atomic(path: str, json_data: dict) -> None:
+        """Skriv JSON til midlertidig fil og bytt den inn atomisk."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(json_data, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load_pages(output_dir: str) -> Iterator[dict]:
+        """
+        Les lagrede sider fra disk i rekkefølge.
+
+        Parametre:
+            output_dir (str): Mappe med sidefiler.
+
+        Returnerer:
+            Iterator[dict]: JSON-sidene i hentet rekkefølge.
+        """
+        for path in sorted(glob.glob(os.path.join(output_dir, "page_*.json"))):
+            with open(path, "r", encoding="utf-8") as f:
+                yield json.load(f)
+
+    @staticmethod
+    def merge_pages(pages) -> dict:
+        """
+        Slå sammen sider til samme struktur som ett enkelt svar.
+
+        Parametre:
+            pages (Iterable[dict]): JSON-sider fra Frost.
+
+        Returnerer:
+            dict: Ordbok med nøkkelen 'data' for alle observasjoner.
+        """
+        merged: list[dict] = []
+        for page in pages:
+            merged.extend(page.get("data", []))
+        return {"data": merged}
+
     def write_json_to_file(
         self, json_data: dict, filename: str
     ) -> None:
@@ -60,4 +728,4 @@ class WeatherFetcher:
         with open(filename, "w", encoding="utf-8") as f:
             encoder = json.JSONEncoder(indent=4)
             for chunk in encoder.iterencode(json_data):
-                f.write(chunk)
\ No newline at end of file
+                f.write(chunk)
@@ -0,0 +1,176 @@
+"""Kompakt rålager for Frost-observasjoner, partisjonert på stasjon og år."""
+
+import csv
+import glob
+import gzip
+import os
+import re
+
+from collections.abc import Iterable
+
+# Kolonner i hver partisjon, samme rekkefølge som CSV-filene per by
+RAW_COLUMNS: list[str] = [
+    "sourceId",
+    "referenceTime",
+    "timeOffset",
+    "elementId",
+    "value",
+    "unit",
+]
+
+_PARTITION = re.compile(r"source=([^/\\]+)[/\\]year=(\d{4})\.csv\.gz$")
+
+
+class RawObservationStore:
+    """
+    Skriver og leser rådata som komprimerte, linjebaserte CSV-poster.
+
+    Hver observasjon blir én linje i filen
+    '<root>/source=<sourceId>/year=<år>.csv.gz'. Sider fra Frost kan
+    skrives rett fra nedlastingsstrømmen uten å holde hele svaret i
+    minnet, og filene kan leses direkte med pandas.read_csv.
+    """
+
+    def __init__(self, root: str) -> None:
+        """
+        Initialiserer lageret.
+
+        Parametre:
+            root (str): Rotmappe for partisjonene.
+        """
+        self.root = root
+
+    def partition_path(self, source_id: str, year: int | str) -> str:
+        """Returner filsti for partisjonen til en stasjon og et år."""
+        return os.path.join(
+            self.root,
+            f"source={source_id.split(':')[0]}",
+            f"year={int(year):04d}.csv.gz",
+        )
+
+    def append_page(self, page: dict) -> int:
+        """
+        Skriv alle observasjoner i én Frost-side til sine partisjoner.
+
+        Parametre:
+            page (dict): JSON-side med nøkkelen 'data'.
+
+        Returnerer:
+            int: Antall skrevne observasjoner.
+        """
+        rows: dict[str, list[list]] = {}
+        for entry in page.get("data", []):
+            path = self.partition_path(
+                entry["sourceId"], entry["referenceTime"][:4]
+            )
+            bucket = rows.setdefault(path, [])
+            for obs in entry.get("observations", []):
+                bucket.append([
+                    entry["sourceId"],
+                    entry["referenceTime"],
+                    obs.get("timeOffset"),
+                    obs["elementId"],
+                    obs["value"],
+                    obs.get("unit", "N/A"),
+                ])
+
+        for path, bucket in rows.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            is_new = not os.path.exists(path)
+            # Hver skriving legger til et nytt gzip-medlem i filen
+            with gzip.open(path, "at", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(RAW_COLUMNS)
+                writer.writerows(bucket)
+
+        return sum(len(bucket) for bucket in rows.values())
+
+    def write_pages(self, pages: Iterable[dict]) -> int:
+        """
+        Skriv en strøm av sider, f.eks. fra stream_weather_data.
+
+        Parametre:
+            pages (Iterable[dict]): JSON-sider fra Frost.
+
+        Returnerer:
+            int: Totalt antall skrevne observasjoner.
+        """
+        return sum(self.append_page(page) for page in pages)
+
+    def partitions(
+        self,
+        sources: Iterable[str] | None = None,
+        years: Iterable[int] | None = None,
+    ) -> list[str]:
+        """
+        List partisjonsfiler, eventuelt filtrert på stasjon og år.
+
+        Parametre:
+            sources (Iterable[str] | None): sourceId-er å ta med.
+            years (Iterable[int] | None): År å ta med.
+
+        Returnerer:
+            list[str]: Sorterte filstier.
+        """
+        wanted_sources = (
+            None if sources is None
+            else {s.split(":")[0] for s in sources}
+        )
+        wanted_years = None if years is None else {int(y) for y in years}
+
+        paths = []
+        pattern = os.path.join(self.root, "source=*", "year=*.csv.gz")
+        for path in sorted(glob.glob(pattern)):
+            match = _PARTITION.search(path)
+            if match is None:
+                continue
+            source, year = match.group(1), int(match.group(2))
+            if wanted_sources is not None and source not in wanted_sources:
+                continue
+            if wanted_years is not None and year not in wanted_years:
+                continue
+            paths.append(path)
+        return paths
+
+    def latest_reference_times(
+        self,
+        elements: Iterable[str] | None = None,
+    ) -> dict[tuple[str, str], str]:
+        """
+        Finn siste lagrede referenceTime per stasjon og element.
+
+        Årspartisjonene leses fra nyeste og bakover for hver stasjon,
+        og letingen stopper når alle elementene er funnet. Uten
+        elements leses alle partisjonene.
+
+        Parametre:
+            elements (Iterable[str] | None): Elementene som trengs.
+
+        Returnerer:
+            dict[tuple[str, str], str]: (stasjon, elementId) -> referenceTime.
+        """
+        wanted = None if elements is None else set(elements)
+        by_source: dict[str, list[str]] = {}
+        for path in self.partitions():
+            source = _PARTITION.search(path).group(1)
+            by_source.setdefault(source, []).append(path)
+
+        latest: dict[tuple[str, str], str] = {}
+        for source, paths in by_source.items():
+            found: dict[str, str] = {}
+            for path in reversed(paths):
+                with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+                    for row in csv.DictReader(f):
+                        element = row["elementId"]
+                        if row["referenceTime"] > found.get(element, ""):
+                            found[element] = row["referenceTime"]
+                # Eldre år kan ikke ha nyere tidspunkter
+                if wanted is not None and wanted <= found.keys():
+                    break
+            for element, ref in found.items():
+                latest[(source, element)] = ref
+        return latest
+
+
+__all__ = ["RawObservationStore", "RAW_COLUMNS"]
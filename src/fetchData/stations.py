@@ -0,0 +1,167 @@
+"""Felles register over målestasjoner og elementer som hentes fra Frost."""
+
+import json
+
+# Stasjoner per by (bykode -> Frost sourceId uten sensorsuffiks)
+DEFAULT_STATIONS: dict[str, str] = {
+    "oslo": "SN18700",
+    "tromso": "SN90450",
+}
+
+# Måleparametere: daglige snitt, min, maks, sum og vind
+DEFAULT_ELEMENTS: list[str] = [
+    "mean(air_temperature P1D)",
+    "min(air_temperature P1D)",
+    "max(air_temperature P1D)",
+    "sum(precipitation_amount P1D)",
+    "mean(wind_speed P1D)",
+]
+
+# Maks antall stasjoner per forespørsel, for å holde URL-lengde og
+# svarstørrelse innenfor grensene til Frost API
+MAX_SOURCES_PER_REQUEST: int = 50
+
+
+def _slugify(text: str) -> str:
+    """Gjør om tekst til bykode (små bokstaver, uten æøå)."""
+    return (
+        text.lower().replace("ø", "o")
+        .replace("æ", "ae").replace("å", "a")
+    )
+
+
+class StationRegistry:
+    """Register over byer, Frost-stasjoner og elementer."""
+
+    def __init__(
+        self,
+        stations: dict[str, str] | None = None,
+        elements: list[str] | None = None,
+        max_sources: int = MAX_SOURCES_PER_REQUEST,
+    ) -> None:
+        """
+        Initialiserer registeret.
+
+        Parametre:
+            stations (dict[str, str] | None): Bykode -> sourceId,
+            f.eks. {"oslo": "SN18700"}. Standardstasjoner hvis None.
+            elements (list[str] | None): ElementId-er som skal hentes.
+            Standardelementer hvis None.
+            max_sources (int): Maks antall stasjoner per forespørsel.
+        """
+        stations = DEFAULT_STATIONS if stations is None else stations
+        self.stations = {
+            _slugify(city): source.split(":")[0]
+            for city, source in stations.items()
+        }
+        self.elements = list(
+            DEFAULT_ELEMENTS if elements is None else elements
+        )
+        self.max_sources = max_sources
+        self._by_source = {
+            source: city for city, source in self.stations.items()
+        }
+
+    @classmethod
+    def from_json(cls, path: str) -> "StationRegistry":
+        """
+        Les register fra JSON-fil.
+
+        Filen har formen {"stations": {"oslo": "SN18700", ...},
+        "elements": ["mean(air_temperature P1D)", ...], "max_sources": 50}.
+        Manglende nøkler gir standardverdier.
+
+        Parametre:
+            path (str): Sti til JSON-filen.
+
+        Returnerer:
+            StationRegistry: Registeret beskrevet i filen.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(
+            config.get("stations"),
+            config.get("elements"),
+            config.get("max_sources", MAX_SOURCES_PER_REQUEST),
+        )
+
+    def cities(self) -> list[str]:
+        """Returner alle bykoder i registeret."""
+        return list(self.stations)
+
+    def source_ids(self) -> list[str]:
+        """Returner alle sourceId-er (uten sensorsuffiks)."""
+        return list(self.stations.values())
+
+    def source_id(self, city: str) -> str:
+        """
+        Hent sourceId for en by.
+
+        Parametre:
+            city (str): Bykode, f.eks. "oslo".
+
+        Returnerer:
+            str: sourceId uten sensorsuffiks, f.eks. "SN18700".
+
+        Hever:
+            KeyError: Hvis byen ikke finnes i registeret.
+        """
+        slug = _slugify(city)
+        if slug not in self.stations:
+            raise KeyError(f"Ukjent by i stasjonsregisteret: {city!r}")
+        return self.stations[slug]
+
+    def sensor_id(self, city: str) -> str:
+        """Hent sourceId med sensorsuffiks slik Frost returnerer den."""
+        return f"{self.source_id(city)}:0"
+
+    def city_for_source(self, source_id: str) -> str | None:
+        """Finn bykode for en sourceId, med eller uten sensorsuffiks."""
+        return self._by_source.get(source_id.split(":")[0])
+
+    def infer_city(self, text: str) -> str | None:
+        """
+        Finn bykode som forekommer i en tekst, f.eks. en filsti.
+
+        Parametre:
+            text (str): Tekst å søke i.
+
+        Returnerer:
+            str | None: Lengste bykode som finnes i teksten, ellers None.
+        """
+        slug = _slugify(text)
+        matches = [city for city in self.stations if city in slug]
+        return max(matches, key=len) if matches else None
+
+    def elements_param(self) -> str:
+        """Returner elementene som kommaseparert spørreparameter."""
+        return ",".join(self.elements)
+
+    def source_batches(
+        self,
+        sources: list[str] | None = None,
+        max_sources: int | None = None,
+    ) -> list[str]:
+        """
+        Del stasjonene i grupper for samlede forespørsler.
+
+        Parametre:
+            sources (list[str] | None): Stasjoner å dele opp.
+            Alle stasjoner i registeret hvis None.
+            max_sources (int | None): Maks antall stasjoner per gruppe.
+            Bruker registerets grense hvis None.
+
+        Returnerer:
+            list[str]: Kommaseparerte sourceId-er per forespørsel.
+        """
+        max_sources = max_sources or self.max_sources
+        if max_sources < 1:
+            raise ValueError("max_sources må være minst 1")
+        sources = self.source_ids() if sources is None else sources
+        return [
+            ",".join(sources[i:i + max_sources])
+            for i in range(0, len(sources), max_sources)
+        ]
+
+
+__all__ = ["StationRegistry"]
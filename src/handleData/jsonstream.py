@@ -0,0 +1,209 @@
+"""Inkrementell lesing og kolonnevis utflating av Frost-JSON."""
+
+import json
+import numpy as np
+import pandas as pd
+
+from array import array
+from collections.abc import Iterator
+from typing import IO
+
+# Kolonner som lagres som kategorier i resultatet
+CATEGORY_COLUMNS: tuple[str, ...] = (
+    "sourceId", "timeOffset", "elementId", "unit"
+)
+
+
+class _JsonReader:
+    """Leser JSON-verdier fra en fil bit for bit med raw_decode."""
+
+    _whitespace = " \t\n\r"
+
+    def __init__(self, f: IO[str], chunk_size: int) -> None:
+        """Initialiser leseren med åpen tekstfil og bufferstørrelse."""
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Les neste bit og kast det som allerede er lest."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Returner neste tegn som ikke er mellomrom, '' ved filslutt."""
+        while True:
+            while self.pos < len(self.buf) \
+                    and self.buf[self.pos] in self._whitespace:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Les forventet skilletegn, ellers ValueError."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(
+                f"Ugyldig JSON: forventet {char!r}, fant {found!r}"
+            )
+        self.pos += 1
+
+    def value(self):
+        """Les én hel JSON-verdi, og fyll bufferen ved behov."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Tall kan være kuttet ved bufferslutt – les mer og prøv igjen
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_json_array(
+    f: IO[str],
+    key: str = "data",
+    chunk_size: int = 1 << 20,
+) -> Iterator[dict]:
+    """
+    Gi ut elementene i en liste i toppnivå-objektet ett om gangen.
+
+    Andre nøkler i objektet leses og kastes. Minnebruken begrenses av
+    chunk_size og største enkeltelement, ikke av filstørrelsen.
+
+    Parametre:
+        f (IO[str]): Åpen tekstfil med et JSON-objekt.
+        key (str): Nøkkelen til listen som skal strømmes.
+        chunk_size (int): Antall tegn som leses per gang.
+
+    Returnerer:
+        Iterator[dict]: Elementene i listen.
+
+    Hever:
+        ValueError: Ved ugyldig JSON eller manglende nøkkel.
+    """
+    reader = _JsonReader(f, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        raise ValueError(f"JSON-filen mangler '{key}'")
+
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key:
+            reader.expect("[")
+            if reader.peek() == "]":
+                return
+            while True:
+                yield reader.value()
+                if reader.peek() == "]":
+                    return
+                reader.expect(",")
+        reader.value()
+        if reader.peek() == "}":
+            raise ValueError(f"JSON-filen mangler '{key}'")
+        reader.expect(",")
+
+
+class ObservationColumns:
+    """
+    Bygger kolonner for observasjoner uten én ordbok per rad.
+
+    Tekstkolonner lagres som heltallskoder mot en ordbok over unike
+    verdier, og verdier som float64 i en kompakt array.
+    """
+
+    def __init__(self) -> None:
+        """Initialiser tomme kolonner."""
+        self._codes: dict[str, array] = {
+            col: array("i")
+            for col in ("referenceTime",) + CATEGORY_COLUMNS
+        }
+        self._lookup: dict[str, dict] = {col: {} for col in self._codes}
+        self._values = array("d")
+
+    def _encode(self, col: str, value) -> int:
+        """Returner koden for en verdi, -1 for manglende."""
+        if value is None:
+            return -1
+        lookup = self._lookup[col]
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(lookup)
+        return code
+
+    def add_entry(self, entry: dict) -> None:
+        """Legg til alle observasjoner i én Frost-oppføring."""
+        source = self._encode("sourceId", entry["sourceId"])
+        ref = self._encode("referenceTime", entry["referenceTime"])
+        for obs in entry.get("observations", []):
+            self._codes["sourceId"].append(source)
+            self._codes["referenceTime"].append(ref)
+            self._codes["timeOffset"].append(
+                self._encode("timeOffset", obs.get("timeOffset"))
+            )
+            self._codes["elementId"].append(
+                self._encode("elementId", obs["elementId"])
+            )
+            self._codes["unit"].append(
+                self._encode("unit", obs.get("unit", "N/A"))
+            )
+            value = obs["value"]
+            self._values.append(np.nan if value is None else float(value))
+
+    def __len__(self) -> int:
+        """Antall observasjoner lagt til."""
+        return len(self._values)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Bygg df med kategoriske tekstkolonner og float64-verdier.
+
+        Returnerer:
+            pd.DataFrame: Kolonner sourceId, referenceTime, timeOffset,
+            elementId, value og unit.
+        """
+        columns: dict[str, object] = {}
+        for col in ("sourceId", "referenceTime", "timeOffset", "elementId"):
+            columns[col] = self._decode(col)
+        columns["value"] = np.frombuffer(
+            self._values, dtype=np.float64
+        ).copy()
+        columns["unit"] = self._decode("unit")
+
+        df = pd.DataFrame(columns)
+        df["referenceTime"] = df["referenceTime"].astype(object)
+        return df
+
+    def _decode(self, col: str) -> pd.Categorical:
+        """Gjør om koder til en kategorisk kolonne."""
+        codes = np.frombuffer(self._codes[col], dtype=np.int32).copy()
+        categories = list(self._lookup[col])
+        try:
+            return pd.Categorical.from_codes(codes, categories=categories)
+        except (TypeError, ValueError):
+            # Blandede typer kan ikke sorteres som kategorier
+            values = np.empty(len(categories) + 1, dtype=object)
+            values[:-1] = categories
+            values[-1] = None
+            return pd.Categorical(values[codes])
+
+
+__all__ = ["iter_json_array", "ObservationColumns"]
@@ -0,0 +1,120 @@
+"""Delt SQL-lag over værdata i en vedvarende, indeksert SQLite-database."""
+
+import pandas as pd
+import sqlite3
+import threading
+
+from collections.abc import Iterable
+
+
+class QueryEngine:
+    """
+    Kjører SQL mot df-er som er registrert som tabeller i SQLite.
+
+    En tabell kopieres kun inn på nytt når innholdet endres, og
+    valgte kolonner indekseres. Med en filsti overlever tabellene mellom
+    kjøringer, slik at spørringer ikke trenger å laste dataene på nytt.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        """
+        Åpner databasen.
+
+        Parametre:
+            path (str): Filsti til SQLite-databasen, eller ':memory:'.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS _tables "
+            "(name TEXT PRIMARY KEY, version TEXT NOT NULL)"
+        )
+
+    @staticmethod
+    def fingerprint(df: pd.DataFrame) -> str:
+        """Lag et innholdsfingeravtrykk for en df."""
+        content = int(pd.util.hash_pandas_object(df, index=False).sum())
+        return f"{df.shape}:{tuple(df.columns)}:{content}"
+
+    def register(
+        self,
+        name: str,
+        df: pd.DataFrame,
+        *,
+        indexes: Iterable[str] = (),
+        version: str | None = None,
+    ) -> bool:
+        """
+        Gjør en df tilgjengelig som tabell.
+
+        Parametre:
+            name (str): Tabellnavn i SQL.
+            df (pd.DataFrame): Data som skal spørres mot.
+            indexes (Iterable[str]): Kolonner som skal indekseres.
+            version (str | None): Versjon for innholdet, f.eks. et
+            filfingeravtrykk. Beregnes fra innholdet hvis None.
+
+        Returnerer:
+            bool: True hvis tabellen ble skrevet, False hvis den var
+            oppdatert fra før.
+        """
+        version = version or self.fingerprint(df)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT version FROM _tables WHERE name = ?", (name,)
+            ).fetchone()
+            if row is not None and row[0] == version:
+                return False
+
+            df.to_sql(name, self.conn, if_exists="replace", index=False)
+            for column in indexes:
+                self.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "ix_{name}_{column}" '
+                    f'ON "{name}" ("{column}")'
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO _tables (name, version) "
+                "VALUES (?, ?)",
+                (name, version),
+            )
+            self.conn.commit()
+        return True
+
+    def query(
+        self,
+        sql: str,
+        params: Iterable | dict | None = None,
+    ) -> pd.DataFrame:
+        """
+        Kjør en SQL-spørring og returner resultatet som df.
+
+        Parametre:
+            sql (str): SQL-spørringen.
+            params (Iterable | dict | None): Parametre til spørringen.
+
+        Returnerer:
+            pd.DataFrame: Resultatet av spørringen.
+        """
+        with self._lock:
+            return pd.read_sql_query(sql, self.conn, params=params)
+
+    def close(self) -> None:
+        """Lukk databasetilkoblingen."""
+        self.conn.close()
+
+
+_shared_engine: QueryEngine | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_engine() -> QueryEngine:
+    """Returner prosessens felles QueryEngine i minnet."""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            _shared_engine = QueryEngine()
+        return _shared_engine
+
+
+__all__ = ["QueryEngine", "shared_engine"]
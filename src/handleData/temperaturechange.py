@@ -1,79 +1,377 @@
-"""Lager range-verdier for temperatur i CSV-filer."""
+"""Lager avledede temperaturelementer, som range, i CSV-filer."""
 
+import json
+import numpy as np
 import os
 import pandas as pd
+import sys
+
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from src.fetchData.stations import StationRegistry
+except ImportError:
+    sys.path.append(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "fetchData"
+    ))
+    from stations import StationRegistry
+
+MAX_ELEMENT = "max(air_temperature P1D)"
+MIN_ELEMENT = "min(air_temperature P1D)"
+MEAN_ELEMENT = "mean(air_temperature P1D)"
+
+# Grunntemperatur for fyringsgraddager (17 °C er vanlig i Norge)
+DEGREE_DAY_BASE = 17.0
+
+# Avledede elementer: navn -> (elementId, enhet, nødvendige elementer)
+DERIVED_ELEMENTS: dict[str, tuple[str, str, tuple[str, ...]]] = {
+    "range": (
+        "range(air_temperature P1D)", "degC",
+        (MAX_ELEMENT, MIN_ELEMENT),
+    ),
+    "midrange": (
+        "midrange(air_temperature P1D)", "degC",
+        (MAX_ELEMENT, MIN_ELEMENT),
+    ),
+    "degree_days": (
+        "heating_degree_days(air_temperature P1D)", "degC",
+        (MEAN_ELEMENT, MAX_ELEMENT, MIN_ELEMENT),
+    ),
+}
+
+KEY_COLUMNS = ["sourceId", "referenceTime", "timeOffset"]
+OUTPUT_COLUMNS = KEY_COLUMNS + ["elementId", "value", "unit"]
+
+# Avledede rader lagres i egen partisjon ved siden av by-filen, og
+# tilstanden (kildefil og beregnede elementer) i en JSON-fil
+DERIVED_TEMPLATE = "vaerdata_{city}_derived.csv"
+STATE_TEMPLATE = "vaerdata_{city}_derived.json"
+
+# Antall rader per bit når by-filen leses
+CHUNK_ROWS = 200_000
 
 
 class TemperatureRangeConverter:
-    """Beregner og erstatter daglig temperatursvingning (maks − min) i CSV."""
+    """Beregner daglige avledede temperaturelementer per stasjon i CSV."""
 
-    def __init__(self, output_dir: str) -> None:
+    def __init__(
+        self,
+        output_dir: str,
+        registry: StationRegistry | None = None,
+    ) -> None:
         """Oppretter output-mappe hvis den ikke finnes."""
         self.output_dir = output_dir
+        self.registry = registry or StationRegistry()
         os.makedirs(self.output_dir, exist_ok=True)
 
+    @staticmethod
+    def compute_derived(
+        df: pd.DataFrame,
+        elements: Iterable[str] = ("range",),
+    ) -> pd.DataFrame:
+        """
+        Beregn avledede elementer for alle stasjoner i én gjennomgang.
+
+        Tabellen kan inneholde mange stasjoner på langt format. Hver
+        (sourceId, referenceTime, timeOffset) kodes som et heltall, og
+        første gyldige verdi per element legges i en numpy-array, slik at
+        alle avledede elementer beregnes vektorisert fra samme skann.
+
+        Parametre:
+            df (pd.DataFrame): Langt format med kolonnene sourceId,
+            referenceTime, timeOffset, elementId og value.
+            elements (Iterable[str]): Navn fra DERIVED_ELEMENTS, f.eks.
+            'range', 'midrange' og 'degree_days'.
+
+        Returnerer:
+            pd.DataFrame: Nye rader med kolonnene i OUTPUT_COLUMNS.
+
+        Hever:
+            ValueError: Ved ukjent avledet element.
+        """
+        elements = list(elements)
+        unknown = [e for e in elements if e not in DERIVED_ELEMENTS]
+        if unknown:
+            raise ValueError(
+                f"Ukjente avledede elementer: {unknown!r}. Gyldige: "
+                + ", ".join(DERIVED_ELEMENTS)
+            )
+
+        needed = sorted({
+            source
+            for name in elements
+            for source in DERIVED_ELEMENTS[name][2]
+        })
+        sub = df[df["elementId"].isin(needed)]
+        values = pd.to_numeric(sub["value"], errors="coerce").to_numpy(
+            dtype=np.float64
+        )
+        valid = ~np.isnan(values)
+        sub = sub[valid]
+        values = values[valid]
+
+        # Heltallskode per (stasjon, tid, offset) i rekkefølgen de dukker opp
+        codes = sub.groupby(
+            KEY_COLUMNS, sort=False, observed=True, dropna=False
+        ).ngroup().to_numpy()
+        n_keys = int(codes.max()) + 1 if codes.size else 0
+
+        element_ids = sub["elementId"].to_numpy()
+        inputs: dict[str, np.ndarray] = {}
+        for element in needed:
+            arr = np.full(n_keys, np.nan)
+            mask = element_ids == element
+            # Baklengs tilordning gjør at første verdi per nøkkel vinner
+            arr[codes[mask][::-1]] = values[mask][::-1]
+            inputs[element] = arr
+
+        first_rows = np.unique(codes, return_index=True)[1]
+        keys = sub.iloc[first_rows][KEY_COLUMNS].reset_index(drop=True)
+
+        frames = []
+        for name in elements:
+            element_id, unit, sources = DERIVED_ELEMENTS[name]
+            derived = _DERIVE[name](inputs)
+            present = np.zeros(n_keys, dtype=bool)
+            for source in sources:
+                present |= ~np.isnan(inputs[source])
+
+            out = keys[present].copy()
+            out["elementId"] = element_id
+            out["value"] = np.round(derived[present], 1)
+            out["unit"] = unit
+            frames.append(out)
+
+        if not frames:
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+        return pd.concat(frames, ignore_index=True)[OUTPUT_COLUMNS]
+
     def _compute_daily_range(self, df_city: pd.DataFrame) -> pd.DataFrame:
         """Returnerer df med nytt element 'range(air_temperature P1D)'."""
-        df_mm = df_city[df_city["elementId"].isin([
-            "max(air_temperature P1D)",
-            "min(air_temperature P1D)",
-        ])]
-
-        df_piv = df_mm.pivot_table(
-            index=["sourceId", "referenceTime", "timeOffset"],
-            columns="elementId",
-            values="value",
-            aggfunc="first",
-        )
+        return self.compute_derived(df_city, ["range"])
 
-        # Beregn differansen og rund av
-        max_vals = pd.to_numeric(
-            df_piv["max(air_temperature P1D)"], errors="coerce"
-        )
-        min_vals = pd.to_numeric(
-            df_piv["min(air_temperature P1D)"], errors="coerce"
-        )
-        df_piv["value"] = (max_vals - min_vals).round(1)
-
-        df_out = df_piv.reset_index()
-        df_out["elementId"] = "range(air_temperature P1D)"
-        df_out["unit"] = "degC"
-
-        return df_out[
-            [
-                "sourceId",
-                "referenceTime",
-                "timeOffset",
-                "elementId",
-                "value",
-                "unit",
-            ]
-        ]
+    def _process_city(
+        self,
+        city: str,
+        elements: Iterable[str] = ("range",),
+    ) -> int:
+        """
+        Oppdater den avledede partisjonen til en by med endrede datoer.
+
+        By-filen endres ikke. Er den uendret siden forrige kjøring,
+        gjøres ingenting. Ellers leses kun kolonnene og radene for
+        inngangselementene, alle datoer regnes ut på nytt, og kun rader
+        som er nye eller har fått ny verdi legges til på slutten av
+        'vaerdata_{city}_derived.csv'. Datoer som ikke lenger kan
+        beregnes får en rad uten verdi. Siste rad per nøkkel gjelder,
+        og partisjonen komprimeres når den har flere utdaterte enn
+        gyldige rader.
 
-    def _process_city(self, city: str) -> None:
-        """Leser by-CSV, legger på range-verdier og skriver tilbake."""
+        Parametre:
+            city (str): Bykode, f.eks. "oslo".
+            elements (Iterable[str]): Navn fra DERIVED_ELEMENTS.
+
+        Returnerer:
+            int: Antall nye eller endrede avledede rader.
+        """
+        elements = list(elements)
         file_path = os.path.join(
             self.output_dir, f"vaerdata_{city}.csv"
         )
+        derived_path = os.path.join(
+            self.output_dir, DERIVED_TEMPLATE.format(city=city)
+        )
+        state_path = os.path.join(
+            self.output_dir, STATE_TEMPLATE.format(city=city)
+        )
 
         try:
-            df = pd.read_csv(file_path)
+            stat = os.stat(file_path)
         except FileNotFoundError:
             print(f"Fant ikke {file_path} – hopper over.")
-            return
+            return 0
 
-        df_range = self._compute_daily_range(df)
-        df_final = (
-            pd.concat([df, df_range], ignore_index=True)
-            .sort_values(
-                ["referenceTime", "timeOffset", "elementId"]
+        state = self._read_state(state_path)
+        source = [stat.st_mtime_ns, stat.st_size]
+        element_ids = [DERIVED_ELEMENTS[name][0] for name in elements]
+        done = set(state.get("elements", []))
+        if state.get("source") == source and done.issuperset(element_ids):
+            return 0
+
+        fresh = self.compute_derived(
+            self._read_inputs(file_path, elements), elements
+        )
+        stored = self._read_partition(derived_path)
+        changes = _changed_rows(
+            fresh, _latest(stored)[lambda d: d["elementId"].isin(element_ids)]
+        )
+
+        if not changes.empty:
+            changes.to_csv(
+                derived_path,
+                mode="a",
+                index=False,
+                header=not os.path.exists(derived_path),
             )
+            if not stored.empty:
+                stored = pd.concat([stored, changes], ignore_index=True)
+            else:
+                stored = changes
+            live = _latest(stored)
+            if len(stored) > 2 * len(live):
+                self._write_partition(derived_path, live)
+
+        if state.get("source") == source:
+            element_ids = sorted(done.union(element_ids))
+        self._write_state(
+            state_path, {"source": source, "elements": element_ids}
         )
+        print(f"Oppdatert fil: {derived_path} ({len(changes)} endrede rader)")
+        return len(changes)
+
+    @staticmethod
+    def _read_inputs(file_path: str, elements: list[str]) -> pd.DataFrame:
+        """Les kun radene for inngangselementene, bit for bit."""
+        needed = {
+            source
+            for name in elements
+            for source in DERIVED_ELEMENTS[name][2]
+        }
+        chunks = [
+            chunk[chunk["elementId"].isin(needed)]
+            for chunk in pd.read_csv(
+                file_path, usecols=OUTPUT_COLUMNS,
+                dtype={"referenceTime": str}, chunksize=CHUNK_ROWS,
+            )
+        ]
+        if not chunks:
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+
+    @staticmethod
+    def _read_partition(path: str) -> pd.DataFrame:
+        """Les alle rader i den avledede partisjonen, også utdaterte."""
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+        return pd.read_csv(path, dtype={"referenceTime": str})
+
+    @staticmethod
+    def _write_partition(path: str, df: pd.DataFrame) -> None:
+        """Skriv partisjonen på nytt atomisk, kun gyldige rader."""
+        tmp_path = f"{path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def load_derived(self, city: str) -> pd.DataFrame:
+        """
+        Les den avledede partisjonen til en by.
+
+        Parametre:
+            city (str): Bykode, f.eks. "oslo".
+
+        Returnerer:
+            pd.DataFrame: Avledede rader, siste versjon per nøkkel.
+            Nøkler som ikke lenger kan beregnes er utelatt.
+        """
+        path = os.path.join(
+            self.output_dir, DERIVED_TEMPLATE.format(city=city)
+        )
+        return _latest(self._read_partition(path))
+
+    @staticmethod
+    def _read_state(path: str) -> dict:
+        """Les tilstandsfilen, tom ordbok hvis den mangler."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def _write_state(path: str, state: dict) -> None:
+        """Skriv tilstandsfilen atomisk."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def run(
+        self,
+        cities: Iterable[str] | None = None,
+        elements: Iterable[str] = ("range",),
+        max_workers: int = 4,
+    ) -> None:
+        """
+        Kjør beregning av avledede elementer for alle stasjonsfiler.
+
+        Parametre:
+            cities (Iterable[str] | None): Bykoder. Alle byer i
+            stasjonsregisteret hvis None.
+            elements (Iterable[str]): Navn fra DERIVED_ELEMENTS.
+            max_workers (int): Antall filer som behandles samtidig.
+        """
+        cities = self.registry.cities() if cities is None else list(cities)
+        elements = list(elements)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(
+                lambda city: self._process_city(city, elements), cities
+            ))
+
+
+def _degree_days(inputs: dict[str, np.ndarray]) -> np.ndarray:
+    """Fyringsgraddager fra døgnmiddel, eller fra (maks+min)/2."""
+    mean = inputs[MEAN_ELEMENT]
+    midrange = (inputs[MAX_ELEMENT] + inputs[MIN_ELEMENT]) / 2
+    mean = np.where(np.isnan(mean), midrange, mean)
+    return np.maximum(DEGREE_DAY_BASE - mean, 0.0)
+
+
+def _latest(stored: pd.DataFrame) -> pd.DataFrame:
+    """Siste rad per nøkkel, uten nøkler som er fjernet (tom verdi)."""
+    keys = KEY_COLUMNS + ["elementId"]
+    latest = stored.drop_duplicates(keys, keep="last")
+    latest = latest[latest["value"].notna()]
+    return latest.sort_values(keys, kind="stable").reset_index(drop=True)
+
+
+def _changed_rows(fresh: pd.DataFrame, current: pd.DataFrame) -> pd.DataFrame:
+    """
+    Finn radene som må legges til for at partisjonen skal bli lik fresh.
+
+    Parametre:
+        fresh (pd.DataFrame): Nyberegnede rader. Rader uten verdi
+        regnes som ikke beregnbare.
+        current (pd.DataFrame): Gjeldende rader i partisjonen.
+
+    Returnerer:
+        pd.DataFrame: Nye og endrede rader, og rader uten verdi for
+        nøkler som ikke lenger kan beregnes.
+    """
+    keys = KEY_COLUMNS + ["elementId"]
+    fresh = fresh[fresh["value"].notna()].reset_index(drop=True)
+    fresh_keys = fresh[keys].astype(str)
+    current_keys = current[keys].astype(str)
+
+    # Venstre-join bevarer rekkefølgen, og nøklene er unike på begge sider
+    old = fresh_keys.merge(
+        current_keys.assign(old=current["value"].to_numpy(dtype=float)),
+        on=keys, how="left",
+    )["old"].to_numpy()
+    changed = np.isnan(old) | ~np.isclose(
+        fresh["value"].to_numpy(dtype=float), old
+    )
+    gone = current_keys.merge(
+        fresh_keys, on=keys, how="left", indicator=True
+    )["_merge"].to_numpy() == "left_only"
+
+    parts = [fresh[changed], current[gone].assign(value=np.nan)]
+    parts = [part for part in parts if not part.empty] or parts[:1]
+    return pd.concat(parts, ignore_index=True)[OUTPUT_COLUMNS]
 
-        df_final.to_csv(file_path, index=False)
-        print(f"Oppdatert fil: {file_path}")
 
-    def run(self) -> None:
-        """Kjør range-beregning for Oslo og Tromsø."""
-        for city in ["oslo", "tromso"]:
-            self._process_city(city)
+_DERIVE = {
+    "range": lambda i: i[MAX_ELEMENT] - i[MIN_ELEMENT],
+    "midrange": lambda i: (i[MAX_ELEMENT] + i[MIN_ELEMENT]) / 2,
+    "degree_days": _degree_days,
+}
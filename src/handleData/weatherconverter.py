@@ -1,20 +1,57 @@
 """Konverterer værdata fra JSON til to CSV-filer, én per by."""
 
+import importlib.util
 import json
 import os
 import pandas as pd
 import sys
 
-from pandasql import sqldf
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .jsonstream import ObservationColumns, iter_json_array
+    from .queryengine import QueryEngine, shared_engine
+except ImportError:
+    from jsonstream import ObservationColumns, iter_json_array
+    from queryengine import QueryEngine, shared_engine
+
+try:
+    from src.fetchData.rawstore import RAW_COLUMNS, RawObservationStore
+    from src.fetchData.stations import StationRegistry
+except ImportError:
+    sys.path.append(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "fetchData"
+    ))
+    from rawstore import RAW_COLUMNS, RawObservationStore
+    from stations import StationRegistry
+
+# Støttede filformater for byfilene og tilhørende filendelse
+FILE_FORMATS: dict[str, str] = {
+    "csv": ".csv",
+    "csv.gz": ".csv.gz",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+# Formater som krever pyarrow
+ARROW_FORMATS = {"parquet", "feather"}
 
 
 class WeatherConverter:
     """Konverter JSON til df og lagrer CSV per by."""
 
-    def __init__(self, json_path: str, output_dir: str) -> None:
-        """Initialisér converter med sti til JSON og utmappe."""
+    def __init__(
+        self,
+        json_path: str,
+        output_dir: str,
+        registry: StationRegistry | None = None,
+        engine: QueryEngine | None = None,
+    ) -> None:
+        """Initialisér converter med sti til JSON, utmappe og register."""
         self.json_path = json_path
         self.output_dir = output_dir
+        self.registry = registry or StationRegistry()
+        self.engine = engine or shared_engine()
         self.data: dict | None = None
         self.df: pd.DataFrame | None = None
 
@@ -40,55 +77,211 @@ class WeatherConverter:
         return self.data
 
     def convert_to_dataframe(self) -> pd.DataFrame:
-        """Flat ut JSON-data til en df."""
+        """
+        Flat ut JSON-data til en df.
+
+        Observasjonene samles kolonnevis, med kategoriske kolonner for
+        sourceId, elementId, unit og timeOffset.
+        """
         if self.data is None:
             raise RuntimeError("Data ikke lastet – kjør load_data() først")
 
-        entries = self.data.get("data", [])
-        flattened = []
-        for entry in entries:
-            observations = entry.get("observations", [])
-            for obs in observations:
-                flattened.append({
-                    "sourceId": entry["sourceId"],
-                    "referenceTime": entry["referenceTime"],
-                    "timeOffset": obs.get("timeOffset"),
-                    "elementId": obs["elementId"],
-                    "value": obs["value"],
-                    "unit": obs.get("unit", "N/A"),
-                })
-
-        self.df = pd.DataFrame(flattened)
+        columns = ObservationColumns()
+        for entry in self.data.get("data", []):
+            columns.add_entry(entry)
+
+        self.df = columns.to_frame()
+        print("DataFrame opprettet.")
+        return self.df
+
+    def stream_to_dataframe(self, chunk_size: int = 1 << 20) -> pd.DataFrame:
+        """
+        Les JSON-filen inkrementelt og flat den ut til en df.
+
+        Hele filen holdes aldri i minnet som Python-objekter; én oppføring
+        i 'data' leses om gangen og legges rett i kolonnene.
+
+        Parametre:
+            chunk_size (int): Antall tegn som leses fra filen per gang.
+
+        Returnerer:
+            pd.DataFrame: Samme kolonner som convert_to_dataframe.
+
+        Hever:
+            ValueError: Hvis filen er ugyldig, mangler 'data' eller er tom.
+        """
+        columns = ObservationColumns()
+        with open(self.json_path, "r", encoding="utf-8") as f:
+            for entry in iter_json_array(f, "data", chunk_size):
+                columns.add_entry(entry)
+
+        if len(columns) == 0:
+            raise ValueError("JSON-filen mangler 'data' eller er tom")
+
+        self.df = columns.to_frame()
         print("DataFrame opprettet.")
         return self.df
 
+    def load_store(
+        self,
+        store_dir: str,
+        sources: list[str] | None = None,
+        years: list[int] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Les kompakt rålager direkte til df uten JSON-parsing.
+
+        Parametre:
+            store_dir (str): Rotmappe for RawObservationStore.
+            sources (list[str] | None): Stasjoner å lese, alle hvis None.
+            years (list[int] | None): År å lese, alle hvis None.
+
+        Returnerer:
+            pd.DataFrame: Samme kolonner som convert_to_dataframe.
+
+        Hever:
+            FileNotFoundError: Hvis ingen partisjoner passer filteret.
+        """
+        paths = RawObservationStore(store_dir).partitions(sources, years)
+        if not paths:
+            raise FileNotFoundError(
+                f"Fant ingen partisjoner i rålageret: {store_dir}"
+            )
+
+        frames = [
+            pd.read_csv(
+                path,
+                compression="gzip",
+                dtype={col: str for col in RAW_COLUMNS if col != "value"},
+            )
+            for path in paths
+        ]
+        df = pd.concat(frames, ignore_index=True)
+        df["value"] = pd.to_numeric(df["value"], errors="coerce")
+
+        # Sider som er hentet på nytt etter avbrudd gir duplikater
+        df = df.drop_duplicates(
+            subset=["sourceId", "referenceTime", "timeOffset", "elementId"],
+            keep="last",
+        )
+        for col in ("sourceId", "timeOffset", "elementId", "unit"):
+            df[col] = df[col].astype("category")
+        self.df = df.reset_index(drop=True)[RAW_COLUMNS]
+        print("DataFrame lest fra rålager.")
+        return self.df
+
     def run_queries(self) -> None:
         """Kjør en enkel SQL-spørring mot df og skriv resultat."""
         if self.df is None:
             raise RuntimeError(
                 "DataFrame ikke klar – kjør convert_to_dataframe() først")
 
+        self.engine.register(
+            "observations", self.df, indexes=["sourceId", "elementId"]
+        )
         query = (
             "SELECT sourceId, COUNT(*) AS num_entries "
-            "FROM df GROUP BY sourceId"
+            "FROM observations GROUP BY sourceId"
         )
-        result = sqldf(query, {"df": self.df})
+        result = self.engine.query(query)
         print(result)
 
-    def save_city_data(self) -> None:
-        """Lagre CSV for hver by basert på sourceId."""
+    def save_city_data(
+        self,
+        file_format: str = "csv",
+        *,
+        partition_by_year: bool = False,
+        max_workers: int = 4,
+    ) -> list[str]:
+        """
+        Lagre data for hver by basert på sourceId.
+
+        df grupperes på sourceId én gang, og partisjonene skrives
+        parallelt. Med partition_by_year skrives én fil per år i mappen
+        'vaerdata_<by>/', slik at lesere kan hente kun årene de trenger.
+
+        Parametre:
+            file_format (str): 'csv', 'csv.gz', 'parquet' eller 'feather'.
+            partition_by_year (bool): Skriv én fil per by og år.
+            max_workers (int): Antall tråder som skriver samtidig.
+
+        Returnerer:
+            list[str]: Filstiene som ble skrevet.
+
+        Hever:
+            RuntimeError: Hvis df ikke er klar.
+            ValueError: Ved ukjent filformat.
+            ImportError: Hvis formatet krever pyarrow og det mangler.
+        """
         if self.df is None:
             raise RuntimeError(
                 "DataFrame ikke klar – kjør convert_to_dataframe() først")
+        if file_format not in FILE_FORMATS:
+            raise ValueError(
+                "file_format må være en av: " + ", ".join(FILE_FORMATS)
+            )
+        if file_format in ARROW_FORMATS and not importlib.util.find_spec(
+            "pyarrow"
+        ):
+            raise ImportError(
+                f"file_format={file_format!r} krever pyarrow "
+                "(pip install pyarrow)"
+            )
 
         os.makedirs(self.output_dir, exist_ok=True)
 
-        # Definer by og tilhørende sourceId
-        cities = {"tromso": "SN90450:0", "oslo": "SN18700:0"}
+        # By og tilhørende sourceId hentes fra stasjonsregisteret
+        cities = {
+            self.registry.sensor_id(city): city
+            for city in self.registry.cities()
+        }
+        groups = {
+            source_id: df_city
+            for source_id, df_city in self.df.groupby(
+                "sourceId", sort=False, observed=True
+            )
+        }
 
-        for city, source_id in cities.items():
-            df_city = self.df[self.df["sourceId"] == source_id]
-            filename = f"vaerdata_{city}.csv"
-            path = os.path.join(self.output_dir, filename)
-            df_city.to_csv(path, index=False)
+        tasks: list[tuple[pd.DataFrame, str]] = []
+        for source_id, city in cities.items():
+            df_city = groups.get(source_id, self.df.iloc[0:0])
+            suffix = FILE_FORMATS[file_format]
+            if partition_by_year:
+                path = os.path.join(self.output_dir, f"vaerdata_{city}")
+                os.makedirs(path, exist_ok=True)
+                for year, df_year in df_city.groupby(
+                    self._years(df_city), sort=True
+                ):
+                    tasks.append(
+                        (df_year, os.path.join(path, f"{year}{suffix}"))
+                    )
+            else:
+                path = os.path.join(
+                    self.output_dir, f"vaerdata_{city}{suffix}"
+                )
+                tasks.append((df_city, path))
             print(f"Lagrer data for {city.capitalize()} til: {path}")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(
+                lambda task: self._write_frame(*task, file_format), tasks
+            ))
+        return [path for _, path in tasks]
+
+    @staticmethod
+    def _years(df: pd.DataFrame) -> pd.Series:
+        """Finn år for hver rad fra referenceTime."""
+        ref = df["referenceTime"]
+        if pd.api.types.is_datetime64_any_dtype(ref):
+            return ref.dt.year
+        return ref.astype(str).str[:4].astype(int)
+
+    @staticmethod
+    def _write_frame(df: pd.DataFrame, path: str, file_format: str) -> None:
+        """Skriv én partisjon i valgt format."""
+        if file_format == "parquet":
+            df.to_parquet(path, index=False)
+        elif file_format == "feather":
+            df.reset_index(drop=True).to_feather(path)
+        else:
+            df.to_csv(path, index=False)
@@ -1,9 +1,19 @@
 """Interpolering av værdata."""
 
+import os
 import pandas as pd
+import sys
 
 from statsmodels.tsa.seasonal import seasonal_decompose
 
+try:
+    from src.fetchData.stations import StationRegistry
+except ImportError:
+    sys.path.append(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "fetchData"
+    ))
+    from stations import StationRegistry
+
 
 class WeatherDataPipeline:
     """
@@ -19,20 +29,20 @@ class WeatherDataPipeline:
         small_gap_days: int = 3,
         seasonal_period: int = 365,
         model: str = "additive",
+        registry: StationRegistry | None = None,
     ) -> None:
         """Initialisér pipelinen."""
         self.small_gap_days = small_gap_days
         self.seasonal_period = seasonal_period
         self.model = model
+        self.registry = registry or StationRegistry()
 
     def _infer_source_id(self, path: str) -> str:
-        """Utled sourceId fra filsti basert på bynavn."""
-        p = path.lower()
-        if "oslo" in p:
-            return "SN18700:0"
-        if "troms" in p:
-            return "SN90450:0"
-        raise ValueError(f"Kunne ikke utlede sourceId fra '{path}'")
+        """Utled sourceId fra filsti basert på bynavn i registeret."""
+        city = self.registry.infer_city(path)
+        if city is None:
+            raise ValueError(f"Kunne ikke utlede sourceId fra '{path}'")
+        return self.registry.sensor_id(city)
 
     def _format_time_offset(self, dt: pd.Timestamp) -> str:
         """Formatér tidsdifferanse fra midnatt som ISO 8601-periode."""
@@ -2,14 +2,27 @@
 
 import os
 import pandas as pd
+import sys
 
-from pandasql import sqldf
+try:
+    from src.handleData.queryengine import QueryEngine, shared_engine
+except ImportError:
+    sys.path.append(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "handleData"
+    ))
+    from queryengine import QueryEngine, shared_engine
 
 
 class MissingWeatherDataAnalyzer:
     """Analyserer og finner manglende værdata i Oslo og Tromsø."""
 
-    def __init__(self, oslo_path: str, tromso_path: str, output_dir: str):
+    def __init__(
+        self,
+        oslo_path: str,
+        tromso_path: str,
+        output_dir: str,
+        engine: QueryEngine | None = None,
+    ):
         """
         Setter opp filbaner for Oslo- og Tromsø-data.
 
@@ -17,10 +30,13 @@ class MissingWeatherDataAnalyzer:
             oslo_path (str): Sti til CSV med Oslo-data.
             tromso_path (str): Sti til CSV med Tromsø-data.
             output_dir (str): Målmappe for utdata.
+            engine (QueryEngine | None): Delt SQL-lag. Bruker prosessens
+            felles instans hvis None.
         """
         self.oslo_path = oslo_path
         self.tromso_path = tromso_path
         self.output_dir = output_dir
+        self.engine = engine or shared_engine()
 
     def load_data(self):
         """Laster inn værdata fra CSV-filer og ekstraherer dato."""
@@ -85,7 +101,10 @@ class MissingWeatherDataAnalyzer:
         GROUP BY city, elementId
         ORDER BY city, num_missing DESC
         """
-        missing_grouped = sqldf(query, {"df_missing": self.df_missing})
+        self.engine.register(
+            "df_missing", self.df_missing, indexes=["city", "elementId"]
+        )
+        missing_grouped = self.engine.query(query)
         missing_grouped.to_csv(summary_path, index=False, encoding="utf-8")
 
         # Gi brukeren beskjed når alt er lagret
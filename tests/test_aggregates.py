@@ -0,0 +1,208 @@
+"""Tester aggregates.py og minnebegrenset modus i analyseklassene."""
+
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+sys.path.append("src/analyseData")
+
+from monthlystats import MonthlyStats
+from outlieranalysis import OutlierAnalysis
+from yearlystats import YearlyStats
+from src.analyseData.aggregates import (
+    NAT_KEY, GroupedAggregate, PartialAggregate, QuantileSketch,
+    calendar_keys, period_keys, period_label,
+)
+
+
+class TestAggregates(unittest.TestCase):
+    """Test flettbare delaggregater."""
+
+    def setUp(self):
+        """Lag tilfeldige verdier."""
+        self.values = np.random.default_rng(1).normal(5.0, 2.0, 5000)
+
+    def test_sketch_exact_for_small_input(self):
+        """Sjekk at kvantilene er eksakte for få verdier."""
+        sketch = QuantileSketch(k=64)
+        sketch.update(self.values[:50])
+        for q in (0.1, 0.25, 0.5, 0.9):
+            self.assertAlmostEqual(
+                sketch.quantile(q), np.quantile(self.values[:50], q)
+            )
+
+    def test_sketch_approximates_large_input(self):
+        """Sjekk at kvantilene er nære for mange verdier i biter."""
+        sketch = QuantileSketch(k=128)
+        for chunk in np.array_split(self.values, 17):
+            sketch.update(chunk)
+        self.assertEqual(sketch.count, self.values.size)
+        self.assertLess(sum(level.size for level in sketch.levels), 1500)
+        for q in (0.25, 0.5, 0.75):
+            self.assertAlmostEqual(
+                sketch.quantile(q), np.quantile(self.values, q), delta=0.2
+            )
+
+    def test_merge_matches_single_pass(self):
+        """Sjekk at flettede biter gir samme snitt og varians."""
+        whole = PartialAggregate()
+        whole.update(self.values)
+        merged = PartialAggregate()
+        for chunk in np.array_split(self.values, 7):
+            part = PartialAggregate()
+            part.update(chunk)
+            merged.merge(part)
+
+        self.assertEqual(merged.count, whole.count)
+        self.assertAlmostEqual(merged.mean, self.values.mean())
+        self.assertAlmostEqual(merged.sum, self.values.sum(), places=6)
+        self.assertAlmostEqual(merged.std(ddof=1), self.values.std(ddof=1))
+        self.assertAlmostEqual(merged.std(ddof=0), self.values.std())
+        self.assertEqual(merged.min, self.values.min())
+        self.assertEqual(merged.max, self.values.max())
+
+    def test_nan_counted_in_rows_only(self):
+        """Sjekk at NaN telles som rad, men ikke i statistikken."""
+        part = PartialAggregate()
+        part.update(np.array([1.0, np.nan, 3.0]))
+        self.assertEqual(part.rows, 3)
+        self.assertEqual(part.count, 2)
+        self.assertEqual(part.statistic("mean"), 2.0)
+        self.assertTrue(np.isnan(PartialAggregate().statistic("mean")))
+        with self.assertRaises(ValueError):
+            part.statistic("mode")
+
+    def test_grouped_update(self):
+        """Sjekk gruppering på år-måned over flere biter."""
+        times = pd.date_range("2021-01-30", periods=4, freq="D", tz="UTC")
+        grouped = GroupedAggregate()
+        grouped.update(period_keys(times[:3]), np.array([1.0, 2.0, 3.0]))
+        grouped.update(period_keys(times[3:]), np.array([5.0]))
+        result = {
+            period_label(p): part.mean for p, part in grouped.items()
+        }
+        self.assertEqual(result, {"2021-01": 1.5, "2021-02": 4.0})
+
+    def test_calendar_keys(self):
+        """Sjekk kalendernøklene mot pandas, også før 1970 og for NaT."""
+        times = pd.DatetimeIndex([
+            "1969-12-31T23:00", "2020-02-29T12:00", None,
+            "2021-12-31T23:59",
+        ], tz="UTC")
+        keys = calendar_keys(times)
+        valid = times.notna()
+        self.assertListEqual(list(keys.year[valid]), list(times.year[valid]))
+        self.assertListEqual(list(keys.month[valid]),
+                             list(times.month[valid]))
+        self.assertListEqual(list(keys.day_of_year[valid]),
+                             list(times.dayofyear[valid]))
+        self.assertListEqual(
+            [period_label(p) for p in keys.period[valid]],
+            ["1969-12", "2020-02", "2021-12"],
+        )
+        self.assertTrue(all(column[2] == NAT_KEY for column in keys))
+        local = times[valid].tz_convert("Europe/Oslo")
+        self.assertListEqual(list(calendar_keys(local).year),
+                             [1969, 2020, 2021])
+
+
+class TestChunkedAnalysis(unittest.TestCase):
+    """Sammenlign minnebegrenset modus med innlasting i minnet."""
+
+    def setUp(self):
+        """Skriv en CSV med to elementer, hull og ekstreme verdier."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmpdir.name
+        times = pd.date_range("2020-01-01", "2021-12-31", freq="D", tz="UTC")
+        values = np.random.default_rng(7).normal(0.0, 3.0, len(times))
+        values[::50] = 40.0
+        values = values.round(3).astype(object)
+        values[5] = ""
+        df = pd.DataFrame({
+            "referenceTime": times.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "elementId": "e",
+            "timeOffset": "PT6H",
+            "value": values,
+        })
+        other = df.assign(elementId="f", timeOffset="PT0H", value="1.0")
+        path = os.path.join(
+            self.data_dir, MonthlyStats.filename_template.format(city="c")
+        )
+        pd.concat([df, other]).to_csv(path, index=False)
+
+    def tearDown(self):
+        """Fjern den midlertidige katalogen."""
+        self.tmpdir.cleanup()
+
+    def test_monthly_stats(self):
+        """Sjekk MonthlyStats i biter mot innlasting i minnet."""
+        full = MonthlyStats(self.data_dir)
+        chunked = MonthlyStats(self.data_dir, chunk_rows=7)
+        self.assertEqual(chunked._get_min_offset("c", "e"), "PT6H")
+        pd.testing.assert_frame_equal(
+            chunked.compute_all_months("e", "c"),
+            full.compute_all_months("e", "c"),
+        )
+        expected = full.compute_single_month("2021-03", "e", "c")
+        result = chunked.compute_single_month("2021-03", "e", "c")
+        for key, value in expected.items():
+            self.assertAlmostEqual(result[key], value)
+        with self.assertRaises(ValueError):
+            chunked.compute_single_month("2019-01", "e", "c")
+
+    def test_yearly_stats(self):
+        """Sjekk YearlyStats i biter mot innlasting i minnet."""
+        full = YearlyStats(self.data_dir)
+        chunked = YearlyStats(self.data_dir, chunk_rows=7)
+        for aggregate in ("mean", "sum", "median", "std"):
+            pd.testing.assert_frame_equal(
+                chunked.compute_yearly("c", "e", aggregate=aggregate),
+                full.compute_yearly("c", "e", aggregate=aggregate),
+                check_dtype=False,
+            )
+        pd.testing.assert_frame_equal(
+            chunked.compute_yearly("c", "e", year=2021),
+            full.compute_yearly("c", "e", year=2021),
+            check_dtype=False,
+        )
+        for remove_outliers in (False, True):
+            pd.testing.assert_frame_equal(
+                chunked.climatological_monthly_mean(
+                    "c", "e", remove_outliers=remove_outliers,
+                    statistic="std",
+                ),
+                full.climatological_monthly_mean(
+                    "c", "e", remove_outliers=remove_outliers,
+                    statistic="std",
+                ),
+                check_dtype=False,
+            )
+
+    def test_outlier_analysis(self):
+        """Sjekk OutlierAnalysis i biter mot innlasting i minnet."""
+        full = OutlierAnalysis(self.data_dir)
+        chunked = OutlierAnalysis(self.data_dir, chunk_rows=7)
+        pd.testing.assert_frame_equal(
+            chunked.find_outliers_per_month(
+                "c", "e", include_empty_months=True
+            ),
+            full.find_outliers_per_month("c", "e", include_empty_months=True),
+            check_dtype=False,
+        )
+        for statistic in ("mean", "median", "std"):
+            pd.testing.assert_frame_equal(
+                chunked.stats_with_without_outliers(
+                    "c", "e", statistic=statistic
+                ),
+                full.stats_with_without_outliers(
+                    "c", "e", statistic=statistic
+                ),
+                check_dtype=False,
+            )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,10 +5,21 @@ import tempfile
 import unittest
 
 from datetime import timezone
+from unittest.mock import patch
 
 from src.analyseData.basedata import DataLoader
 
 
+class CountingLoader(DataLoader):
+    """DataLoader med en enkel analysemetode for batch-testene."""
+
+    def count_values(self, city, element_id):
+        """Tell verdier for et element."""
+        offset = self._get_min_offset(city, element_id)
+        series = self._series(city, element_id, offset)
+        return {"count": int(series.count()), "pid": os.getpid()}
+
+
 class TestDataLoader(unittest.TestCase):
     """Test DataLoader."""
 
@@ -102,6 +113,219 @@ class TestDataLoader(unittest.TestCase):
             loader._get_min_offset('cityC', 'e')
         self.assertIn('Fant ingen gyldige PT', str(cm.exception))
 
+    def test_load_merges_derived_partition(self):
+        """Sjekk at avledede elementer fra egen partisjon tas med."""
+        df = pd.DataFrame({
+            'sourceId': ['S1'],
+            'referenceTime': ['2021-01-01T00:00:00Z'],
+            'timeOffset': ['PT0H'],
+            'elementId': ['max(air_temperature P1D)'],
+            'value': [5.0],
+            'unit': ['degC'],
+        })
+        self._write_csv('cityD', df)
+        derived = df.assign(elementId='range(air_temperature P1D)')
+        derived = pd.concat([derived, derived.assign(value=3.0)])
+        derived.to_csv(os.path.join(
+            self.data_dir, DataLoader.derived_template.format(city='cityD')
+        ), index=False)
+
+        loaded = DataLoader(self.data_dir)._load_city('cityD')
+        self.assertEqual(len(loaded), 2)
+        ranges = loaded[loaded['elementId'] == 'range(air_temperature P1D)']
+        self.assertEqual(ranges['value'].tolist(), [3.0])
+
+    def test_load_prefers_main_file_for_derived_elements(self):
+        """Sjekk at load ikke dobler elementer hovedfilen allerede har."""
+        df = pd.DataFrame({
+            'sourceId': ['S1', 'S1'],
+            'referenceTime': ['2021-01-01T00:00:00Z', '2021-01-02T00:00:00Z'],
+            'timeOffset': ['PT0H', 'PT0H'],
+            'elementId': ['range(air_temperature P1D)'] * 2,
+            'value': [4.0, 5.0],
+            'unit': ['degC', 'degC'],
+        })
+        self._write_csv('cityE', df)
+        df.iloc[1:].assign(value=9.0).to_csv(os.path.join(
+            self.data_dir, DataLoader.derived_template.format(city='cityE')
+        ), index=False)
+
+        loader = DataLoader(self.data_dir)
+        for kwargs in ({}, {'start': '2021-01-02'}):
+            loaded = loader.load(
+                'cityE', elements=['range(air_temperature P1D)'], **kwargs
+            )
+            self.assertNotIn(9.0, loaded['value'].tolist())
+        self.assertEqual(loader.load('cityE')['value'].tolist(), [4.0, 5.0])
+        self.assertEqual(
+            loader._load_city('cityE')['value'].tolist(), [4.0, 5.0]
+        )
+
+    def test_narrow_load_reuses_derived_and_elements(self):
+        """Sjekk at gjentatte spørringer ikke tolker filene på nytt."""
+        df = pd.DataFrame({
+            'sourceId': ['S1'] * 3,
+            'referenceTime': ['2021-01-01T00:00:00Z', '2021-01-02T00:00:00Z',
+                              '2021-01-03T00:00:00Z'],
+            'timeOffset': ['PT0H'] * 3,
+            'elementId': ['max(air_temperature P1D)'] * 3,
+            'value': [5.0, 6.0, 7.0],
+        })
+        self._write_csv('cityF', df)
+        derived = df.assign(elementId='range(air_temperature P1D)')
+        pd.concat([derived, derived.iloc[1:2].assign(value=9.0)]).to_csv(
+            os.path.join(self.data_dir,
+                         DataLoader.derived_template.format(city='cityF')),
+            index=False,
+        )
+
+        query = dict(elements=['range(air_temperature P1D)'],
+                     start='2021-01-02', columns=['value'])
+        for disk_cache in (True, False):
+            loader = DataLoader(self.data_dir, disk_cache=disk_cache)
+            self.assertEqual(
+                sorted(loader.load('cityF', **query)['value']), [7.0, 9.0]
+            )
+        loader = DataLoader(self.data_dir)
+        with patch.object(DataLoader, '_scan', autospec=True,
+                          side_effect=DataLoader._scan) as scan, \
+                patch.object(pd, 'read_csv', side_effect=AssertionError):
+            self.assertEqual(
+                sorted(loader.load('cityF', **query)['value']), [7.0, 9.0]
+            )
+        # Kun selve spørringen mot hovedfilen, ikke et elementsøk
+        self.assertEqual(scan.call_count, 1)
+
+    def _frame(self, times, value=1.0):
+        """Lag en liten df med gitte tidspunkter."""
+        return pd.DataFrame({
+            'referenceTime': times,
+            'elementId': ['e'] * len(times),
+            'timeOffset': ['PT0H'] * len(times),
+            'value': [value] * len(times),
+        })
+
+    def test_falls_back_to_raw_file(self):
+        """Sjekk at rådata brukes når imputert fil mangler."""
+        self._frame(['2021-01-01T00:00:00Z']).to_csv(
+            os.path.join(self.data_dir, 'vaerdata_raw.csv'), index=False)
+        loaded = DataLoader(self.data_dir)._load_city('raw')
+        self.assertEqual(len(loaded), 1)
+
+    def test_imputed_file_is_preferred(self):
+        """Sjekk at imputert fil vinner over rådata."""
+        self._frame(['2021-01-01T00:00:00Z'], 1.0).to_csv(
+            os.path.join(self.data_dir, 'vaerdata_both.csv'), index=False)
+        self._write_csv('both', self._frame(['2021-01-01T00:00:00Z'], 2.0))
+        loaded = DataLoader(self.data_dir)._load_city('both')
+        self.assertEqual(loaded['value'].tolist(), [2.0])
+
+    def test_year_partitions_read_only_requested_years(self):
+        """Sjekk at kun partisjonene for valgte år leses."""
+        folder = os.path.join(self.data_dir, 'vaerdata_part')
+        os.makedirs(folder)
+        for year in (2019, 2020, 2021):
+            self._frame([f'{year}-06-01T00:00:00Z']).to_csv(
+                os.path.join(folder, f'{year}.csv'), index=False)
+
+        loader = DataLoader(self.data_dir)
+        self.assertEqual(
+            [os.path.basename(p)
+             for p in loader._resolve_sources('part', [2020])],
+            ['2020.csv'])
+        loaded = loader._load_city('part', years=[2020])
+        self.assertEqual(loaded['referenceTime'].dt.year.tolist(), [2020])
+        self.assertEqual(len(loader._load_city('part')), 3)
+
+    def test_stale_disk_cache_is_last_resort(self):
+        """Sjekk at kolonnebufferen brukes når kildefilen er borte."""
+        path = self._write_csv('gone', self._frame(['2021-01-01T00:00:00Z']))
+        DataLoader(self.data_dir)._load_city('gone')
+        os.remove(path)
+        loaded = DataLoader(self.data_dir)._load_city('gone')
+        self.assertEqual(len(loaded), 1)
+
+    def _write_two_years(self, city):
+        """Skriv en by-fil med to elementer over to år."""
+        times = pd.date_range('2020-12-25', '2021-01-05', freq='D',
+                              tz='UTC').strftime('%Y-%m-%dT%H:%M:%SZ')
+        n = len(times)
+        df = pd.DataFrame({
+            'sourceId': ['S1'] * 2 * n,
+            'referenceTime': list(times) * 2,
+            'elementId': ['e'] * n + ['f'] * n,
+            'timeOffset': ['PT0H'] * 2 * n,
+            'value': list(range(2 * n)),
+            'unit': ['degC'] * 2 * n,
+        })
+        self._write_csv(city, df)
+        return df
+
+    def test_load_pushes_down_filters(self):
+        """Sjekk at load kun gir treff, med og uten kolonnebuffer."""
+        self._write_two_years('push')
+        for disk_cache in (True, False):
+            loader = DataLoader(self.data_dir, disk_cache=disk_cache)
+            out = loader.load('push', elements=['f'], start='2021-01-01',
+                              end='2021-01-03', columns=['value'])
+            self.assertEqual(list(out.columns), ['value'])
+            self.assertEqual(out['value'].tolist(), [19, 20, 21])
+
+    def test_load_without_filters_matches_load_city(self):
+        """Sjekk at load uten filter gir samme data som _load_city."""
+        self._write_two_years('all')
+        loader = DataLoader(self.data_dir)
+        out = loader.load('all')
+        full = loader._load_city('all')
+        self.assertEqual(len(out), len(full))
+        self.assertEqual(set(out.columns), set(full.columns))
+
+    def test_load_skips_partitions_outside_range(self):
+        """Sjekk at årspartisjoner utenfor tidsrommet ikke åpnes."""
+        folder = os.path.join(self.data_dir, 'vaerdata_years')
+        os.makedirs(folder)
+        for year in (2019, 2020, 2021):
+            self._frame([f'{year}-06-01T00:00:00Z']).to_csv(
+                os.path.join(folder, f'{year}.csv'), index=False)
+
+        loader = DataLoader(self.data_dir)
+        opened = []
+        scan = loader._scan
+        loader._scan = lambda path, *a: opened.append(path) or scan(path, *a)
+        out = loader.load('years', start='2020-01-01')
+        self.assertEqual([os.path.basename(p) for p in opened],
+                         ['2020.csv', '2021.csv'])
+        self.assertEqual(len(out), 2)
+
+    def test_batch_over_cities_and_elements(self):
+        """Sjekk batch i prosesspool mot kjøring i denne prosessen."""
+        for city, n in (('a', 2), ('b', 3)):
+            self._write_csv(city, pd.DataFrame({
+                'referenceTime': ['2021-01-01T00:00:00Z'] * n,
+                'elementId': ['e'] * n,
+                'timeOffset': ['PT0H'] * n,
+                'value': ['1'] * n,
+            }))
+        loader = CountingLoader(self.data_dir)
+        pooled = loader.batch(
+            'count_values', ['a', 'b'], ['e', 'missing'], max_workers=2
+        )
+        inline = loader.batch(
+            'count_values', ['a', 'b'], ['e', 'missing'], max_workers=1
+        )
+        self.assertEqual(list(pooled.columns[:2]), ['city', 'element_id'])
+        self.assertEqual(list(pooled['city']), ['a', 'b'])
+        self.assertEqual(list(pooled['count']), [2, 3])
+        self.assertNotIn(os.getpid(), list(pooled['pid']))
+        pd.testing.assert_frame_equal(
+            pooled.drop(columns='pid'), inline.drop(columns='pid')
+        )
+        with self.assertRaises(ValueError):
+            loader.batch('count_values', ['a'], ['missing'],
+                         skip_missing=False)
+        with self.assertRaises(ValueError):
+            loader.batch('_load_city', ['a'], ['e'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,118 @@
+"""Tester columncache.py."""
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import unittest
+
+from pandas.testing import assert_frame_equal
+from unittest.mock import patch
+
+from src.analyseData.basedata import DataLoader
+from src.analyseData.columncache import ColumnarCache
+from src.analyseData.datasetcache import DatasetCache
+
+
+class TestColumnarCache(unittest.TestCase):
+    """Test ColumnarCache."""
+
+    def setUp(self):
+        """Lag en midlertidig katalog med en kildefil."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmpdir.name
+        self.source = os.path.join(self.data_dir, 'vaerdata_x.csv')
+        with open(self.source, 'w', encoding='utf-8') as f:
+            f.write('innhold')
+        self.cache = ColumnarCache(os.path.join(self.data_dir, '.cache'))
+
+    def tearDown(self):
+        """Fjern den midlertidige katalogen."""
+        self.tmpdir.cleanup()
+
+    def test_round_trip_keeps_types(self):
+        """Sjekk at tid, kategorier, tekst og tall leses tilbake likt."""
+        df = pd.DataFrame({
+            'referenceTime': pd.to_datetime(
+                ['2021-01-01T00:00:00Z', None, '2021-01-02T06:00:00Z'],
+                utc=True),
+            'elementId': pd.Categorical(['a', 'b', None]),
+            'note': ['x', np.nan, 'y'],
+            'value': [1.5, np.nan, -2.0],
+            'timeOffset': [0, 6, 12],
+        })
+        self.cache.store([self.source], df)
+        loaded = self.cache.load([self.source])
+        assert_frame_equal(loaded, df)
+
+    def test_categories_without_rows(self):
+        """Sjekk at kategorilisten kun har verdier som finnes."""
+        df = pd.DataFrame({
+            'elementId': pd.Categorical(['a', 'a'], categories=['a', 'b']),
+            'value': [1.0, 2.0],
+        })
+        self.cache.store([self.source], df)
+        self.assertEqual(
+            self.cache.categories([self.source], 'elementId'), ['a']
+        )
+        self.assertIsNone(self.cache.categories([self.source], 'value'))
+
+    def test_changed_source_is_a_miss(self):
+        """Sjekk at bufferen blir ugyldig når kildefilen endres."""
+        df = pd.DataFrame({'value': [1.0]})
+        self.cache.store([self.source], df)
+        with open(self.source, 'a', encoding='utf-8') as f:
+            f.write(' mer')
+        self.assertIsNone(self.cache.load([self.source]))
+
+    def test_missing_cache_is_a_miss(self):
+        """Sjekk at manglende buffer gir None."""
+        self.assertIsNone(self.cache.load([self.source]))
+
+    def test_dataloader_reuses_disk_cache(self):
+        """Sjekk at ny DataLoader leser bufferen uten å tolke CSV."""
+        pd.DataFrame({
+            'sourceId': ['S1', 'S1'],
+            'referenceTime': ['2021-01-01T00:00:00Z',
+                              '2021-01-02T00:00:00Z'],
+            'elementId': ['e', 'e'],
+            'timeOffset': ['PT0H', 'PT6H'],
+            'value': [1.0, 2.0],
+            'unit': ['degC', 'degC'],
+        }).to_csv(os.path.join(
+            self.data_dir, DataLoader.filename_template.format(city='x')
+        ), index=False)
+
+        first = DataLoader(self.data_dir, DatasetCache())._load_city('x')
+        with patch('pandas.read_csv', side_effect=AssertionError):
+            second = DataLoader(self.data_dir, DatasetCache())._load_city('x')
+        assert_frame_equal(first, second)
+        self.assertIsInstance(second['elementId'].dtype, pd.CategoricalDtype)
+        self.assertEqual(DataLoader(self.data_dir)._get_min_offset('x', 'e'),
+                         'PT0H')
+
+    def test_scan_skips_row_groups_and_columns(self):
+        """Sjekk at scan bruker radgruppestatistikk og kolonnevalg."""
+        df = pd.DataFrame({
+            'referenceTime': pd.date_range('2021-01-01', periods=10,
+                                           freq='D', tz='UTC'),
+            'elementId': pd.Categorical(['e', 'f'] * 5),
+            'value': np.arange(10, dtype=float),
+        })
+        with patch('src.analyseData.columncache.ROW_GROUP_SIZE', 4):
+            self.cache.store([self.source], df)
+
+        out = self.cache.scan(
+            [self.source], elements=['e'],
+            start=pd.Timestamp('2021-01-05', tz='UTC'),
+            end=pd.Timestamp('2021-01-07', tz='UTC'), columns=['value'])
+        self.assertEqual(out['value'].tolist(), [4.0, 6.0])
+        self.assertEqual(list(out.columns), ['value'])
+
+        # Tidsrom utenfor alle radgrupper gir tomt svar
+        out = self.cache.scan([self.source],
+                              start=pd.Timestamp('2022-01-01', tz='UTC'))
+        self.assertTrue(out.empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
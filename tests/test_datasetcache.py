@@ -0,0 +1,96 @@
+"""Tester datasetcache.py."""
+import os
+import pandas as pd
+import tempfile
+import unittest
+
+from src.analyseData.basedata import DataLoader
+from src.analyseData.datasetcache import DatasetCache
+
+
+class TestDatasetCache(unittest.TestCase):
+    """Test DatasetCache."""
+
+    def setUp(self):
+        """Lag en midlertidig katalog og en tom buffer."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmpdir.name
+        self.cache = DatasetCache()
+
+    def tearDown(self):
+        """Fjern den midlertidige katalogen."""
+        self.tmpdir.cleanup()
+
+    def _write(self, name, values):
+        """Skriv en liten CSV og returner stien."""
+        path = os.path.join(self.data_dir, name)
+        pd.DataFrame({
+            'referenceTime': ['2021-01-01T00:00:00Z'] * len(values),
+            'elementId': ['e'] * len(values),
+            'timeOffset': ['PT0H'] * len(values),
+            'value': values,
+        }).to_csv(path, index=False)
+        return path
+
+    def test_hit_returns_same_frame(self):
+        """Sjekk at samme fil kun lastes én gang."""
+        path = self._write('a.csv', [1.0])
+        calls = []
+
+        def load():
+            calls.append(1)
+            return pd.read_csv(path)
+
+        first = self.cache.get([path], load)
+        second = self.cache.get([path], load)
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_changed_file_is_reloaded(self):
+        """Sjekk at endret fil lastes på nytt og gammel versjon fjernes."""
+        path = self._write('a.csv', [1.0])
+        self.cache.get([path], lambda: pd.read_csv(path))
+        self._write('a.csv', [1.0, 2.0])
+
+        df = self.cache.get([path], lambda: pd.read_csv(path))
+        self.assertEqual(len(df), 2)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_lru_eviction_respects_budget(self):
+        """Sjekk at minst brukte df kastes når budsjettet overskrides."""
+        paths = [self._write(f'{i}.csv', [float(i)] * 100) for i in range(3)]
+        size = int(pd.read_csv(paths[0]).memory_usage(deep=True).sum())
+        cache = DatasetCache(max_bytes=2 * size)
+
+        for path in paths[:2]:
+            cache.get([path], lambda p=path: pd.read_csv(p))
+        # Bruk første igjen, så andre blir minst brukt
+        cache.get([paths[0]], lambda: pd.read_csv(paths[0]))
+        cache.get([paths[2]], lambda: pd.read_csv(paths[2]))
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats['evictions'], 1)
+        self.assertLessEqual(cache.nbytes, cache.max_bytes)
+        cache.get([paths[0]], lambda: pd.read_csv(paths[0]))
+        self.assertEqual(cache.stats['hits'], 2)
+
+    def test_invalidate(self):
+        """Sjekk at invalidate fjerner oppføringer for en fil."""
+        path = self._write('a.csv', [1.0])
+        self.cache.get([path], lambda: pd.read_csv(path))
+        self.cache.invalidate([path])
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.nbytes, 0)
+
+    def test_loaders_share_cache(self):
+        """Sjekk at to DataLoader-er mot samme mappe deler data."""
+        self._write(DataLoader.filename_template.format(city='x'), [1.0])
+        first = DataLoader(self.data_dir, self.cache)._load_city('x')
+        second = DataLoader(self.data_dir, self.cache)._load_city('x')
+        self.assertIs(first, second)
+        self.assertEqual(self.cache.stats['misses'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
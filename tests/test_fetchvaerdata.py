@@ -3,12 +3,82 @@
 import json
 import os
 import tempfile
+import threading
+import time
 import unittest
 
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
+from urllib.parse import parse_qs, urlparse
 from requests.exceptions import HTTPError
 
 from src.fetchData.fetchvaerdata import WeatherFetcher
+from src.fetchData.rawstore import RawObservationStore
+from src.fetchData.stations import StationRegistry
+
+
+class FrostStub(BaseHTTPRequestHandler):
+    """Lokal stand-in for Frost API som deler svaret i sider."""
+
+    pages: list[list[dict]] = []
+    requests_seen: list[str] = []
+    fail_first: int = 0
+    delay: float = 0.0
+    active: int = 0
+    max_active: int = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        """Svar med siden angitt av 'offset', med nextLink til neste."""
+        cls = type(self)
+        with cls.lock:
+            cls.requests_seen.append(self.path)
+            if cls.fail_first > 0:
+                cls.fail_first -= 1
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        time.sleep(cls.delay)
+
+        query = parse_qs(urlparse(self.path).query)
+        if "referencetime" in query:
+            # Ett datapunkt per stasjon og vindu
+            window_start = query["referencetime"][0].split("/")[0]
+            body = {"data": [{
+                "sourceId": f"{query['sources'][0]}:0",
+                "referenceTime": window_start,
+                "observations": [{"elementId": "e", "value": 1}],
+            }]}
+        else:
+            offset = int(query.get("offset", ["0"])[0])
+            body = {"data": cls.pages[offset]}
+            if offset + 1 < len(cls.pages):
+                body["nextLink"] = (
+                    f"/observations/v0.jsonld?offset={offset + 1}"
+                )
+        with cls.lock:
+            cls.active -= 1
+
+        etag = f'"{len(cls.pages)}-{self.path}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        """Skru av logging til stderr."""
 
 
 class TestWeatherFetcher(unittest.TestCase):
@@ -19,11 +89,14 @@ class TestWeatherFetcher(unittest.TestCase):
         self.client_id = "test_id"
         self.fetcher = WeatherFetcher(self.client_id)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_fetch_weather_data_success(self, mock_get):
         """Test at værdata hentes korrekt fra Frost-API."""
         expected_json = {"key": "value"}
         mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {}
+        mock_response.content = b""
         mock_response.raise_for_status.return_value = None
         mock_response.json.return_value = expected_json
         mock_get.return_value = mock_response
@@ -43,14 +116,18 @@ class TestWeatherFetcher(unittest.TestCase):
                 ),
                 "referencetime": "2000-01-01/2024-12-31",
             },
-            auth=(self.client_id, ""),
+            headers={},
         )
+        self.assertEqual(self.fetcher.session.auth, (self.client_id, ""))
         self.assertEqual(result, expected_json)
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_fetch_weather_data_http_error(self, mock_get):
         """Tester at HTTP-feil håndteres korrekt ved henting av værdata."""
         mock_response = MagicMock()
+        mock_response.status_code = 400
+        mock_response.headers = {}
+        mock_response.content = b""
         mock_response.raise_for_status.side_effect = HTTPError(
             "Error fetching data"
         )
@@ -76,5 +153,310 @@ class TestWeatherFetcher(unittest.TestCase):
             self.assertIn("    \"foo\"", content)
 
 
+class TestStreamingFetch(unittest.TestCase):
+    """Tester sidevis og gjenopptakbar henting mot lokal server."""
+
+    def setUp(self):
+        """Start lokal HTTP-server og lag midlertidig mappe."""
+        FrostStub.pages = [
+            [{"sourceId": "SN1:0", "referenceTime": f"2020-01-0{i + 1}",
+              "observations": [{"elementId": "e", "value": i}]}]
+            for i in range(3)
+        ]
+        FrostStub.requests_seen = []
+        FrostStub.fail_first = 0
+        FrostStub.delay = 0.0
+        FrostStub.max_active = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FrostStub)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        host, port = self.server.server_address
+        self.endpoint = f"http://{host}:{port}/observations/v0.jsonld"
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.params = {"sources": "SN1", "elements": "e"}
+
+    def tearDown(self):
+        """Stopp serveren og fjern midlertidig mappe."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_stream_follows_next_link(self):
+        """Test at alle sider hentes, skrives og gis ut i rekkefølge."""
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        pages = list(fetcher.stream_weather_data(
+            self.tmpdir.name, self.params
+        ))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(len(FrostStub.requests_seen), 3)
+
+        merged = WeatherFetcher.merge_pages(
+            WeatherFetcher.load_pages(self.tmpdir.name)
+        )
+        values = [e["observations"][0]["value"] for e in merged["data"]]
+        self.assertEqual(values, [0, 1, 2])
+
+    def test_stream_resumes_from_checkpoint(self):
+        """Test at avbrutt nedlasting fortsetter fra siste side."""
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        stream = fetcher.stream_weather_data(self.tmpdir.name, self.params)
+        next(stream)
+        stream.close()
+        self.assertEqual(len(FrostStub.requests_seen), 1)
+
+        resumed = list(
+            WeatherFetcher("id", endpoint=self.endpoint)
+            .stream_weather_data(self.tmpdir.name, self.params)
+        )
+        self.assertEqual(len(resumed), 2)
+        self.assertIn("offset=1", FrostStub.requests_seen[1])
+
+        # Fullført nedlasting skal ikke hente noe på nytt
+        again = list(fetcher.stream_weather_data(
+            self.tmpdir.name, self.params
+        ))
+        self.assertEqual(again, [])
+        self.assertEqual(len(FrostStub.requests_seen), 3)
+        self.assertEqual(
+            len(list(WeatherFetcher.load_pages(self.tmpdir.name))), 3
+        )
+
+    def test_stream_restarts_on_new_parameters(self):
+        """Test at endrede parametre starter nedlastingen på nytt."""
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        list(fetcher.stream_weather_data(self.tmpdir.name, self.params))
+        other = {"sources": "SN2", "elements": "e"}
+        pages = list(fetcher.stream_weather_data(self.tmpdir.name, other))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(len(FrostStub.requests_seen), 6)
+
+    def test_split_period_windows(self):
+        """Test at perioden deles i sammenhengende årsvinduer."""
+        windows = WeatherFetcher.split_period("2000-06-01", "2003-12-31")
+        self.assertEqual(windows, [
+            "2000-06-01/2001-01-01",
+            "2001-01-01/2002-01-01",
+            "2002-01-01/2003-01-01",
+            "2003-01-01/2003-12-31",
+        ])
+        self.assertEqual(
+            len(WeatherFetcher.split_period(
+                "2000-01-01", "2024-12-31", window_years=5
+            )),
+            5,
+        )
+        with self.assertRaises(ValueError):
+            WeatherFetcher.split_period("2000-01-01", "2000-01-01")
+
+    def test_fetch_parallel_merges_windows(self):
+        """Test at vinduer per stasjon hentes og slås sammen sortert."""
+        FrostStub.delay = 0.05
+        fetcher = WeatherFetcher(
+            "id", endpoint=self.endpoint, max_per_host=2
+        )
+        result = fetcher.fetch_parallel(
+            "2000-01-01", "2004-01-01",
+            max_workers=4,
+            parameters={"sources": "SN1,SN2", "elements": "e"},
+        )
+        keys = [(e["sourceId"], e["referenceTime"]) for e in result["data"]]
+        self.assertEqual(len(keys), 8)
+        self.assertEqual(keys, sorted(keys))
+        self.assertLessEqual(FrostStub.max_active, 2)
+
+    def test_retry_on_429(self):
+        """Test at 429-svar prøves på nytt med backoff."""
+        FrostStub.fail_first = 2
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint, backoff=0)
+        pages = list(fetcher.stream_weather_data(
+            self.tmpdir.name, self.params
+        ))
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(len(FrostStub.requests_seen), 5)
+
+    def test_retry_gives_up(self):
+        """Test at feilen heves når alle nye forsøk er brukt opp."""
+        FrostStub.fail_first = 10
+        fetcher = WeatherFetcher(
+            "id", endpoint=self.endpoint, max_retries=1, backoff=0
+        )
+        with self.assertRaises(HTTPError):
+            list(fetcher.stream_weather_data(self.tmpdir.name, self.params))
+        self.assertEqual(len(FrostStub.requests_seen), 2)
+
+    def test_fetch_since_requests_only_new_window(self):
+        """Test at inkrementell henting kun ber om nye dager og fletter."""
+        raw_path = os.path.join(self.tmpdir.name, "raw.json")
+        stored = {"data": [{
+            "sourceId": "SN1:0",
+            "referenceTime": "2020-01-05T00:00:00.000Z",
+            "observations": [{"elementId": "e", "value": 0}],
+        }]}
+        with open(raw_path, "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        delta = fetcher.fetch_since(
+            raw_path, "2020-01-10", parameters=self.params
+        )
+        self.assertEqual(len(delta["data"]), 1)
+        self.assertEqual(len(FrostStub.requests_seen), 1)
+        query = parse_qs(urlparse(FrostStub.requests_seen[0]).query)
+        self.assertEqual(query["referencetime"], ["2020-01-06/2020-01-10"])
+
+        with open(raw_path, "r", encoding="utf-8") as f:
+            merged = json.load(f)
+        times = [e["referenceTime"][:10] for e in merged["data"]]
+        self.assertEqual(times, ["2020-01-05", "2020-01-06"])
+
+        # Oppdatert lager gir ingen ny forespørsel
+        fetcher.fetch_since(raw_path, "2020-01-07", parameters=self.params)
+        self.assertEqual(len(FrostStub.requests_seen), 1)
+
+    def test_update_store_appends_delta(self):
+        """Test at inkrementell henting legger nye data i rålageret."""
+        store = RawObservationStore(os.path.join(self.tmpdir.name, "s"))
+        store.append_page({"data": [{
+            "sourceId": "SN1:0",
+            "referenceTime": "2020-01-05T00:00:00.000Z",
+            "observations": [{"elementId": "e", "value": 0}],
+        }]})
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        added = fetcher.update_store(
+            store, "2020-01-10", parameters=self.params
+        )
+        self.assertEqual(added, 1)
+        query = parse_qs(urlparse(FrostStub.requests_seen[0]).query)
+        self.assertEqual(query["referencetime"], ["2020-01-06/2020-01-10"])
+        self.assertEqual(
+            store.latest_reference_times()[("SN1", "e")], "2020-01-06"
+        )
+
+    def test_update_store_skips_stored_observations(self):
+        """Test at elementer som ligger foran ikke lagres på nytt."""
+        store = RawObservationStore(os.path.join(self.tmpdir.name, "s"))
+        store.append_page({"data": [
+            {"sourceId": "SN1:0", "referenceTime": "2020-01-05",
+             "observations": [{"elementId": "f", "value": 0}]},
+            {"sourceId": "SN1:0", "referenceTime": "2020-01-06",
+             "observations": [{"elementId": "e", "value": 0}]},
+        ]})
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        added = fetcher.update_store(
+            store, "2020-01-10", parameters={**self.params, "elements": "e,f"}
+        )
+        query = parse_qs(urlparse(FrostStub.requests_seen[0]).query)
+        self.assertEqual(query["referencetime"], ["2020-01-06/2020-01-10"])
+        self.assertEqual(added, 0)
+
+    def test_fetch_since_without_store_uses_start(self):
+        """Test at manglende lager henter fra startdato."""
+        raw_path = os.path.join(self.tmpdir.name, "new", "raw.json")
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        fetcher.fetch_since(
+            raw_path, "2001-01-01",
+            start="2000-01-01", parameters=self.params,
+        )
+        query = parse_qs(urlparse(FrostStub.requests_seen[0]).query)
+        self.assertEqual(query["referencetime"], ["2000-01-01/2001-01-01"])
+        self.assertTrue(os.path.exists(raw_path))
+
+    def test_merge_entries_replaces_observations(self):
+        """Test at nye observasjoner erstatter gamle med samme nøkkel."""
+        old = [{"sourceId": "S", "referenceTime": "t1", "observations": [
+            {"elementId": "a", "timeOffset": "PT0H", "value": 1},
+            {"elementId": "b", "timeOffset": "PT0H", "value": 2},
+        ]}]
+        new = [{"sourceId": "S", "referenceTime": "t1", "observations": [
+            {"elementId": "a", "timeOffset": "PT0H", "value": 5},
+        ]}]
+        merged = WeatherFetcher._merge_entries(old, new)
+        values = {
+            o["elementId"]: o["value"] for o in merged[0]["observations"]
+        }
+        self.assertEqual(values, {"a": 5, "b": 2})
+
+    def test_conditional_request_uses_cache(self):
+        """Test at uendrede vinduer gir 304 og lagret svar."""
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        first = fetcher._get_json(self.endpoint, self.params)
+        second = fetcher._get_json(self.endpoint, self.params)
+        self.assertEqual(first, second)
+        self.assertEqual(fetcher.stats["requests"], 2)
+        self.assertEqual(fetcher.stats["cache_hits"], 1)
+        self.assertGreater(fetcher.stats["bytes"], 0)
+
+        # Endret innhold gir ny ETag og fullt svar
+        FrostStub.pages.append([])
+        third = fetcher._get_json(self.endpoint, self.params)
+        self.assertEqual(third, first)
+        self.assertEqual(fetcher.stats["cache_hits"], 1)
+
+    def test_memory_cache_is_bounded(self):
+        """Test at svar i minnet holdes innenfor byte-budsjettet."""
+        size = len(WeatherFetcher("id", endpoint=self.endpoint)._request(
+            self.endpoint, self.params
+        ).content)
+        fetcher = WeatherFetcher(
+            "id", endpoint=self.endpoint, cache_bytes=size
+        )
+        fetcher._get_json(self.endpoint, self.params)
+        fetcher._get_json(self.endpoint, {**self.params, "x": "1"})
+        self.assertEqual(len(fetcher._cache), 1)
+        self.assertLessEqual(fetcher._cache_nbytes, size)
+
+        # Det kastede vinduet hentes ubetinget og gir fullt svar
+        fetcher._get_json(self.endpoint, self.params)
+        self.assertEqual(fetcher.stats["cache_hits"], 0)
+
+        tiny = WeatherFetcher("id", endpoint=self.endpoint, cache_bytes=0)
+        tiny._get_json(self.endpoint, self.params)
+        self.assertEqual(len(tiny._cache), 0)
+
+    def test_conditional_cache_persists_on_disk(self):
+        """Test at validatorer og svar gjenbrukes av ny instans."""
+        cache_dir = os.path.join(self.tmpdir.name, "cache")
+        first = WeatherFetcher(
+            "id", endpoint=self.endpoint, cache_dir=cache_dir
+        )
+        pages = list(first.stream_weather_data(
+            self.tmpdir.name, self.params
+        ))
+
+        second = WeatherFetcher(
+            "id", endpoint=self.endpoint, cache_dir=cache_dir
+        )
+        again = list(second.stream_weather_data(
+            self.tmpdir.name, self.params, resume=False
+        ))
+        self.assertEqual(pages, again)
+        self.assertEqual(second.stats["cache_hits"], 3)
+
+    def test_fetch_weather_data_batches_sources(self):
+        """Test at mange stasjoner hentes i grupper og slås sammen."""
+        registry = StationRegistry(
+            {f"by{i}": f"SN{i}" for i in range(3)}, max_sources=2
+        )
+        fetcher = WeatherFetcher(
+            "id", endpoint=self.endpoint, registry=registry
+        )
+        result = fetcher.fetch_weather_data()
+        self.assertEqual(len(FrostStub.requests_seen), 2)
+        self.assertIn("sources=SN0%2CSN1", FrostStub.requests_seen[0])
+        self.assertEqual(len(result["data"]), 2)
+
+    def test_session_is_reused(self):
+        """Test at alle forespørsler går gjennom samme sesjon."""
+        fetcher = WeatherFetcher("id", endpoint=self.endpoint)
+        with patch.object(
+            fetcher.session, "get", wraps=fetcher.session.get
+        ) as spy:
+            list(fetcher.stream_weather_data(self.tmpdir.name, self.params))
+        self.assertEqual(spy.call_count, 3)
+        self.assertIn("gzip", fetcher.session.headers["Accept-Encoding"])
+
+
 if __name__ == "__main__":
     unittest.main()
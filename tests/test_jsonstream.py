@@ -0,0 +1,83 @@
+"""Tester jsonstream.py."""
+
+import io
+import json
+import numpy as np
+import unittest
+
+from src.handleData.jsonstream import ObservationColumns, iter_json_array
+
+
+class TestIterJsonArray(unittest.TestCase):
+    """Tester inkrementell lesing av JSON-lister."""
+
+    def test_streams_entries_with_small_chunks(self):
+        """Test at elementer leses riktig selv med svært små biter."""
+        doc = {
+            "@type": "ObservationResponse",
+            "totalItemCount": 123456789,
+            "nested": {"data": [0]},
+            "data": [{"a": i, "b": [1.25, "x]}"]} for i in range(50)],
+            "after": True,
+        }
+        text = json.dumps(doc, indent=4)
+        for chunk_size in (1, 7, 1 << 20):
+            entries = list(
+                iter_json_array(io.StringIO(text), "data", chunk_size)
+            )
+            self.assertEqual(entries, doc["data"])
+
+    def test_empty_and_missing_key(self):
+        """Test tom liste og manglende nøkkel."""
+        self.assertEqual(
+            list(iter_json_array(io.StringIO('{"data": []}'))), []
+        )
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"other": 1}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('[1, 2]')))
+
+    def test_invalid_json_raises(self):
+        """Test at avkuttet JSON gir feil."""
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"data": [{"a": 1}, {"b"')))
+
+
+class TestObservationColumns(unittest.TestCase):
+    """Tester kolonnevis utflating."""
+
+    def test_to_frame_types(self):
+        """Test at kolonner får kategorier og float64-verdier."""
+        columns = ObservationColumns()
+        columns.add_entry({
+            "sourceId": "S1:0",
+            "referenceTime": "2020-01-01T00:00:00.000Z",
+            "observations": [
+                {"elementId": "e1", "value": 1, "unit": "degC",
+                 "timeOffset": "PT0H"},
+                {"elementId": "e2", "value": None, "timeOffset": "PT6H"},
+            ],
+        })
+        df = columns.to_frame()
+        self.assertEqual(len(columns), 2)
+        self.assertListEqual(df.columns.tolist(), [
+            "sourceId", "referenceTime", "timeOffset", "elementId",
+            "value", "unit"])
+        for col in ("sourceId", "timeOffset", "elementId", "unit"):
+            self.assertEqual(df[col].dtype, "category")
+        self.assertEqual(df["value"].dtype, np.float64)
+        self.assertTrue(np.isnan(df["value"].iloc[1]))
+        self.assertEqual(df["unit"].iloc[1], "N/A")
+        self.assertEqual(
+            df["referenceTime"].iloc[0], "2020-01-01T00:00:00.000Z"
+        )
+
+    def test_empty_frame(self):
+        """Test at tomme kolonner gir tom df."""
+        self.assertEqual(len(ObservationColumns().to_frame()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -87,6 +87,32 @@ class TestMonthlyStats(unittest.TestCase):
             df_stats.loc[1, "std"], np.std([5, 6, 7, 8], ddof=1)
         )
 
+    def test_select_values_month_edges(self):
+        """Tester at månedsutvalget tar med hele måneden, ikke mer."""
+        times = pd.to_datetime([
+            "2021-01-31T23:59:59Z", "2021-02-01T00:00:00Z",
+            "2021-02-28T23:59:59Z", "2021-03-01T00:00:00Z",
+        ], utc=True)
+        series = pd.Series([1.0, 2.0, 3.0, 4.0], index=times)
+        vals = MonthlyStats._select_values(series, "2021-02", "e", "PT0H")
+        self.assertListEqual(list(vals), [2.0, 3.0])
+        for year_month in ("2021-2", "2021-13", "2020-02"):
+            with self.assertRaises(ValueError):
+                MonthlyStats._select_values(
+                    series, year_month, "e", "PT0H"
+                )
+
+    def test_compute_all_months_batch(self):
+        """Tester batch av compute_all_months over flere byer."""
+        loader = DummyLoader(self.df, min_offset="PT1H")
+        out = loader.batch(
+            "compute_all_months", ["cityX", "cityY"], ["rain"],
+            max_workers=1,
+        )
+        self.assertEqual(list(out["city"]), ["cityX"] * 2 + ["cityY"] * 2)
+        self.assertEqual(list(out["element_id"]), ["rain"] * 4)
+        self.assertListEqual(list(out["mean"]), [2.5, 6.5, 2.5, 6.5])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,75 @@
+"""Tester queryengine.py."""
+
+import os
+import pandas as pd
+import tempfile
+import unittest
+
+from src.handleData.queryengine import QueryEngine, shared_engine
+
+
+class TestQueryEngine(unittest.TestCase):
+    """Tester QueryEngine."""
+
+    def setUp(self):
+        """Lag testdata og motor i minnet."""
+        self.df = pd.DataFrame({
+            'sourceId': pd.Categorical(['A', 'A', 'B']),
+            'elementId': ['e1', 'e2', 'e1'],
+            'value': [1.0, 2.0, 3.0],
+        })
+        self.engine = QueryEngine()
+
+    def tearDown(self):
+        """Lukk motoren."""
+        self.engine.close()
+
+    def test_query_registered_table(self):
+        """Test at SQL kjøres mot registrert df med parametre."""
+        self.engine.register('obs', self.df, indexes=['sourceId'])
+        result = self.engine.query(
+            'SELECT sourceId, SUM(value) AS total FROM obs '
+            'WHERE elementId = ? GROUP BY sourceId ORDER BY sourceId',
+            ['e1'],
+        )
+        self.assertEqual(result['sourceId'].tolist(), ['A', 'B'])
+        self.assertEqual(result['total'].tolist(), [1.0, 3.0])
+
+        indexes = self.engine.query(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )
+        self.assertIn('ix_obs_sourceId', indexes['name'].tolist())
+
+    def test_register_skips_unchanged_table(self):
+        """Test at uendret innhold ikke kopieres inn på nytt."""
+        self.assertTrue(self.engine.register('obs', self.df))
+        self.assertFalse(self.engine.register('obs', self.df.copy()))
+
+        changed = self.df.copy()
+        changed.loc[0, 'value'] = 10.0
+        self.assertTrue(self.engine.register('obs', changed))
+        total = self.engine.query('SELECT SUM(value) AS s FROM obs')
+        self.assertEqual(total['s'].iloc[0], 15.0)
+
+    def test_persistent_file_is_reused(self):
+        """Test at tabeller i fil overlever ny tilkobling."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'obs.sqlite')
+            first = QueryEngine(path)
+            first.register('obs', self.df, version='v1')
+            first.close()
+
+            second = QueryEngine(path)
+            self.assertFalse(
+                second.register('obs', self.df, version='v1'))
+            count = second.query('SELECT COUNT(*) AS n FROM obs')
+            self.assertEqual(count['n'].iloc[0], 3)
+            second.close()
+
+    def test_shared_engine_is_singleton(self):
+        """Test at felles motor er samme instans."""
+        self.assertIs(shared_engine(), shared_engine())
+
+
+if __name__ == '__main__':
+    unittest.main()
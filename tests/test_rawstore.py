@@ -0,0 +1,97 @@
+"""Tester rawstore.py."""
+
+import gzip
+import tempfile
+import unittest
+
+from src.fetchData.rawstore import RawObservationStore
+
+
+def _page(source, times, value=1.0):
+    """Lag en Frost-side med én observasjon per tidspunkt."""
+    return {"data": [
+        {
+            "sourceId": source,
+            "referenceTime": t,
+            "observations": [{
+                "elementId": "e", "value": value,
+                "unit": "degC", "timeOffset": "PT0H",
+            }],
+        }
+        for t in times
+    ]}
+
+
+class TestRawObservationStore(unittest.TestCase):
+    """Tester RawObservationStore."""
+
+    def setUp(self):
+        """Lag midlertidig lager."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = RawObservationStore(self.tmpdir.name)
+
+    def tearDown(self):
+        """Fjern midlertidig lager."""
+        self.tmpdir.cleanup()
+
+    def test_append_page_partitions_by_source_and_year(self):
+        """Test at observasjoner havner i riktig partisjon."""
+        written = self.store.append_page(_page(
+            "SN1:0", ["2000-12-31T00:00:00.000Z", "2001-01-01T00:00:00.000Z"]
+        ))
+        self.assertEqual(written, 2)
+        self.assertEqual(len(self.store.partitions()), 2)
+        self.assertEqual(len(self.store.partitions(years=[2001])), 1)
+        self.assertEqual(self.store.partitions(sources=["SN2"]), [])
+
+        path = self.store.partition_path("SN1:0", 2000)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(
+            lines[0], "sourceId,referenceTime,timeOffset,elementId,value,unit"
+        )
+        self.assertEqual(len(lines), 2)
+
+    def test_append_adds_rows_without_new_header(self):
+        """Test at nye sider legges til uten ny header."""
+        self.store.write_pages([
+            _page("SN1:0", ["2000-01-01T00:00:00.000Z"]),
+            _page("SN1:0", ["2000-01-02T00:00:00.000Z"]),
+        ])
+        path = self.store.partition_path("SN1", 2000)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines.count(lines[0]), 1)
+
+    def test_latest_reference_times(self):
+        """Test at siste tidspunkt finnes fra nyeste partisjon."""
+        self.store.write_pages([
+            _page("SN1:0", ["2000-05-01T00:00:00.000Z"]),
+            _page("SN1:0", ["2001-02-03T00:00:00.000Z"]),
+            _page("SN2:0", ["1999-01-01T00:00:00.000Z"]),
+        ])
+        latest = self.store.latest_reference_times()
+        self.assertEqual(latest[("SN1", "e")], "2001-02-03T00:00:00.000Z")
+        self.assertEqual(latest[("SN2", "e")], "1999-01-01T00:00:00.000Z")
+
+    def test_latest_reference_times_scans_older_years(self):
+        """Test at elementer uten rader i nyeste år finnes i eldre år."""
+        page = _page("SN1:0", ["2000-05-01T00:00:00.000Z"])
+        page["data"][0]["observations"][0]["elementId"] = "old"
+        self.store.write_pages([
+            page,
+            _page("SN1:0", ["2001-02-03T00:00:00.000Z"]),
+        ])
+        latest = self.store.latest_reference_times(["e", "old"])
+        self.assertEqual(latest[("SN1", "old")], "2000-05-01T00:00:00.000Z")
+        self.assertEqual(latest[("SN1", "e")], "2001-02-03T00:00:00.000Z")
+        self.assertEqual(
+            self.store.latest_reference_times(["e"]),
+            {("SN1", "e"): "2001-02-03T00:00:00.000Z"},
+        )
+        self.assertIn(("SN1", "old"), self.store.latest_reference_times())
+
+
+if __name__ == "__main__":
+    unittest.main()
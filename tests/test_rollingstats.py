@@ -0,0 +1,141 @@
+"""Tester rollingstats.py."""
+
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+sys.path.append("src/analyseData")
+
+from rollingstats import RollingStats, RollingWindow, rolling_frame
+
+
+class TestRollingFrame(unittest.TestCase):
+    """Sammenlign vektorisert glidende statistikk med pandas."""
+
+    def setUp(self):
+        """Lag en daglig serie med hull."""
+        values = np.random.default_rng(5).normal(10.0, 4.0, 400)
+        values[[3, 4, 50, 51, 52, 200]] = np.nan
+        self.daily = pd.Series(
+            values, index=pd.date_range('2020-01-01', periods=400, freq='D')
+        )
+
+    def test_matches_pandas(self):
+        """Sjekk snitt, std, min, maks og kvantiler mot pandas."""
+        for window, min_periods in ((1, None), (7, 5), (30, 20), (450, 1)):
+            out = rolling_frame(
+                self.daily, window, quantiles=(0.1, 0.5),
+                min_periods=min_periods,
+            )
+            rolling = self.daily.rolling(
+                window, min_periods=min_periods or window
+            )
+            for name in ('mean', 'std', 'min', 'max'):
+                expected = getattr(rolling, name)()
+                np.testing.assert_allclose(
+                    out[name], expected, rtol=1e-9, atol=1e-9,
+                    err_msg=f'{name}, window={window}',
+                )
+            for q, name in ((0.1, 'q10'), (0.5, 'q50')):
+                np.testing.assert_allclose(
+                    out[name], rolling.quantile(q), rtol=1e-9,
+                    err_msg=f'{name}, window={window}',
+                )
+
+    def test_unknown_statistic(self):
+        """Sjekk at ukjent statistikk gir ValueError."""
+        with self.assertRaises(ValueError):
+            rolling_frame(self.daily, 7, statistics=('mode',))
+
+    def test_stream_matches_bulk(self):
+        """Sjekk at strømmende vindu gir samme verdier som bulk."""
+        bulk = rolling_frame(
+            self.daily, 30, quantiles=(0.25,), min_periods=10
+        )
+        stream = RollingWindow(30, quantiles=(0.25,), min_periods=10)
+        first = stream.extend(self.daily.index[:100], self.daily[:100])
+        rest = stream.extend(self.daily.index[90:], self.daily[90:])
+        self.assertEqual(len(first) + len(rest), len(self.daily))
+        out = pd.concat([first, rest])
+        for name in ('count', 'mean', 'std', 'min', 'max', 'q25'):
+            np.testing.assert_allclose(
+                out[name].to_numpy(dtype=float),
+                bulk[name].to_numpy(dtype=float),
+                rtol=1e-9, atol=1e-9, err_msg=name,
+            )
+
+    def test_stream_fills_gaps(self):
+        """Sjekk at hull mellom dager gir manglende verdier i vinduet."""
+        stream = RollingWindow(2, min_periods=1)
+        out = stream.extend(
+            pd.to_datetime(['2021-01-01', '2021-01-04'], utc=True),
+            [1.0, 3.0],
+        )
+        self.assertEqual(len(out), 4)
+        self.assertListEqual(list(out['count']), [1, 1, 0, 1])
+        self.assertEqual(out['mean'].iloc[-1], 3.0)
+
+
+class TestRollingStats(unittest.TestCase):
+    """Test RollingStats mot en CSV-fil."""
+
+    def setUp(self):
+        """Skriv to byer med en manglende dag."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmpdir.name
+        times = pd.date_range('2020-01-01', '2021-12-31', freq='D', tz='UTC')
+        self.times = times.delete(10)
+        for city, scale in (('a', 1.0), ('b', 2.0)):
+            pd.DataFrame({
+                'referenceTime': self.times.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'elementId': 'e',
+                'timeOffset': 'PT0H',
+                'value': np.arange(len(self.times)) * scale,
+            }).to_csv(os.path.join(
+                self.data_dir,
+                RollingStats.filename_template.format(city=city),
+            ), index=False)
+
+    def tearDown(self):
+        """Fjern den midlertidige katalogen."""
+        self.tmpdir.cleanup()
+
+    def test_rolling_many_series(self):
+        """Sjekk lang tabell for flere byer og vinduer."""
+        stats = RollingStats(self.data_dir)
+        out = stats.compute_rolling(
+            ['a', 'b'], ['e'], windows=(3, 30), min_periods=1,
+            max_workers=1,
+        )
+        days = len(self.times) + 1
+        self.assertEqual(len(out), 2 * 2 * days)
+        row = out[(out['city'] == 'b') & (out['window'] == 3)].iloc[12]
+        self.assertEqual(row['referenceTime'],
+                         pd.Timestamp('2020-01-13', tz='UTC'))
+        self.assertAlmostEqual(row['mean'], np.mean([20.0, 22.0]))
+
+    def test_stream_from_history(self):
+        """Sjekk at strømmen fortsetter fra historikken."""
+        stats = RollingStats(self.data_dir)
+        stream = stats.rolling_stream('a', 'e', 3)
+        out = stream.extend(
+            pd.to_datetime(['2022-01-01'], utc=True), [1000.0]
+        )
+        n = len(self.times)
+        self.assertAlmostEqual(
+            out['mean'].iloc[0], np.mean([n - 2, n - 1, 1000.0])
+        )
+
+    def test_anomaly(self):
+        """Sjekk avvik fra klimatologien."""
+        out = RollingStats(self.data_dir).anomaly('a', 'e', window=1)
+        jan1 = out[out['referenceTime'].dt.strftime('%m-%d') == '01-01']
+        self.assertListEqual(list(jan1['climatology']), [182.5, 182.5])
+        self.assertListEqual(list(jan1['anomaly']), [-182.5, 182.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+"""Tester runningstats.py."""
+
+import glob
+import json
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.append("src/analyseData")
+
+import runningstats
+from basedata import DataLoader
+from runningstats import RunningAggregates
+from yearlystats import YearlyStats
+
+
+def _frame(start, periods, values=None):
+    """Lag daglige rader for ett element."""
+    times = pd.date_range(start, periods=periods, freq='D', tz='UTC')
+    if values is None:
+        values = np.arange(periods, dtype=float)
+    return pd.DataFrame({
+        'referenceTime': times,
+        'elementId': 'e',
+        'timeOffset': 'PT0H',
+        'value': values,
+    })
+
+
+class TestRunningAggregates(unittest.TestCase):
+    """Test RunningAggregates."""
+
+    def test_append_only_new_rows(self):
+        """Sjekk at kun rader etter vannmerket flettes inn."""
+        old = _frame('2020-12-01', 40)
+        new = _frame('2021-01-10', 30, values=np.arange(40, 70.0))
+        full = pd.concat([old, new], ignore_index=True)
+
+        running = RunningAggregates()
+        self.assertEqual(running.append(old), 40)
+        self.assertEqual(running.append(full), 30)
+        self.assertEqual(running.append(full), 0)
+
+        expected = RunningAggregates()
+        expected.append(full)
+        for got, want in (
+            (running.months('e', 'PT0H'), expected.months('e', 'PT0H')),
+            (running.years('e', 'PT0H'), expected.years('e', 'PT0H')),
+        ):
+            self.assertEqual([k for k, _ in got.items()],
+                             [k for k, _ in want.items()])
+            for (_, a), (_, b) in zip(got.items(), want.items()):
+                self.assertEqual(a.count, b.count)
+                self.assertAlmostEqual(a.mean, b.mean)
+                self.assertAlmostEqual(a.std(), b.std())
+                self.assertEqual(a.median(), b.median())
+
+    def test_state_round_trip(self):
+        """Sjekk at tilstanden kan lagres som JSON og brukes videre."""
+        running = RunningAggregates()
+        running.append(_frame('2021-01-01', 45))
+        restored = RunningAggregates.from_state(
+            json.loads(json.dumps(running.to_state()))
+        )
+        self.assertEqual(restored.watermarks, running.watermarks)
+        restored.append(_frame('2021-01-01', 50))
+        years = restored.years('e', 'PT0H').groups[2021]
+        self.assertEqual(years.count, 50)
+        self.assertAlmostEqual(years.mean, 24.5)
+        self.assertEqual(years.min, 0.0)
+        self.assertEqual(years.max, 49.0)
+
+
+class TestIncrementalYearly(unittest.TestCase):
+    """Test løpende årsaggregater når kildefilene endres."""
+
+    def setUp(self):
+        """Skriv to år med daglige verdier."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmpdir.name
+        self.path = os.path.join(
+            self.data_dir, YearlyStats.filename_template.format(city='c')
+        )
+        values = np.random.default_rng(3).normal(5.0, 2.0, 731)
+        self.df = _frame('2020-01-01', 731, values.round(2))
+        self._write(self.df)
+        self.stats = YearlyStats(self.data_dir)
+        self.stats.use_running_aggregates = True
+
+    def tearDown(self):
+        """Fjern den midlertidige katalogen."""
+        self.tmpdir.cleanup()
+
+    def _write(self, df):
+        """Skriv df som CSV."""
+        df.assign(
+            referenceTime=df['referenceTime'].dt.strftime(
+                '%Y-%m-%dT%H:%M:%SZ'
+            )
+        ).to_csv(self.path, index=False)
+
+    def _compare(self, element_id='e'):
+        """Sjekk løpende mot eksakt årstabell etter at filene er endret."""
+        runningstats._by_sources.clear()
+        os.utime(self.path, ns=(0, 10 ** 18))
+        result = self.stats.compute_yearly('c', element_id, aggregate='mean')
+        exact = YearlyStats(self.data_dir)
+        pd.testing.assert_frame_equal(
+            result,
+            exact.compute_yearly('c', element_id, aggregate='mean'),
+            check_dtype=False,
+        )
+        return result
+
+    def test_append_day_reads_delta(self):
+        """Sjekk at en ny dag kun leser og skriver det som er nytt."""
+        self.stats.compute_yearly(
+            'c', 'e', time_offset='PT0H', aggregate='mean'
+        )
+        before = self.stats._running_aggregates('c')
+        (state_path,) = glob.glob(os.path.join(
+            self.data_dir, '.cache', '*' + runningstats.RUNNING_SUFFIX
+        ))
+
+        self._write(pd.concat([self.df, _frame('2022-01-01', 1, [9.0])]))
+        os.utime(self.path, ns=(0, 10 ** 18))
+        with mock.patch.object(
+            DataLoader, '_series_index', side_effect=AssertionError
+        ), mock.patch.object(
+            DataLoader, '_scan', side_effect=AssertionError
+        ), mock.patch.object(
+            RunningAggregates, 'to_state', side_effect=AssertionError
+        ):
+            self.stats.compute_yearly(
+                'c', 'e', time_offset='PT0H', aggregate='mean'
+            )
+
+        # Den gamle versjonen er urørt, og kun én linje er lagt til
+        self.assertNotIn(2022, before.years('e', 'PT0H').groups)
+        with open(state_path, 'rb') as f:
+            self.assertEqual(len(f.readlines()), 2)
+        result = self._compare()
+        self.assertListEqual(list(result['year']), [2020, 2021, 2022])
+
+    def test_rewritten_history_rebuilds(self):
+        """Sjekk at en endret gammel verdi gir aggregatene på nytt."""
+        self.stats.compute_yearly('c', 'e', aggregate='mean')
+        changed = self.df.copy()
+        changed.loc[10, 'value'] = 100.0
+        self._write(pd.concat([changed, _frame('2022-01-01', 1, [9.0])]))
+        self._compare()
+
+    def test_new_series_gets_full_history(self):
+        """Sjekk at en ny serie i den avledede filen tar med alle rader."""
+        self.stats.compute_yearly('c', 'e', aggregate='mean')
+        derived = self.df.assign(elementId='r', sourceId='SN1:0')
+        derived.assign(
+            referenceTime=derived['referenceTime'].dt.strftime(
+                '%Y-%m-%dT%H:%M:%SZ'
+            )
+        ).to_csv(
+            os.path.join(
+                self.data_dir, YearlyStats.derived_template.format(city='c')
+            ),
+            index=False,
+        )
+        self._write(pd.concat([self.df, _frame('2022-01-01', 1, [9.0])]))
+        result = self._compare('r')
+        self.assertListEqual(list(result['year']), [2020, 2021])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tester seriesindex.py."""
+import numpy as np
+import pandas as pd
+import unittest
+
+from src.analyseData.seriesindex import SeriesIndex, index_for
+
+
+class TestSeriesIndex(unittest.TestCase):
+    """Test SeriesIndex."""
+
+    def setUp(self):
+        """Lag en usortert df med to elementer og en ugyldig verdi."""
+        self.df = pd.DataFrame({
+            'referenceTime': pd.to_datetime([
+                '2021-01-03', '2021-01-01', '2021-01-02', '2021-01-01',
+            ], utc=True),
+            'elementId': ['e', 'e', 'e', 'f'],
+            'timeOffset': ['PT0H', 'PT0H', 'PT0H', 'PT0H'],
+            'value': ['3', '1', 'x', '9'],
+        })
+
+    def test_series_sorted_float_with_nan(self):
+        """Sjekk at serien er sortert på tid og ugyldige verdier er NaN."""
+        series = SeriesIndex(self.df).series('e', 'PT0H')
+        self.assertEqual(series.dtype, np.float64)
+        self.assertTrue(series.index.is_monotonic_increasing)
+        self.assertEqual(series.index.name, 'referenceTime')
+        np.testing.assert_array_equal(series.to_numpy(), [1.0, np.nan, 3.0])
+
+    def test_calendar_follows_series(self):
+        """Sjekk at kalendernøklene følger rekkefølgen i serien."""
+        index = SeriesIndex(self.df)
+        keys = index.calendar_for('e', 'PT0H')
+        series = index.series('e', 'PT0H')
+        np.testing.assert_array_equal(keys.year, series.index.year)
+        np.testing.assert_array_equal(keys.day_of_year, [1, 2, 3])
+        self.assertEqual(len(index.calendar_for('e', 'PT6H').month), 0)
+
+    def test_missing_key_gives_empty_series(self):
+        """Sjekk at ukjent kombinasjon gir tom serie."""
+        series = SeriesIndex(self.df).series('e', 'PT6H')
+        self.assertTrue(series.empty)
+        self.assertEqual(sorted(SeriesIndex(self.df).keys()),
+                         [('e', 'PT0H'), ('f', 'PT0H')])
+
+    def test_string_times_are_parsed(self):
+        """Sjekk at referenceTime som tekst tolkes som UTC."""
+        df = self.df.assign(referenceTime=['2021-01-03', '2021-01-01',
+                                           '2021-01-02', '2021-01-01'])
+        series = SeriesIndex(df).series('f', 'PT0H')
+        self.assertEqual(str(series.index.tz), 'UTC')
+
+    def test_frame_returns_full_rows(self):
+        """Sjekk at frame gir hele rader med numerisk value."""
+        index = SeriesIndex(self.df)
+        rows = index.frame(self.df, 'e', 'PT0H')
+        self.assertEqual(list(rows.columns), list(self.df.columns))
+        self.assertEqual(rows['value'].iloc[0], 1.0)
+
+    def test_index_for_is_reused_per_frame(self):
+        """Sjekk at indeksen bygges én gang per df."""
+        self.assertIs(index_for(self.df), index_for(self.df))
+        self.assertIsNot(index_for(self.df), index_for(self.df.copy()))
+
+    def test_offset_metadata(self):
+        """Sjekk at offsets tolkes én gang og minste offset slås opp."""
+        df = pd.DataFrame({
+            'referenceTime': pd.to_datetime(['2021-01-01'] * 4, utc=True),
+            'elementId': ['e', 'e', 'e', 'g'],
+            'timeOffset': ['PT12H', 'PT6H', 'BAD', 'BAD'],
+            'value': [1.0, 2.0, 3.0, 4.0],
+        })
+        index = SeriesIndex(df)
+        self.assertEqual(index.offsets['e'],
+                         {'PT12H': 12, 'PT6H': 6, 'BAD': None})
+        self.assertEqual(index.min_offset('e'), 'PT6H')
+        self.assertIsNone(index.min_offset('g'))
+        self.assertIsNone(index.min_offset('mangler'))
+
+
+if __name__ == '__main__':
+    unittest.main()
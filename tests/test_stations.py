@@ -0,0 +1,65 @@
+"""Tester stations.py."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from src.fetchData.stations import StationRegistry
+
+
+class TestStationRegistry(unittest.TestCase):
+    """Tester StationRegistry."""
+
+    def test_default_registry(self):
+        """Test at standardregisteret har Oslo og Tromsø."""
+        registry = StationRegistry()
+        self.assertEqual(registry.cities(), ["oslo", "tromso"])
+        self.assertEqual(registry.sensor_id("oslo"), "SN18700:0")
+        self.assertEqual(registry.source_id("Tromsø"), "SN90450")
+        self.assertEqual(len(registry.elements), 5)
+
+    def test_unknown_city_raises(self):
+        """Test at ukjent by gir KeyError."""
+        with self.assertRaises(KeyError):
+            StationRegistry().source_id("bergen")
+
+    def test_city_lookup(self):
+        """Test oppslag fra sourceId og filsti til bykode."""
+        registry = StationRegistry()
+        self.assertEqual(registry.city_for_source("SN90450:0"), "tromso")
+        self.assertIsNone(registry.city_for_source("SN1"))
+        self.assertEqual(
+            registry.infer_city("data/vaerdata_tromso_imputert.csv"),
+            "tromso",
+        )
+        self.assertIsNone(registry.infer_city("data/ukjent.csv"))
+
+    def test_source_batches(self):
+        """Test at stasjoner deles i grupper etter API-grensen."""
+        stations = {f"by{i}": f"SN{i}" for i in range(120)}
+        registry = StationRegistry(stations)
+        batches = registry.source_batches(max_sources=50)
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(len(batches[0].split(",")), 50)
+        self.assertEqual(len(batches[2].split(",")), 20)
+        self.assertEqual(len(StationRegistry(
+            stations, max_sources=100
+        ).source_batches()), 2)
+        with self.assertRaises(ValueError):
+            StationRegistry(stations, max_sources=0).source_batches()
+
+    def test_from_json(self):
+        """Test at register kan leses fra JSON-fil."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "stations.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"stations": {"Bergen": "SN50540:0"}}, f)
+            registry = StationRegistry.from_json(path)
+        self.assertEqual(registry.cities(), ["bergen"])
+        self.assertEqual(registry.sensor_id("bergen"), "SN50540:0")
+        self.assertEqual(len(registry.elements), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
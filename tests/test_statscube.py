@@ -0,0 +1,143 @@
+"""Tester statscube.py."""
+
+import numpy as np
+import os
+import pandas as pd
+import sys
+import tempfile
+import unittest
+
+from unittest import mock
+
+sys.path.append("src/analyseData")
+
+import statscube
+from monthlystats import MonthlyStats
+from seriesindex import SeriesIndex
+from statscube import StatsCube, month_period
+
+
+class TestStatsCube(unittest.TestCase):
+    """Test StatsCube."""
+
+    def setUp(self):
+        """Lag to måneder for ett element, med en ugyldig verdi."""
+        times = pd.to_datetime([
+            '2021-02-02', '2021-01-01', '2021-01-02', '2021-01-03',
+            '2021-02-01',
+        ], utc=True)
+        self.df = pd.DataFrame({
+            'referenceTime': times,
+            'elementId': ['e'] * 5,
+            'timeOffset': ['PT0H'] * 5,
+            'value': ['8', '1', 'x', '3', '6'],
+        })
+        self.cube = StatsCube.from_index(SeriesIndex(self.df))
+
+    def test_lookup(self):
+        """Sjekk oppslag på én måned."""
+        stats = self.cube.lookup('e', 'PT0H', month_period(2021, 1))
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['sum'], 4.0)
+        self.assertEqual(stats['m2'], 2.0)
+        self.assertEqual((stats['min'], stats['max']), (1.0, 3.0))
+        self.assertEqual(stats['median'], 2.0)
+        self.assertEqual(StatsCube.mean(stats), 2.0)
+        self.assertAlmostEqual(StatsCube.std(stats, ddof=0), 1.0)
+        self.assertIsNone(self.cube.lookup('e', 'PT0H', month_period(2021, 3)))
+        self.assertIsNone(self.cube.lookup('f', 'PT0H', month_period(2021, 1)))
+
+    def test_months(self):
+        """Sjekk alle måneder for en serie."""
+        months = self.cube.months('e', 'PT0H')
+        self.assertListEqual(list(months['year_month']),
+                             ['2021-01', '2021-02'])
+        np.testing.assert_allclose(StatsCube.mean(months), [2.0, 7.0])
+        np.testing.assert_allclose(
+            StatsCube.std(months, ddof=1),
+            [np.std([1, 3], ddof=1), np.std([6, 8], ddof=1)],
+        )
+        self.assertTrue(self.cube.months('f', 'PT0H').empty)
+
+    def test_std_large_values(self):
+        """Sjekk at standardavviket holder presisjonen for store verdier."""
+        values = 1e9 + np.array([0.1, 0.2, 0.3, 0.4])
+        df = pd.DataFrame({
+            'referenceTime': pd.date_range(
+                '2021-01-01', periods=4, freq='D', tz='UTC'
+            ),
+            'elementId': 'e',
+            'timeOffset': 'PT0H',
+            'value': values,
+        })
+        stats = StatsCube.from_index(SeriesIndex(df)).lookup(
+            'e', 'PT0H', month_period(2021, 1)
+        )
+        self.assertAlmostEqual(
+            StatsCube.std(stats, ddof=1), np.std(values, ddof=1), places=6
+        )
+
+
+class TestPersistedCube(unittest.TestCase):
+    """Test at MonthlyStats svarer fra en lagret kube."""
+
+    def setUp(self):
+        """Skriv en CSV for én by."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmpdir.name
+        self.path = os.path.join(
+            self.data_dir, MonthlyStats.filename_template.format(city='c')
+        )
+        self._write([1.0, 2.0, 4.0])
+
+    def tearDown(self):
+        """Fjern den midlertidige katalogen."""
+        self.tmpdir.cleanup()
+
+    def _write(self, values):
+        """Skriv verdier for januar 2021."""
+        pd.DataFrame({
+            'referenceTime': pd.date_range(
+                '2021-01-01', periods=len(values), freq='D', tz='UTC'
+            ).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'elementId': 'e',
+            'timeOffset': 'PT0H',
+            'value': values,
+        }).to_csv(self.path, index=False)
+
+    def test_lookup_without_raw_rows(self):
+        """Sjekk at en lagret kube brukes uten å lese rådata."""
+        MonthlyStats(self.data_dir).build_stats_cube('c')
+        self.assertTrue(any(
+            name.endswith(statscube.CUBE_SUFFIX)
+            for name in os.listdir(os.path.join(self.data_dir, '.cache'))
+        ))
+
+        statscube._by_sources.clear()
+        stats = MonthlyStats(self.data_dir)
+        with mock.patch.object(
+            MonthlyStats, '_load_city', side_effect=AssertionError
+        ):
+            result = stats.compute_single_month(
+                '2021-01', 'e', 'c', time_offset='PT0H'
+            )
+            months = stats.compute_all_months('e', 'c', time_offset='PT0H')
+        self.assertAlmostEqual(result['mean'], 7 / 3)
+        self.assertEqual(result['median'], 2.0)
+        self.assertListEqual(list(months['year_month']), ['2021-01'])
+
+    def test_changed_source_rebuilds(self):
+        """Sjekk at kuben bygges på nytt når kildefilen endres."""
+        stats = MonthlyStats(self.data_dir)
+        self.assertEqual(
+            stats.compute_single_month('2021-01', 'e', 'c')['median'], 2.0
+        )
+        self._write([1.0, 2.0, 4.0, 10.0, 12.0])
+        os.utime(self.path, ns=(0, 10 ** 18))
+        self.assertEqual(
+            stats.compute_single_month('2021-01', 'e', 'c')['median'], 4.0
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
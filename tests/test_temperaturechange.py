@@ -7,6 +7,8 @@ import unittest
 
 from pandas.testing import assert_frame_equal
 
+from src.analyseData.basedata import DataLoader
+from src.fetchData.stations import StationRegistry
 from src.handleData.temperaturechange import TemperatureRangeConverter
 
 
@@ -52,32 +54,176 @@ class TestTemperatureRangeConverter(unittest.TestCase):
             check_names=False
         )
 
+    def _write_city(self, city, dates, max_vals, min_vals):
+        """Skriv en by-fil med maks- og mintemperatur per dato."""
+        file_path = os.path.join(self.output_dir, f"vaerdata_{city}.csv")
+        n = len(dates)
+        pd.DataFrame({
+            'sourceId': ['S1'] * 2 * n,
+            'referenceTime': list(dates) * 2,
+            'timeOffset': [0] * 2 * n,
+            'elementId': (['max(air_temperature P1D)'] * n
+                          + ['min(air_temperature P1D)'] * n),
+            'value': list(max_vals) + list(min_vals),
+            'unit': ['degC'] * 2 * n
+        }).to_csv(file_path, index=False)
+        return file_path
+
     def test_process_city_creates_range_rows(self):
-        """Test at prosessering av by skaper range-rader."""
+        """Test at range-rader skrives til egen partisjon."""
         city = 'oslo'
-        file_path = os.path.join(self.output_dir, f"vaerdata_{city}.csv")
-        df_input = pd.DataFrame({
-            'sourceId': ['S1', 'S1'],
-            'referenceTime': ['2025-05-02', '2025-05-02'],
-            'timeOffset': [0, 0],
-            'elementId': ['max(air_temperature P1D)',
-                          'min(air_temperature P1D)'],
-            'value': [20.0, 10.0],
-            'unit': ['degC', 'degC']
-        })
-        df_input.to_csv(file_path, index=False)
+        file_path = self._write_city(city, ['2025-05-02'], [20.0], [10.0])
+        with open(file_path, encoding='utf-8') as f:
+            original = f.read()
 
         self.converter.run()
-        df_updated = pd.read_csv(file_path)
-        range_rows = df_updated[df_updated['elementId']
+        df_derived = self.converter.load_derived(city)
+        range_rows = df_derived[df_derived['elementId']
                                 == 'range(air_temperature P1D)']
         self.assertEqual(len(range_rows), 1)
         self.assertAlmostEqual(range_rows.iloc[0]['value'], 10.0, places=1)
         self.assertEqual(range_rows.iloc[0]['unit'], 'degC')
 
-        original_rows = df_updated[df_updated['elementId']
-                                   == 'max(air_temperature P1D)']
-        self.assertEqual(len(original_rows), 1)
+        # By-filen skrives ikke om
+        with open(file_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), original)
+
+    def test_process_city_rerun_is_noop(self):
+        """Test at ny kjøring uten nye data ikke legger til rader."""
+        self._write_city('oslo', ['2025-05-02'], [20.0], [10.0])
+        self.assertEqual(self.converter._process_city('oslo'), 1)
+        derived_path = os.path.join(self.output_dir,
+                                    'vaerdata_oslo_derived.csv')
+        mtime = os.stat(derived_path).st_mtime_ns
+
+        self.assertEqual(self.converter._process_city('oslo'), 0)
+        self.assertEqual(os.stat(derived_path).st_mtime_ns, mtime)
+        self.assertEqual(len(self.converter.load_derived('oslo')), 1)
+
+    def test_process_city_appends_only_new_dates(self):
+        """Test at kun nye datoer beregnes og legges til."""
+        self._write_city('oslo', ['2025-05-01'], [20.0], [10.0])
+        self.converter._process_city('oslo')
+
+        self._write_city('oslo', ['2025-05-01', '2025-05-02'],
+                         [20.0, 18.0], [10.0, 11.0])
+        self.assertEqual(self.converter._process_city('oslo'), 1)
+
+        # Nytt element får hele historikken
+        added = self.converter._process_city('oslo', ['midrange'])
+        self.assertEqual(added, 2)
+
+        df_derived = self.converter.load_derived('oslo')
+        self.assertEqual(len(df_derived), 4)
+        self.assertFalse(df_derived.duplicated(
+            ['referenceTime', 'elementId']).any())
+
+    def test_process_city_upserts_changed_dates(self):
+        """Test at endrede og fjernede datoer oppdateres i partisjonen."""
+        dates = ['2025-05-01', '2025-05-02', '2025-05-03']
+        self._write_city('oslo', dates, [20.0, 18.0, 15.0],
+                         [10.0, 11.0, 5.0])
+        self.assertEqual(self.converter._process_city('oslo'), 3)
+
+        # Ny makstemperatur for en tidligere dato, og en dato som mangler
+        self._write_city('oslo', dates[:2], [25.0, 18.0], [10.0, 11.0])
+        self.assertEqual(self.converter._process_city('oslo'), 2)
+        df_derived = self.converter.load_derived('oslo')
+        self.assertListEqual(list(df_derived['referenceTime']), dates[:2])
+        self.assertListEqual(list(df_derived['value']), [15.0, 7.0])
+
+        loaded = DataLoader(self.output_dir)._load_city('oslo')
+        ranges = loaded[loaded['elementId'] == 'range(air_temperature P1D)']
+        self.assertListEqual(list(ranges['value']), [15.0, 7.0])
+
+    def test_process_city_compacts_partition(self):
+        """Test at partisjonen skrives om når utdaterte rader dominerer."""
+        for value in (20.0, 21.0, 22.0):
+            self._write_city('oslo', ['2025-05-01'], [value], [10.0])
+            self.converter._process_city('oslo')
+        derived_path = os.path.join(self.output_dir,
+                                    'vaerdata_oslo_derived.csv')
+        self.assertLessEqual(len(pd.read_csv(derived_path)), 2)
+        self.assertListEqual(
+            list(self.converter.load_derived('oslo')['value']), [12.0]
+        )
+
+    def test_compute_derived_multiple_stations_and_elements(self):
+        """Test at flere stasjoner og elementer beregnes i samme skann."""
+        df = pd.DataFrame({
+            'sourceId': ['S1', 'S2', 'S1', 'S2', 'S2', 'S1'],
+            'referenceTime': ['2025-05-01'] * 6,
+            'timeOffset': [0] * 6,
+            'elementId': ['max(air_temperature P1D)',
+                          'max(air_temperature P1D)',
+                          'min(air_temperature P1D)',
+                          'min(air_temperature P1D)',
+                          'mean(air_temperature P1D)',
+                          'max(air_temperature P1D)'],
+            'value': [20.0, 4.0, 10.0, -2.0, 1.0, 99.0],
+            'unit': ['degC'] * 6
+        })
+        result = TemperatureRangeConverter.compute_derived(
+            df, ['range', 'midrange', 'degree_days']
+        )
+        values = result.set_index(['sourceId', 'elementId'])['value']
+
+        # Første verdi vinner ved duplikater, som pivot_table("first")
+        self.assertEqual(values[('S1', 'range(air_temperature P1D)')], 10.0)
+        self.assertEqual(values[('S2', 'range(air_temperature P1D)')], 6.0)
+        self.assertEqual(
+            values[('S1', 'midrange(air_temperature P1D)')], 15.0
+        )
+        # S2 har døgnmiddel, S1 faller tilbake til (maks + min) / 2
+        self.assertEqual(
+            values[('S2', 'heating_degree_days(air_temperature P1D)')], 16.0
+        )
+        self.assertEqual(
+            values[('S1', 'heating_degree_days(air_temperature P1D)')], 2.0
+        )
+
+    def test_compute_derived_missing_input_gives_nan(self):
+        """Test at manglende min gir NaN-range, slik som før."""
+        df = pd.DataFrame({
+            'sourceId': ['S1'],
+            'referenceTime': ['2025-05-01'],
+            'timeOffset': [0],
+            'elementId': ['max(air_temperature P1D)'],
+            'value': [12.0],
+            'unit': ['degC']
+        })
+        result = self.converter._compute_daily_range(df)
+        self.assertEqual(len(result), 1)
+        self.assertTrue(pd.isna(result.iloc[0]['value']))
+
+    def test_compute_derived_unknown_element(self):
+        """Test at ukjent avledet element gir ValueError."""
+        df = pd.DataFrame(columns=['sourceId', 'referenceTime',
+                                   'timeOffset', 'elementId', 'value',
+                                   'unit'])
+        with self.assertRaises(ValueError):
+            TemperatureRangeConverter.compute_derived(df, ['spread'])
+
+    def test_run_uses_registry_cities(self):
+        """Test at run behandler alle byer i stasjonsregisteret."""
+        registry = StationRegistry({'bergen': 'SN50540'})
+        converter = TemperatureRangeConverter(self.output_dir, registry)
+        file_path = os.path.join(self.output_dir, "vaerdata_bergen.csv")
+        pd.DataFrame({
+            'sourceId': ['SN50540:0', 'SN50540:0'],
+            'referenceTime': ['2025-05-02', '2025-05-02'],
+            'timeOffset': ['PT0H', 'PT0H'],
+            'elementId': ['max(air_temperature P1D)',
+                          'min(air_temperature P1D)'],
+            'value': [14.0, 8.5],
+            'unit': ['degC', 'degC']
+        }).to_csv(file_path, index=False)
+
+        converter.run(elements=['range', 'midrange'])
+        df_derived = converter.load_derived('bergen')
+        self.assertEqual(len(df_derived), 2)
+        self.assertIn('midrange(air_temperature P1D)',
+                      set(df_derived['elementId']))
 
 
 if __name__ == '__main__':
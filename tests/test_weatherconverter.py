@@ -1,5 +1,6 @@
 """Test weatherconverter.py."""
 
+import importlib.util
 import json
 import os
 import pandas as pd
@@ -9,6 +10,8 @@ import unittest
 
 from unittest.mock import patch
 
+from src.fetchData.rawstore import RawObservationStore
+from src.fetchData.stations import StationRegistry
 from src.handleData.weatherconverter import WeatherConverter
 
 
@@ -96,6 +99,40 @@ class TestWeatherConverter(unittest.TestCase):
         self.assertTrue(((df['elementId'] == 'e1') & (df['value'] == 1)).any())
         self.assertTrue(((df['elementId'] == 'e2') & (df['value'] == 2)).any())
 
+    def test_stream_to_dataframe_matches_convert(self):
+        """Test at strømmet konvertering gir samme df som full lesing."""
+        data = {
+            "@type": "ObservationResponse",
+            "data": [
+                {
+                    "sourceId": f"S{i % 2}:0",
+                    "referenceTime": f"2025-05-{i + 1:02d}",
+                    "observations": [
+                        {"timeOffset": "PT0H", "elementId": "e1",
+                         "value": i, "unit": "u1"},
+                        {"timeOffset": "PT6H", "elementId": "e2",
+                         "value": i * 0.5, "unit": "u2"},
+                    ]
+                }
+                for i in range(20)
+            ]
+        }
+        self.write_json(data)
+        conv = WeatherConverter(self.json_path, self.output_dir)
+        streamed = conv.stream_to_dataframe(chunk_size=64)
+        conv.load_data()
+        full = conv.convert_to_dataframe()
+        pd.testing.assert_frame_equal(streamed, full)
+        self.assertEqual(len(streamed), 40)
+        self.assertEqual(streamed['elementId'].dtype, 'category')
+
+    def test_stream_to_dataframe_empty_raises(self):
+        """Test at tom 'data' gir ValueError ved strømming."""
+        self.write_json({"data": []})
+        conv = WeatherConverter(self.json_path, self.output_dir)
+        with self.assertRaises(ValueError):
+            conv.stream_to_dataframe()
+
     def test_run_queries_no_exception(self):
         """Test at run_queries kjører uten unntak."""
         conv = WeatherConverter(self.json_path, self.output_dir)
@@ -133,6 +170,110 @@ class TestWeatherConverter(unittest.TestCase):
         self.assertTrue((df_tromso['sourceId'] == 'SN90450:0').all())
         self.assertTrue((df_oslo['sourceId'] == 'SN18700:0').all())
 
+    def test_save_city_data_uses_registry(self):
+        """Test at save_city_data skriver filer for byene i registeret."""
+        df = pd.DataFrame({
+            'sourceId': ['SN50540:0', 'SN18700:0'],
+            'referenceTime': ['t0', 't1'],
+            'timeOffset': [0, 0],
+            'elementId': ['e', 'e'],
+            'value': [1, 2],
+            'unit': ['u', 'u']
+        })
+        registry = StationRegistry({"bergen": "SN50540"})
+        conv = WeatherConverter(self.json_path, self.output_dir, registry)
+        conv.df = df
+        conv.save_city_data()
+        self.assertEqual(os.listdir(self.output_dir), ['vaerdata_bergen.csv'])
+
+    def test_load_store_reads_partitions(self):
+        """Test at kompakt rålager leses uten JSON og uten duplikater."""
+        store_dir = os.path.join(self.tempdir.name, 'store')
+        page = {"data": [{
+            "sourceId": "SN18700:0",
+            "referenceTime": "2020-01-01T00:00:00.000Z",
+            "observations": [
+                {"elementId": "e1", "value": 1.5, "unit": "u",
+                 "timeOffset": "PT0H"},
+                {"elementId": "e2", "value": 2, "unit": "u",
+                 "timeOffset": "PT0H"},
+            ],
+        }]}
+        store = RawObservationStore(store_dir)
+        store.append_page(page)
+        store.append_page(page)
+
+        conv = WeatherConverter(self.json_path, self.output_dir)
+        df = conv.load_store(store_dir)
+        self.assertEqual(len(df), 2)
+        self.assertListEqual(df.columns.tolist(), [
+            'sourceId', 'referenceTime', 'timeOffset', 'elementId',
+            'value', 'unit'])
+        self.assertEqual(df['value'].dtype, 'float64')
+        self.assertEqual(df['elementId'].dtype, 'category')
+
+        conv.save_city_data()
+        saved = pd.read_csv(os.path.join(self.output_dir, 'vaerdata_oslo.csv'))
+        self.assertEqual(len(saved), 2)
+
+        with self.assertRaises(FileNotFoundError):
+            conv.load_store(store_dir, years=[1999])
+
+    def _multi_year_df(self):
+        """Lag df med to byer over to år."""
+        return pd.DataFrame({
+            'sourceId': ['SN18700:0', 'SN18700:0', 'SN90450:0', 'OTHER'],
+            'referenceTime': ['2020-12-31T00:00:00.000Z',
+                              '2021-01-01T00:00:00.000Z',
+                              '2021-06-01T00:00:00.000Z',
+                              '2021-06-01T00:00:00.000Z'],
+            'timeOffset': ['PT0H'] * 4,
+            'elementId': ['e'] * 4,
+            'value': [1.0, 2.0, 3.0, 4.0],
+            'unit': ['u'] * 4,
+        })
+
+    def test_save_city_data_partition_by_year(self):
+        """Test at årspartisjoner skrives komprimert per by."""
+        conv = WeatherConverter(self.json_path, self.output_dir)
+        conv.df = self._multi_year_df()
+        paths = conv.save_city_data("csv.gz", partition_by_year=True)
+        oslo_dir = os.path.join(self.output_dir, 'vaerdata_oslo')
+        self.assertEqual(sorted(os.listdir(oslo_dir)),
+                         ['2020.csv.gz', '2021.csv.gz'])
+        self.assertEqual(len(paths), 3)
+        df_2021 = pd.read_csv(os.path.join(oslo_dir, '2021.csv.gz'))
+        self.assertEqual(df_2021['value'].tolist(), [2.0])
+
+    def test_save_city_data_invalid_format(self):
+        """Test at ukjent filformat gir ValueError."""
+        conv = WeatherConverter(self.json_path, self.output_dir)
+        conv.df = self._multi_year_df()
+        with self.assertRaises(ValueError):
+            conv.save_city_data("xlsx")
+
+    def test_save_city_data_without_pyarrow(self):
+        """Test at Parquet uten pyarrow gir tydelig feil før skriving."""
+        conv = WeatherConverter(self.json_path, self.output_dir)
+        conv.df = self._multi_year_df()
+        with patch('importlib.util.find_spec', return_value=None):
+            with self.assertRaisesRegex(ImportError, 'pyarrow'):
+                conv.save_city_data("feather")
+        self.assertFalse(os.path.exists(
+            os.path.join(self.output_dir, 'vaerdata_tromso.feather')))
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("pyarrow"), "krever pyarrow"
+    )
+    def test_save_city_data_parquet(self):
+        """Test at byfiler kan skrives som Parquet."""
+        conv = WeatherConverter(self.json_path, self.output_dir)
+        conv.df = self._multi_year_df()
+        conv.save_city_data("parquet")
+        df = pd.read_parquet(
+            os.path.join(self.output_dir, 'vaerdata_tromso.parquet'))
+        self.assertEqual(df['value'].tolist(), [3.0])
+
 
 if __name__ == '__main__':
     unittest.main()
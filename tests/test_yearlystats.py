@@ -1,9 +1,11 @@
 """Tester yearlystats.py."""
 
+import numpy as np
 import pandas as pd
 import unittest
 
-from src.analyseData.yearlystats import YearlyStats
+from src.analyseData.seriesindex import SeriesIndex
+from src.analyseData.yearlystats import YearlyStats, year_segments
 from src.analyseData.outlierdetector import OutlierDetector
 
 
@@ -85,6 +87,88 @@ class TestYearlyStats(unittest.TestCase):
             self.loader.compute_yearly('city', 'e', aggregate='invalid')
 
 
+class TestMultiStatistic(unittest.TestCase):
+    """Tester compute_yearly med flere statistikker samtidig."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Setter opp tre år med timesverdier og hull."""
+        times = pd.date_range('2019-06-01', '2021-12-31', freq='6h', tz='UTC')
+        values = np.random.default_rng(7).normal(5.0, 3.0, len(times))
+        values = values.round(1).astype(object)
+        values[::17] = 'x'
+        cls.df = pd.DataFrame({
+            'referenceTime': times,
+            'elementId': 'e',
+            'timeOffset': 'PT1H',
+            'value': values,
+        })
+        series = pd.to_numeric(cls.df['value'], errors='coerce')
+        cls.grouped = series.groupby(cls.df['referenceTime'].dt.year)
+        cls.names = ['count', 'sum', 'mean', 'median', 'std', 'min', 'max',
+                     'q05', 'q95']
+
+    def test_matches_pandas(self):
+        """Sjekk alle statistikkene mot pandas groupby."""
+        loader = DummyYearlyStats(self.df)
+        loader.use_running_aggregates = False
+        out = loader.compute_yearly('city', 'e', aggregate=self.names)
+        self.assertListEqual(list(out.columns), ['year', *self.names])
+        self.assertListEqual(list(out['year']), [2019, 2020, 2021])
+        for name in self.names:
+            if name.startswith('q'):
+                expected = self.grouped.quantile(int(name[1:]) / 100)
+            else:
+                expected = getattr(self.grouped, name)()
+            np.testing.assert_allclose(out[name], expected, err_msg=name)
+
+    def test_single_name_and_year(self):
+        """Sjekk at ett navn gir 'value' og at år filtreres."""
+        loader = DummyYearlyStats(self.df)
+        loader.use_running_aggregates = False
+        single = loader.compute_yearly('city', 'e', aggregate='max')
+        self.assertListEqual(list(single.columns), ['year', 'value'])
+        out = loader.compute_yearly('city', 'e', 2020,
+                                    aggregate=['mean', 'q25'])
+        self.assertListEqual(list(out['year']), [2020])
+        self.assertAlmostEqual(out['mean'].iloc[0], self.grouped.mean()[2020])
+        self.assertAlmostEqual(out['q25'].iloc[0],
+                               self.grouped.quantile(0.25)[2020])
+        with self.assertRaises(ValueError):
+            loader.compute_yearly('city', 'e', 2030, aggregate=['mean'])
+
+    def test_running_matches_exact(self):
+        """Sjekk at løpende aggregater gir samme tabell."""
+        exact = DummyYearlyStats(self.df)
+        exact.use_running_aggregates = False
+        running = DummyYearlyStats(self.df)
+        running.use_running_aggregates = True
+        names = ['count', 'sum', 'mean', 'std', 'min', 'max']
+        pd.testing.assert_frame_equal(
+            running.compute_yearly(
+                'city', 'e', aggregate=names
+            ),
+            exact.compute_yearly('city', 'e', aggregate=names),
+            check_dtype=False,
+        )
+
+    def test_invalid_names(self):
+        """Sjekk ukjente og tomme lister med statistikker."""
+        loader = DummyYearlyStats(self.df)
+        for aggregate in (['mean', 'mode'], [], ['q5']):
+            with self.assertRaises(ValueError):
+                loader.compute_yearly('city', 'e', aggregate=aggregate)
+
+    def test_segments_cached(self):
+        """Sjekk at den filtrerte serien gjenbrukes for samme indeks."""
+        index = SeriesIndex(self.df)
+        first = year_segments(index, 'e', 'PT1H')
+        self.assertIs(year_segments(index, 'e', 'PT1H'), first)
+        years, starts, values = first
+        self.assertListEqual(list(years), [2019, 2020, 2021])
+        self.assertEqual(len(values), self.grouped.count().sum())
+
+
 class TestPercentChange(unittest.TestCase):
     """Tester percent_change metoden."""
 